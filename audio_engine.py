@@ -0,0 +1,352 @@
+import os
+import wave
+import struct
+from collections import namedtuple
+from typing import Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+# --- Configuration ---
+CHUNK_FRAMES = 16384          # Frames read per step when streaming a WAV (~0.4 s at 44.1 kHz)
+LIMITER_THRESHOLD = 0.89      # About -1 dBFS; peaks above it are compressed smoothly instead of clipped
+RESAMPLER_HALF_TAPS = 16      # Windowed-sinc half length, in samples of the lower of the two rates
+RESAMPLER_PHASES = 512        # Max precomputed fractional offsets of the sinc kernel (exact for simple ratios)
+RESAMPLER_ROLLOFF = 0.95      # Low-pass cutoff as a fraction of the lower Nyquist frequency
+RESAMPLER_KAISER_BETA = 8.6   # Kaiser window shape (~80 dB stopband)
+# Ratios whose reduced src * dst is at most this (48000 -> 16000 is 3 * 1) use per-phase
+# correlations instead of gathering a window for every output sample
+RESAMPLER_POLYPHASE_LIMIT = 32
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WavInfo = namedtuple("WavInfo", [
+    "format_tag",    # WAVE_FORMAT_PCM or WAVE_FORMAT_IEEE_FLOAT
+    "channels",
+    "sample_rate",
+    "sample_width",  # bytes per sample
+    "block_align",   # bytes per frame
+    "data_offset",   # file offset of the first sample
+    "data_bytes",
+    "frames",
+    "duration_ms",
+])
+
+
+# --- WAV I/O ---
+def probe_wav(filepath: str) -> WavInfo:
+    """
+    Reads only the RIFF headers of a WAV file and returns its format and length.
+    Raises ValueError for files that are not PCM or float WAVs.
+    """
+    file_size = os.path.getsize(filepath)
+    with open(filepath, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"{filepath} is not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{filepath} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+
+            if chunk_id == b"fmt ":
+                fmt_bytes = f.read(chunk_size)
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt_bytes[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt_bytes) >= 26:
+                    # The real format is the first two bytes of the SubFormat GUID
+                    format_tag = struct.unpack("<H", fmt_bytes[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, block_align, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{filepath} has a data chunk before its fmt chunk")
+                data_offset = f.tell()
+                available = file_size - data_offset
+                # Writers that stream often leave 0 or 0xFFFFFFFF as the size placeholder
+                data_bytes = chunk_size if 0 < chunk_size <= available else available
+                break
+            else:
+                f.seek(chunk_size, os.SEEK_CUR)
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR) # Chunks are word aligned
+
+    format_tag, channels, sample_rate, block_align, bits = fmt
+    if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        raise ValueError(f"{filepath} uses unsupported WAV format 0x{format_tag:04x}")
+    if channels < 1 or sample_rate < 1 or block_align < 1:
+        raise ValueError(f"{filepath} has an invalid fmt chunk")
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits not in (32, 64):
+        raise ValueError(f"{filepath} uses unsupported {bits}-bit float samples")
+    if format_tag == WAVE_FORMAT_PCM and bits not in (8, 16, 24, 32):
+        raise ValueError(f"{filepath} uses unsupported {bits}-bit PCM samples")
+
+    frames = data_bytes // block_align
+    return WavInfo(format_tag, channels, sample_rate, bits // 8, block_align,
+                   data_offset, data_bytes, frames, frames * 1000.0 / sample_rate)
+
+
+def read_wav(filepath: str, info: Optional[WavInfo] = None) -> np.ndarray:
+    """
+    The file's samples as a read-only (frames, channels) array mapped straight from disk,
+    in the file's own sample type (no copy is made until the samples are converted).
+    """
+    info = info or probe_wav(filepath)
+    if info.frames == 0:
+        return np.zeros((0, info.channels), dtype=np.float32)
+    if info.sample_width == 3:
+        return np.memmap(filepath, dtype=np.uint8, mode="r", offset=info.data_offset,
+                         shape=(info.frames, info.channels, 3))
+    dtype = _sample_dtype(info)
+    frame_bytes = info.sample_width * info.channels
+    if info.block_align != frame_bytes:
+        raise ValueError(f"{filepath} has padded frames ({info.block_align} bytes for {frame_bytes})")
+    return np.memmap(filepath, dtype=dtype, mode="r", offset=info.data_offset, shape=(info.frames, info.channels))
+
+
+def iter_wav_chunks(filepath: str, info: Optional[WavInfo] = None, chunk_frames: int = CHUNK_FRAMES,
+                    segments: Optional[Sequence[Tuple[int, int]]] = None) -> Iterator[np.ndarray]:
+    """
+    Yields the file's audio as float32 (frames, channels) chunks in [-1, 1], at its own sample rate.
+    If segments ([start, end) frame ranges) are given, only those parts of the file are read.
+    """
+    info = info or probe_wav(filepath)
+    samples = read_wav(filepath, info)
+    for seg_start, seg_end in segments if segments is not None else [(0, info.frames)]:
+        seg_end = min(seg_end, info.frames)
+        for start in range(seg_start, seg_end, chunk_frames):
+            yield to_float32(samples[start:min(start + chunk_frames, seg_end)])
+
+
+def pcm16_view(data) -> np.ndarray:
+    """Zero-copy int16 view of little-endian 16-bit PCM bytes (a trailing odd byte is ignored)."""
+    return np.frombuffer(data, dtype="<i2", count=len(data) // 2)
+
+
+class WavWriter:
+    """Writes float32 or int16 sample arrays to a 16-bit PCM WAV file as they are produced."""
+
+    def __init__(self, filepath: str, sample_rate: int, channels: int = 1):
+        self.channels = channels
+        self._wav = wave.open(filepath, "wb")
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+        self.frames = 0
+
+    def write(self, samples: np.ndarray):
+        if samples.dtype == np.int16:
+            self._wav.writeframes(np.ascontiguousarray(samples))
+        else:
+            # Converted a chunk at a time so a long float buffer does not get a full-size int16 twin
+            for start in range(0, len(samples), CHUNK_FRAMES):
+                self._wav.writeframes(float_to_pcm16(samples[start:start + CHUNK_FRAMES]))
+        self.frames += len(samples)
+
+    def close(self):
+        self._wav.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def write_wav(filepath: str, samples: np.ndarray, sample_rate: int):
+    """Writes a whole (frames,) or (frames, channels) array as a 16-bit PCM WAV."""
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    with WavWriter(filepath, sample_rate, channels) as writer:
+        writer.write(samples)
+
+
+# --- Sample Conversion ---
+def _sample_dtype(info: WavInfo):
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        return np.dtype("<f4") if info.sample_width == 4 else np.dtype("<f8")
+    return {1: np.dtype("u1"), 2: np.dtype("<i2"), 4: np.dtype("<i4")}[info.sample_width]
+
+
+def to_float32(samples: np.ndarray) -> np.ndarray:
+    """Converts integer or float samples (as returned by read_wav) to a new float32 array in [-1, 1]."""
+    if samples.dtype == np.uint8 and samples.ndim == 3:
+        # 24-bit PCM: (frames, channels, 3) bytes -> sign-extended int32 in the top 24 bits
+        as_int = (samples[..., 0].astype(np.int32) << 8) | (samples[..., 1].astype(np.int32) << 16) \
+            | (samples[..., 2].astype(np.int32) << 24)
+        return (as_int >> 8).astype(np.float32) * np.float32(1.0 / 8388608)
+    if samples.dtype == np.uint8:
+        # 8-bit WAV is unsigned
+        out = samples.astype(np.float32)
+        out -= 128.0
+        out *= np.float32(1.0 / 128)
+        return out
+    if samples.dtype.kind == "f":
+        return np.clip(samples, -1.0, 1.0).astype(np.float32, copy=False)
+    scale = np.float32(1.0 / (1 << (8 * samples.dtype.itemsize - 1)))
+    out = samples.astype(np.float32)
+    out *= scale
+    return out
+
+
+def float_to_pcm16(samples: np.ndarray) -> np.ndarray:
+    """Rounds float samples in [-1, 1] to int16, saturating anything outside the range."""
+    scaled = samples * np.float32(32767)
+    np.rint(scaled, out=scaled)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype("<i2")
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    """Averages the channels of a (frames, channels) array into (frames,); 1-D input is returned as is."""
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+# --- Gain ---
+def soft_limit(samples: np.ndarray, threshold: float = LIMITER_THRESHOLD) -> np.ndarray:
+    """
+    Peak limiter for float samples, in place: values above threshold are compressed with a
+    tanh knee that approaches (but never reaches) full scale, so boosted speech does not clip.
+    Memoryless, so chunks can be processed independently.
+    """
+    over = samples > threshold
+    over |= samples < -threshold
+    if over.any():
+        peaks = samples[over]
+        headroom = 1.0 - threshold
+        magnitude = threshold + headroom * np.tanh((np.abs(peaks) - threshold) / headroom)
+        samples[over] = np.copysign(magnitude, peaks)
+    return samples
+
+
+def apply_gain(samples: np.ndarray, gain_db: float, limit: bool = True,
+               threshold: float = LIMITER_THRESHOLD) -> np.ndarray:
+    """Applies gain_db to float samples in place and, unless limit is False, soft-limits the peaks."""
+    samples *= np.float32(10 ** (gain_db / 20.0))
+    if limit:
+        soft_limit(samples, threshold)
+    return samples
+
+
+# --- Resampling ---
+_kernel_tables = {}
+
+def _kernel_table(src: int, dst: int, half_taps: int):
+    """
+    (taps per side, phases, (phases + 1, 2 * taps) float32 table) for a Kaiser-windowed sinc
+    low-pass, for the reduced ratio src:dst. With at most RESAMPLER_PHASES output phases
+    (e.g. 48000 -> 16000 or 44100 -> 48000) every phase is exact.
+    """
+    key = (src, dst, half_taps)
+    cached = _kernel_tables.get(key)
+    if cached is not None:
+        return cached
+    phases = dst if dst <= RESAMPLER_PHASES else RESAMPLER_PHASES
+    cutoff = RESAMPLER_ROLLOFF * min(1.0, dst / src) # Fraction of the input Nyquist frequency
+    side = int(np.ceil(half_taps / min(1.0, dst / src)))
+    offsets = np.arange(-side + 1, side + 1, dtype=np.float64)
+    fractions = np.arange(phases + 1, dtype=np.float64) / phases
+    t = offsets[None, :] - fractions[:, None]
+    window = np.i0(RESAMPLER_KAISER_BETA * np.sqrt(np.clip(1.0 - (t / side) ** 2, 0.0, 1.0))) / np.i0(RESAMPLER_KAISER_BETA)
+    table = cutoff * np.sinc(cutoff * t) * window
+    table /= table.sum(axis=1, keepdims=True) # Unity gain at DC for every phase
+    cached = _kernel_tables[key] = (side, phases, table.astype(np.float32))
+    return cached
+
+
+class Resampler:
+    """
+    Streaming windowed-sinc resampler for mono float32 audio.
+
+    process() can be fed arbitrarily sized chunks; the output is identical to resampling
+    the concatenated input at once. Call flush() after the last chunk for the tail.
+    Output positions are computed with exact integer arithmetic, so long streams do not drift.
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int, half_taps: int = RESAMPLER_HALF_TAPS):
+        divisor = np.gcd(src_rate, dst_rate)
+        self.src = src_rate // divisor
+        self.dst = dst_rate // divisor
+        self.side, self.phases, self.table = _kernel_table(self.src, self.dst, half_taps)
+        self._offsets = np.arange(-self.side + 1, self.side + 1)
+        self._history = np.zeros(self.side, dtype=np.float32) # Silence before the first sample
+        self._start = -self.side # Input index of _history[0]
+        self._received = 0       # Real input samples so far
+        self._available = 0      # Input samples in the stream, including flush padding
+        self._next_out = 0       # Index of the next output sample
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.src == self.dst:
+            self._received += len(samples)
+            return samples.astype(np.float32, copy=False)
+        self._received += len(samples)
+        return self._run(samples)
+
+    def flush(self) -> np.ndarray:
+        """Returns the remaining output; the resampler can not be used afterwards."""
+        if self.src == self.dst:
+            return np.zeros(0, dtype=np.float32)
+        expected = -(-self._received * self.dst // self.src) # ceil
+        tail = self._run(np.zeros(self.side + 1, dtype=np.float32))
+        return tail[:max(0, expected - (self._next_out - len(tail)))]
+
+    def _run(self, samples: np.ndarray) -> np.ndarray:
+        buffer = np.concatenate((self._history, samples.astype(np.float32, copy=False)))
+        self._available += len(samples)
+
+        # Output j needs input up to floor(j * src / dst) + side, which must already be available
+        last = ((self._available - self.side) * self.dst - 1) // self.src
+        if last < self._next_out:
+            self._history = buffer
+            return np.zeros(0, dtype=np.float32)
+
+        if self.src * self.dst <= RESAMPLER_POLYPHASE_LIMIT:
+            out = self._polyphase(buffer, last)
+        else:
+            positions = np.arange(self._next_out, last + 1, dtype=np.int64) * self.src
+            base = positions // self.dst
+            phase = ((positions % self.dst) * self.phases + self.dst // 2) // self.dst
+            window = buffer[(base - self._start)[:, None] + self._offsets[None, :]]
+            out = np.einsum("ij,ij->i", window, self.table[phase])
+        self._next_out = last + 1
+
+        # Keep only the input the next output sample still needs
+        keep_from = (self._next_out * self.src) // self.dst - self.side + 1
+        self._history = buffer[keep_from - self._start:].copy()
+        self._start = keep_from
+        return out
+
+    def _polyphase(self, buffer: np.ndarray, last: int) -> np.ndarray:
+        """
+        Outputs _next_out..last for simple ratios. Outputs j, j + dst, j + 2 * dst, ... share a
+        kernel phase and step through the input by src samples, so each such group is a
+        correlation of the input decimated by src with the matching slice of that kernel.
+        """
+        count = last + 1 - self._next_out
+        out = np.zeros(count, dtype=np.float32)
+        taps = len(self._offsets)
+        for residue in range(min(self.dst, count)):
+            first = self._next_out + residue
+            group = (count - residue + self.dst - 1) // self.dst
+            position = first * self.src
+            kernel = self.table[(position % self.dst) * self.phases // self.dst]
+            start = position // self.dst - self.side + 1 - self._start
+            for q in range(min(self.src, taps)):
+                sub_kernel = kernel[q::self.src]
+                stream = buffer[start + q::self.src][:group + len(sub_kernel) - 1]
+                out[residue::self.dst] += np.correlate(stream, sub_kernel, "valid")
+        return out
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int, chunk_frames: int = CHUNK_FRAMES) -> np.ndarray:
+    """Resamples a whole mono float32 array (in chunks, which bounds the temporary memory)."""
+    resampler = Resampler(src_rate, dst_rate)
+    parts = [resampler.process(samples[start:start + chunk_frames]) for start in range(0, len(samples), chunk_frames)]
+    parts.append(resampler.flush())
+    return np.concatenate(parts)
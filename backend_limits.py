@@ -0,0 +1,65 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+# --- Configuration ---
+# Maximum number of requests in flight at once, per backend
+DEFAULT_BACKEND_LIMITS = {
+    "openai": 3,
+    "fish_audio": 2,
+}
+
+_lock = threading.Lock()
+_semaphores: Dict[str, threading.BoundedSemaphore] = {
+    name: threading.BoundedSemaphore(limit) for name, limit in DEFAULT_BACKEND_LIMITS.items()
+}
+_limits: Dict[str, int] = dict(DEFAULT_BACKEND_LIMITS)
+_in_flight: Dict[str, int] = {name: 0 for name in DEFAULT_BACKEND_LIMITS}
+_waiting: Dict[str, int] = {name: 0 for name in DEFAULT_BACKEND_LIMITS}
+
+
+def configure(backend: str, limit: int):
+    """
+    Sets the concurrency limit for a backend. Call before work starts; requests already
+    holding a slot of the previous semaphore are not affected.
+    """
+    if limit < 1:
+        raise ValueError(f"Concurrency limit for '{backend}' must be at least 1, got {limit}.")
+    with _lock:
+        _semaphores[backend] = threading.BoundedSemaphore(limit)
+        _limits[backend] = limit
+        _in_flight.setdefault(backend, 0)
+        _waiting.setdefault(backend, 0)
+
+
+@contextmanager
+def backend_slot(backend: str):
+    """Blocks until a request slot for the backend is free and holds it for the with-block."""
+    with _lock:
+        semaphore = _semaphores.get(backend)
+        if semaphore is None:
+            semaphore = _semaphores[backend] = threading.BoundedSemaphore(1)
+            _limits[backend] = 1
+            _in_flight[backend] = 0
+            _waiting[backend] = 0
+        _waiting[backend] += 1
+
+    semaphore.acquire()
+    with _lock:
+        _waiting[backend] -= 1
+        _in_flight[backend] += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _in_flight[backend] -= 1
+        semaphore.release()
+
+
+def stats() -> Dict[str, dict]:
+    """Returns {backend: {"limit", "in_flight", "waiting"}} for every known backend."""
+    with _lock:
+        return {
+            name: {"limit": _limits[name], "in_flight": _in_flight[name], "waiting": _waiting[name]}
+            for name in _limits
+        }
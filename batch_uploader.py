@@ -0,0 +1,119 @@
+import threading
+import logging
+from typing import Callable, Dict, Optional
+
+import metrics
+from pipeline_executor import ContextExecutor
+
+# --- Configuration ---
+MAX_PARALLEL_UPLOADS = 2   # Batches stitched and uploaded at the same time
+MAX_QUEUED_UPLOADS = 4     # Further due batches waiting for a worker; beyond this they stay in the queue db
+
+
+class BatchUploader:
+    """
+    Runs the stitch/encode/upload of queued batches on background workers, so the
+    monitor loop keeps ingesting clips and creating batches while earlier ones upload.
+
+    Batches come from UploadQueue.due_batches(), which keeps returning a batch until its
+    upload is recorded, so a batch already accepted here is not taken again. The backlog is
+    bounded: when max_parallel + max_queued batches are in hand, further ones are declined
+    and simply offered again on a later pass (they are durable in the queue db).
+
+    A batch can still finish between the snapshot of due batches and submit(), so the row
+    handed in may be stale: process_fn(batch) does the work (voice_model2.process_batch),
+    re-checking the batch's current state first, and records the outcome. It returns True
+    or False, or None if the batch turned out to be no longer due (counted as skipped).
+    """
+
+    def __init__(self, process_fn: Callable[[dict], Optional[bool]], max_parallel: int = MAX_PARALLEL_UPLOADS,
+                 max_queued: int = MAX_QUEUED_UPLOADS):
+        self.process_fn = process_fn
+        self.max_parallel = max_parallel
+        self.max_queued = max_queued
+        # Each batch's log lines are printed together once it finishes
+        self._executor = ContextExecutor(max_workers=max_parallel, thread_name_prefix="upload")
+
+        self._lock = threading.Lock()
+        self._accepted: Dict[int, str] = {} # batch id -> title, queued or running
+        self._running = 0
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.declined = 0
+
+    # --- Public API ---
+    def submit(self, batch) -> bool:
+        """Hands a due batch to the workers. Returns False if it is already in hand or the backlog is full."""
+        batch_id = batch["id"]
+        with self._lock:
+            if self._closed or batch_id in self._accepted:
+                return False
+            if len(self._accepted) >= self.max_parallel + self.max_queued:
+                self.declined += 1
+                return False
+            self._accepted[batch_id] = batch["title"]
+        metrics.incr("upload_batches_queued")
+        try:
+            future = self._executor.submit(batch["title"], self._run, batch)
+        except RuntimeError as e: # Shut down in the meantime
+            logging.error(f"Could not queue batch '{batch['title']}' for upload: {e}")
+            self._forget(batch_id)
+            return False
+        future.add_done_callback(lambda _future, batch_id=batch_id: self._forget(batch_id))
+        return True
+
+    def in_flight(self) -> int:
+        """Batches accepted and not finished yet (running or waiting for a worker)."""
+        with self._lock:
+            return len(self._accepted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self._running,
+                "waiting": len(self._accepted) - self._running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "declined": self.declined,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops taking batches and, with wait, blocks until the uploads already running have
+        finished. Batches still waiting for a worker are dropped here; they stay due in the
+        queue db and are picked up on the next start.
+        """
+        with self._lock:
+            self._closed = True
+            running = self._running
+            waiting = len(self._accepted) - running
+        if running and wait:
+            print(f"Waiting for {running} upload(s) in progress to finish...")
+        if waiting:
+            print(f"{waiting} queued batch(es) will be uploaded on the next start.")
+        self._executor.shutdown(wait=wait, cancel_pending=True)
+
+    # --- Internal Helpers ---
+    def _run(self, batch) -> Optional[bool]:
+        with self._lock:
+            self._running += 1
+        ok = False
+        try:
+            ok = self.process_fn(batch)
+            return ok
+        finally:
+            with self._lock:
+                self._running -= 1
+                if ok:
+                    self.completed += 1
+                elif ok is None:
+                    self.skipped += 1
+                else:
+                    self.failed += 1
+
+    def _forget(self, batch_id: int):
+        with self._lock:
+            self._accepted.pop(batch_id, None)
@@ -0,0 +1,128 @@
+"""
+Per-clip CPU time and allocations of the audio hot paths: pydub vs audio_engine.
+
+  clip  - captured voice clip (WAV, stereo 48 kHz by default) -> mono -> 16 kHz -> WAV,
+          as voice_model2.py prepares clips for upload
+  tts   - TTS PCM (mono 44.1 kHz) -> +BOOST_DB gain -> WAV, as cloned_tts.py writes voice lines
+
+Both paths read and write WAV only, so pydub never needs ffmpeg here. CPU time is
+measured with time.process_time() over --runs runs per clip; allocations are the
+tracemalloc peak (NumPy reports its buffers to tracemalloc) of one extra traced run.
+
+Usage:
+    python benchmarks/audio_engine_benchmark.py [--seconds 5] [--runs 10] [--channels 2]
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+import numpy as np
+
+import audio_engine
+from cloned_tts import BOOST_DB, TTS_SAMPLE_RATE
+from voice_model2 import TARGET_SAMPLE_RATE
+
+
+def write_test_clip(path, seconds, sample_rate, channels):
+    """A speech-like test signal: a few harmonics with a slow amplitude envelope plus noise."""
+    rng = np.random.default_rng(1234)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = sum(np.sin(2 * math.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 720, 1440)))
+    signal *= 0.25 * (0.6 + 0.4 * np.sin(2 * math.pi * 3 * t))
+    signal += rng.normal(0, 0.01, len(t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(np.repeat(pcm[:, None], channels, axis=1).tobytes())
+    return pcm.tobytes()
+
+
+# --- Paths Under Test ---
+def clip_pydub(src, dst):
+    from pydub import AudioSegment
+    audio = AudioSegment.from_wav(src)
+    audio = audio.set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE)
+    audio.export(dst, format="wav")
+
+
+def clip_engine(src, dst):
+    info = audio_engine.probe_wav(src)
+    resampler = audio_engine.Resampler(info.sample_rate, TARGET_SAMPLE_RATE)
+    with audio_engine.WavWriter(dst, TARGET_SAMPLE_RATE) as out:
+        for chunk in audio_engine.iter_wav_chunks(src, info):
+            out.write(resampler.process(audio_engine.to_mono(chunk)))
+        out.write(resampler.flush())
+
+
+def tts_pydub(pcm, dst):
+    from pydub import AudioSegment
+    audio = AudioSegment(data=pcm, sample_width=2, frame_rate=TTS_SAMPLE_RATE, channels=1)
+    (audio + BOOST_DB).export(dst, format="wav")
+
+
+def tts_engine(pcm, dst):
+    samples = audio_engine.pcm16_view(pcm)
+    with audio_engine.WavWriter(dst, TTS_SAMPLE_RATE) as out:
+        for start in range(0, len(samples), audio_engine.CHUNK_FRAMES):
+            out.write(audio_engine.apply_gain(audio_engine.to_float32(samples[start:start + audio_engine.CHUNK_FRAMES]), BOOST_DB))
+
+
+def measure(fn, arg, dst, runs):
+    fn(arg, dst) # Warm-up (imports, kernel tables)
+    cpu = []
+    for _ in range(runs):
+        started = time.process_time()
+        fn(arg, dst)
+        cpu.append(time.process_time() - started)
+    tracemalloc.start()
+    fn(arg, dst)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(cpu), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of each clip")
+    parser.add_argument("--runs", type=int, default=10, help="Timed runs per path")
+    parser.add_argument("--clip-sample-rate", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=2, help="Channels of the captured clip")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="audio_engine_bench_")
+    clip_path = os.path.join(work_dir, "clip.wav")
+    write_test_clip(clip_path, args.seconds, args.clip_sample_rate, args.channels)
+    tts_pcm = write_test_clip(os.path.join(work_dir, "tts.wav"), args.seconds, TTS_SAMPLE_RATE, 1)
+    out_path = os.path.join(work_dir, "out.wav")
+
+    cases = [
+        ("clip", "pydub", clip_pydub, clip_path),
+        ("clip", "audio_engine", clip_engine, clip_path),
+        ("tts", "pydub", tts_pydub, tts_pcm),
+        ("tts", "audio_engine", tts_engine, tts_pcm),
+    ]
+    print(f"{args.seconds:.1f}s clips, {args.runs} run(s) per path; clip {args.channels}ch {args.clip_sample_rate} Hz "
+          f"-> mono {TARGET_SAMPLE_RATE} Hz, tts mono {TTS_SAMPLE_RATE} Hz +{BOOST_DB} dB\n")
+    print(f"{'path':<6} {'engine':<13} {'CPU ms/clip':>12} {'alloc peak (KiB)':>17}")
+    for name, engine, fn, arg in cases:
+        cpu_s, peak = measure(fn, arg, out_path, args.runs)
+        print(f"{name:<6} {engine:<13} {cpu_s * 1000:>12.2f} {peak / 1024:>17.0f}")
+
+    for name in os.listdir(work_dir):
+        os.remove(os.path.join(work_dir, name))
+    os.rmdir(work_dir)
+
+
+if __name__ == "__main__":
+    main()
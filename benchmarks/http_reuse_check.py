@@ -0,0 +1,166 @@
+"""
+Checks that http_clients.py really keeps connections alive.
+
+Starts a local HTTP/1.1 stand-in for the Fish Audio and OpenAI APIs, points the
+shared clients at it, and sends a series of requests through each path the scripts
+use:
+
+  fish    - fish_audio_sdk session (httpx) listing models, as models_list.py does
+  upload  - requests multipart POST /model, as voice_model2.py does
+  openai  - OpenAI chat completion (httpx), as ingame_llm_tts.py does
+
+The server counts the TCP connections it accepted and the client-side counters
+from connection_stats() are compared against it. Exits with status 1 if any path
+opened more than one connection.
+
+Usage:
+    python benchmarks/http_reuse_check.py [--requests 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+CHAT_COMPLETION = {
+    "id": "chatcmpl-local",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini-2024-07-18",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "[\"Hello there\"]"}}],
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers just enough of both APIs; one handler instance serves one TCP connection."""
+    protocol_version = "HTTP/1.1" # Keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self._read_body()
+        if self.path.startswith("/model"):
+            self._send_json({"total": 0, "items": []})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        self._read_body()
+        if self.path.startswith("/model"):
+            self._send_json({"_id": "local-model"})
+        elif self.path.endswith("/chat/completions"):
+            self._send_json(CHAT_COMPLETION)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_path(name, server, send, count):
+    """Sends count requests through one client path and returns its report row."""
+    import http_clients
+
+    http_clients.stats.reset()
+    with server.lock:
+        server.connections = 0
+    for _ in range(count):
+        send()
+    host_stats = http_clients.connection_stats().get("127.0.0.1", {})
+    return {
+        "path": name,
+        "requests": host_stats.get("requests", 0),
+        "client_new_connections": host_stats.get("new_connections", 0),
+        "client_reused": host_stats.get("reused", 0),
+        "server_connections": server.connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="Requests sent through each client path")
+    args = parser.parse_args()
+
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    # Read by http_clients at import time
+    os.environ["FISH_AUDIO_BASE_URL"] = base_url
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+
+    import http_clients
+
+    fish_session = http_clients.get_fish_session("local-key")
+    openai_client = http_clients.get_openai_client("local-key")
+    upload_session = http_clients.get_requests_session()
+
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        f.write(b"RIFF" + b"\0" * 4096)
+        upload_path = f.name
+
+    def upload():
+        with open(upload_path, "rb") as audio_file:
+            response = upload_session.post(f"{base_url}/model", headers={"Authorization": "Bearer local-key"},
+                                           files={"voices": ("clip.wav", audio_file, "audio/wav")},
+                                           data={"title": "reuse-check"}, timeout=http_clients.request_timeout())
+        response.raise_for_status()
+
+    def chat():
+        openai_client.chat.completions.create(
+            model="gpt-4o-mini-2024-07-18", messages=[{"role": "user", "content": "hi"}])
+
+    try:
+        rows = [
+            run_path("fish", server, lambda: fish_session.list_models(self_only=True, page_size=10), args.requests),
+            run_path("upload", server, upload, args.requests),
+            run_path("openai", server, chat, args.requests),
+        ]
+    finally:
+        os.remove(upload_path)
+        server.shutdown()
+
+    print(f"{'path':<8} {'requests':>8} {'new conns':>10} {'reused':>7} {'server conns':>13}")
+    failed = False
+    for row in rows:
+        print(f"{row['path']:<8} {row['requests']:>8} {row['client_new_connections']:>10} "
+              f"{row['client_reused']:>7} {row['server_connections']:>13}")
+        ok = (row["requests"] == args.requests and row["server_connections"] == 1
+              and row["client_new_connections"] == 1 and row["client_reused"] == args.requests - 1)
+        failed = failed or not ok
+
+    print("FAIL: connections were not reused" if failed else "OK: every path reused a single connection")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
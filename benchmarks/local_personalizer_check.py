@@ -0,0 +1,68 @@
+"""
+Checks the player addressing of local_personalizer.py, which voices lines when the LLM
+misses its deadline.
+
+  cases    - known openings: ordinary words are lowercased after the name; "I", "I'm",
+             "I'll", "I've" (straight or curly apostrophe), ALL CAPS words and phrases
+             that already open with a name keep their capitals
+  phrases  - every phrase in emotion_phrases.json: addressing never produces a lowercase
+             pronoun ("Matt, i'm ...")
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python benchmarks/local_personalizer_check.py
+"""
+import json
+import os
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+from local_personalizer import _address
+
+CASES = [
+    ("Watch out for the mine!", "Matt, watch out for the mine!"),
+    ("I'm hurt, help!", "Matt, I'm hurt, help!"),
+    ("I'll grab the loot.", "Matt, I'll grab the loot."),
+    ("I've got the apparatus!", "Matt, I've got the apparatus!"),
+    ("I’m right behind you.", "Matt, I’m right behind you."),
+    ("I need help!", "Matt, I need help!"),
+    ("It's over here.", "Matt, it's over here."),
+    ("RUN!", "Matt, RUN!"),
+    ("Oh, look!", "Oh, look!"),
+]
+
+
+def check_cases():
+    failures = [f"{phrase!r} -> {_address(phrase, 'Matt')!r}, expected {expected!r}"
+                for phrase, expected in CASES if _address(phrase, "Matt") != expected]
+    assert not failures, "; ".join(failures)
+
+
+def check_phrases():
+    with open(os.path.join(PACKAGE_DIR, "emotion_phrases.json"), "r", encoding="utf-8") as f:
+        phrases = [phrase for emotion_phrases in json.load(f).values() for phrase in emotion_phrases]
+    lowered = [line for line in (_address(phrase, "Matt") for phrase in phrases)
+               if line.startswith(("Matt, i ", "Matt, i'", "Matt, i’"))]
+    assert not lowered, f"{len(lowered)} line(s) with a lowercase pronoun, e.g. {lowered[0]!r}"
+
+
+CHECKS = {"cases": check_cases, "phrases": check_phrases}
+
+
+def main():
+    failed = 0
+    for name, check in CHECKS.items():
+        try:
+            check()
+            print(f"{name:<8} ok")
+        except AssertionError as e:
+            failed += 1
+            print(f"{name:<8} FAILED: {e}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
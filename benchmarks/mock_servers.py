@@ -0,0 +1,348 @@
+"""
+Local stand-ins for the parts of the OpenAI and Fish Audio APIs the scripts use.
+
+One HTTP/1.1 server answers both APIs:
+
+  POST /v1/chat/completions  - OpenAI chat completion returning a JSON array of lines
+                               (streamed as server-sent events when "stream" is true;
+                               usage is estimated at CHARS_PER_TOKEN characters per token)
+  GET  /model                - Fish Audio model listing (paginated, newest first)
+  POST /model                - Fish Audio model creation (multipart upload)
+  DELETE /model/<id>         - Fish Audio model deletion
+  POST /v1/tts               - Fish Audio TTS (msgpack request, streamed pcm/wav response)
+
+Every endpoint waits for an injectable latency (plus optional random jitter) before
+answering, and model uploads can be read at a limited rate, so benchmarks can model a
+slow network without spending API credits.
+Point the scripts at it with FISH_AUDIO_BASE_URL=<url> and OPENAI_BASE_URL=<url>/v1.
+"""
+import datetime
+import io
+import json
+import math
+import random
+import struct
+import sys
+import threading
+import time
+import wave
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import ormsgpack
+
+TTS_CHUNK_BYTES = 8192
+UPLOAD_READ_BYTES = 16384   # Read size when throttling uploads
+TTS_SECONDS_PER_CHAR = 0.06 # Roughly natural speech rate
+CHARS_PER_TOKEN = 4          # Streamed completions are sent in pieces of about one token
+PERSONALIZED_LINES = [
+    "{player}, did you hear that? Something is moving near the {place}.",
+    "Guys, stay close, {player} is not answering.",
+    "Is that {player}? Why are you standing so still?",
+    "Okay, okay, I think it went past the {place}.",
+    "{player}, bring the scrap back to the ship, now!",
+]
+
+
+class MockLatency:
+    """Per-endpoint latency in milliseconds: a fixed delay plus uniform jitter."""
+
+    def __init__(self, openai_ms=0.0, list_ms=0.0, tts_ms=0.0, upload_ms=0.0, jitter_ms=0.0,
+                 openai_token_ms=0.0, upload_kbps=0.0, seed=None):
+        self.delays = {"openai": openai_ms, "list": list_ms, "tts": tts_ms, "upload": upload_ms}
+        self.openai_token_ms = openai_token_ms # Generation time per token, before and while streaming
+        self.upload_kbps = upload_kbps         # Simulated client uplink for model uploads (0 = unlimited)
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self, endpoint):
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        delay = self.delays.get(endpoint, 0.0) + jitter
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+
+def _model_entity(model_id, title, created_at):
+    stamp = created_at.isoformat()
+    return {
+        "_id": model_id, "type": "tts", "title": title, "description": "", "cover_image": "",
+        "train_mode": "fast", "state": "trained", "tags": [], "samples": [],
+        "created_at": stamp, "updated_at": stamp, "languages": ["en"], "visibility": "private",
+        "lock_visibility": False, "like_count": 0, "mark_count": 0, "shared_count": 0, "task_count": 0,
+        "author": {"_id": "mock-author", "nickname": "mock", "avatar": ""},
+    }
+
+
+def _tone_pcm16(seconds, sample_rate):
+    frames = int(seconds * sample_rate)
+    return b"".join(struct.pack("<h", int(6000 * math.sin(2 * math.pi * 220 * i / sample_rate)))
+                    for i in range(frames))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real APIs
+
+    def do_GET(self):
+        self._read_body()
+        url = urlsplit(self.path)
+        if url.path == "/model":
+            self.server.count("list")
+            self.server.latency.wait("list")
+            query = parse_qs(url.query)
+            page_size = int(query.get("page_size", ["10"])[0])
+            page_number = int(query.get("page_number", ["1"])[0])
+            models = self.server.models_newest_first()
+            items = models[(page_number - 1) * page_size:page_number * page_size]
+            self._send_json({"total": len(models), "items": items})
+        else:
+            self._send_json({"message": "not found"}, status=404)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self._read_body(self.server.latency.upload_kbps if path == "/model" else 0.0)
+        if path.endswith("/chat/completions"):
+            self.server.count("openai")
+            self.server.latency.wait("openai")
+            request = json.loads(body or b"{}")
+            prompt_chars = sum(len(message.get("content") or "") for message in request.get("messages", []))
+            if request.get("stream"):
+                include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                self._send_chat_stream(prompt_chars if include_usage else None)
+            else:
+                # Without streaming the client waits for every token to be generated
+                content = self.server.chat_content()
+                time.sleep(self.server.latency.openai_token_ms * len(content) / CHARS_PER_TOKEN / 1000.0)
+                self._send_json(self.server.chat_completion(content, prompt_chars))
+        elif path == "/model":
+            self.server.count("upload")
+            self.server.latency.wait("upload")
+            self._send_json(self.server.create_model(len(body)))
+        elif path == "/v1/tts":
+            self.server.count("tts")
+            self.server.latency.wait("tts")
+            self._send_tts(ormsgpack.unpackb(body))
+        else:
+            self._send_json({"message": "not found"}, status=404)
+
+    def do_DELETE(self):
+        self._read_body()
+        path = urlsplit(self.path).path
+        if path.startswith("/model/"):
+            self.server.count("delete")
+            if self.server.delete_model(path[len("/model/"):]):
+                self._send_json({})
+            else:
+                self._send_json({"status": 404, "message": "Model not found"}, status=404)
+        else:
+            self._send_json({"message": "not found"}, status=404)
+
+    def _send_chat_stream(self, prompt_chars=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        content = self.server.chat_content()
+        token_s = self.server.latency.openai_token_ms / 1000.0
+        for start in range(0, len(content), CHARS_PER_TOKEN):
+            if token_s:
+                time.sleep(token_s)
+            self._write_event(self.server.chat_chunk(content[start:start + CHARS_PER_TOKEN]))
+        self._write_event(self.server.chat_chunk(None, finish_reason="stop"))
+        if prompt_chars is not None:
+            # Like the real API with stream_options.include_usage: one last chunk without choices
+            self._write_event(self.server.chat_usage_chunk(prompt_chars, len(content)))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, payload):
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data):
+        """One piece of a chunked transfer-encoded body; empty data ends the body."""
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_tts(self, request):
+        audio_format = request.get("format", "mp3")
+        sample_rate = request.get("sample_rate") or 44100
+        if audio_format not in ("pcm", "wav"):
+            self._send_json({"message": f"mock server does not encode {audio_format}"}, status=400)
+            return
+
+        seconds = max(0.5, len(request.get("text", "")) * TTS_SECONDS_PER_CHAR)
+        payload = self.server.tone(seconds, sample_rate)
+        if audio_format == "wav":
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav_out:
+                wav_out.setnchannels(1)
+                wav_out.setsampwidth(2)
+                wav_out.setframerate(sample_rate)
+                wav_out.writeframes(payload)
+            payload = buffer.getvalue()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav" if audio_format == "wav" else "application/octet-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        for start in range(0, len(payload), TTS_CHUNK_BYTES):
+            self.wfile.write(payload[start:start + TTS_CHUNK_BYTES])
+
+    def _read_body(self, kbps=0.0):
+        """Reads the request body; with kbps set, no faster than that (a slow client uplink)."""
+        length = int(self.headers.get("Content-Length", 0))
+        if not kbps:
+            return self.rfile.read(length) if length else b""
+        pieces = []
+        started = time.perf_counter()
+        received = 0
+        while received < length:
+            piece = self.rfile.read(min(UPLOAD_READ_BYTES, length - received))
+            if not piece:
+                break
+            pieces.append(piece)
+            received += len(piece)
+            ahead = received * 8 / (kbps * 1000.0) - (time.perf_counter() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+        return b"".join(pieces)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """
+    Serves both stand-in APIs on 127.0.0.1 from a background thread.
+
+    Usage:
+        with MockAPIServer(MockLatency(openai_ms=400)) as server:
+            os.environ["FISH_AUDIO_BASE_URL"] = server.url
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=None, model_count=3, port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency or MockLatency()
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._tones = {}
+        self.upload_sizes = [] # Body bytes of every model upload, in order
+        start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        self._models = [_model_entity(f"mock-model-{i}", f"Batch_mock_{i}", start + datetime.timedelta(minutes=i))
+                        for i in range(model_count)]
+        self._next_model = model_count # Model IDs are never reused, even after deletions
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections at exit is expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-api-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    # --- Endpoint State ---
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def models_newest_first(self):
+        with self._lock:
+            return sorted(self._models, key=lambda m: m["created_at"], reverse=True)
+
+    def create_model(self, upload_bytes):
+        with self._lock:
+            index = self._next_model
+            self._next_model += 1
+            model = _model_entity(f"mock-model-{index}", f"Uploaded_mock_{index}",
+                                  datetime.datetime.now(datetime.timezone.utc))
+            self._models.append(model)
+            self.upload_sizes.append(upload_bytes)
+        return {"_id": model["_id"], "title": model["title"], "upload_bytes": upload_bytes}
+
+    def delete_model(self, model_id):
+        with self._lock:
+            remaining = [model for model in self._models if model["_id"] != model_id]
+            found = len(remaining) < len(self._models)
+            self._models = remaining
+        return found
+
+    def chat_content(self):
+        lines = [line.format(player="Matt", place="fire exit") for line in PERSONALIZED_LINES]
+        return json.dumps(lines, indent=2)
+
+    def chat_usage(self, prompt_chars, completion_chars):
+        prompt_tokens = math.ceil(prompt_chars / CHARS_PER_TOKEN)
+        completion_tokens = math.ceil(completion_chars / CHARS_PER_TOKEN)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def chat_completion(self, content, prompt_chars=0):
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini-2024-07-18",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": self.chat_usage(prompt_chars, len(content)),
+        }
+
+    def chat_chunk(self, content, finish_reason=None):
+        delta = {"content": content} if content is not None else {}
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini-2024-07-18",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def chat_usage_chunk(self, prompt_chars, completion_chars):
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini-2024-07-18",
+            "choices": [],
+            "usage": self.chat_usage(prompt_chars, completion_chars),
+        }
+
+    def tone(self, seconds, sample_rate):
+        """Synthesized audio, cached per length so the server is not the bottleneck."""
+        key = (round(seconds, 1), sample_rate)
+        with self._lock:
+            payload = self._tones.get(key)
+        if payload is None:
+            payload = _tone_pcm16(key[0], sample_rate)
+            with self._lock:
+                self._tones[key] = payload
+        return payload
@@ -0,0 +1,349 @@
+"""
+End-to-end latency benchmark for both daemons, run against local mock APIs.
+
+  ingame       - context JSON -> parse -> sample phrases -> LLM -> TTS -> WAV,
+                 through ingame_llm_tts.process_context_file
+  voice_model  - captured WAV clips -> ingest -> stitch -> model upload,
+                 through voice_model2.ingest_clip / process_batch
+
+A local stand-in server (benchmarks/mock_servers.py) replaces OpenAI and Fish Audio,
+with configurable injected latency. Each scenario runs in a fresh subprocess inside a
+scratch working directory, so peak RSS is per scenario and no real state is touched.
+
+Per stage (and end to end) the report has p50/p95/p99/mean/max in milliseconds, plus
+peak RSS and, with --tracemalloc, the peak of Python allocations. Results are written
+as JSON so runs from different versions can be compared.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--contexts 30] [--batches 3] [--openai-latency-ms 400]
+                                            [--output pipeline_benchmark.json]
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+from collections import defaultdict
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PACKAGE_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+SCENARIOS = ["ingame", "voice_model"]
+BENCH_API_KEY = "benchmark-key"
+
+
+# --- Measurement Helpers ---
+def percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list."""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples_s):
+    values = [s * 1000.0 for s in samples_s]
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "mean_ms": round(sum(values) / len(values), 3),
+        "max_ms": round(max(values), 3),
+    }
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where the resource module is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageTimer:
+    """Collects wall-clock samples per stage; wrap() times every call of a module function."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.recording = True
+
+    def wrap(self, module, attr, stage):
+        original = getattr(module, attr)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                if self.recording:
+                    self.samples[stage].append(time.perf_counter() - start)
+
+        setattr(module, attr, timed)
+
+    def record(self, stage, seconds):
+        if self.recording:
+            self.samples[stage].append(seconds)
+
+    def summary(self):
+        return {stage: summarize(samples) for stage, samples in self.samples.items() if samples}
+
+
+# --- Scenario Workers (run in a subprocess, cwd = scratch dir) ---
+def write_context(path, moon, enemy, emotion, distance):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "moonName": f"41 {moon}",
+            "enemyName": f"{enemy} (Clone)",
+            "preferredEmotion": emotion,
+            "distanceToPlayer": distance,
+        }, f)
+
+
+def run_ingame(args, timer):
+    shutil.copy(os.path.join(PACKAGE_DIR, "emotion_phrases.json"), "emotion_phrases.json")
+    import ingame_llm_tts
+    import cloned_tts
+    import llm_stream
+    from llm_cache import LLMResponseCache
+
+    ingame_llm_tts.STREAMING_LLM = not args.no_llm_streaming
+    if args.llm_deadline is not None:
+        ingame_llm_tts.LLM_DEADLINE_SECONDS = args.llm_deadline
+    if not args.llm_cache:
+        # Every context pays for an LLM round trip, which is what we want to measure
+        ingame_llm_tts.response_cache = LLMResponseCache(max_entries=0)
+    # Likewise every line is synthesized unless the TTS cache is asked for
+    cloned_tts.TTS_CACHE_ENABLED = args.tts_cache
+
+    timer.wrap(ingame_llm_tts, "parse_context_file", "parse")
+    timer.wrap(ingame_llm_tts, "load_and_select_phrases", "sample_phrases")
+    timer.wrap(ingame_llm_tts, "personalize_phrases", "personalize_llm")
+    timer.wrap(llm_stream.StreamedLines, "first", "llm_first_line")
+    timer.wrap(ingame_llm_tts, "personalize_locally", "local_fallback") # Only runs when the LLM misses its deadline
+    timer.wrap(ingame_llm_tts, "find_and_generate_with_model_name", "tts")
+
+    rng = random.Random(args.seed)
+    moons = list(ingame_llm_tts.lethal_company_moon_loot.keys())
+    enemies = list(ingame_llm_tts.lethal_company_monsters.keys())
+    emotions = ["panic", "confusion", "interest"]
+    os.makedirs("contexts", exist_ok=True)
+    os.makedirs("out", exist_ok=True)
+
+    failures = 0
+    for i in range(args.warmup + args.contexts):
+        timer.recording = i >= args.warmup
+        path = os.path.join("contexts", f"context_{i}.json")
+        write_context(path, rng.choice(moons), rng.choice(enemies), rng.choice(emotions),
+                      round(rng.uniform(1, 30), 1))
+        start = time.perf_counter()
+        ok = ingame_llm_tts.process_context_file(path, "out", BENCH_API_KEY)
+        timer.record("end_to_end", time.perf_counter() - start)
+        if not ok and timer.recording:
+            failures += 1
+    return {"runs": args.contexts, "failures": failures}
+
+
+def write_clip(path, seconds, sample_rate, rng):
+    """
+    A tone in bursts with pauses and a low noise floor, roughly like a captured voice clip
+    (16-bit mono), so it passes voice_model2's silence trimming and quality scoring.
+    """
+    frames = int(seconds * sample_rate)
+    freq = rng.uniform(120, 260)
+    envelope = lambda t: max(0.0, math.sin(2 * math.pi * 1.5 * t)) # ~0.33 s bursts and pauses
+    samples = (int(5000 * envelope(i / sample_rate) * math.sin(2 * math.pi * freq * i / sample_rate)
+                   + rng.uniform(-200, 200))
+               for i in range(frames))
+    with wave.open(path, "wb") as wav_out:
+        wav_out.setnchannels(1)
+        wav_out.setsampwidth(2)
+        wav_out.setframerate(sample_rate)
+        wav_out.writeframes(b"".join(struct.pack("<h", s) for s in samples))
+
+
+def run_voice_model(args, timer):
+    import voice_model2
+    from upload_queue import UploadQueue
+
+    voice_model2.API_TOKEN = BENCH_API_KEY
+    timer.wrap(voice_model2, "ingest_clip", "ingest_clip")
+    timer.wrap(voice_model2, "process_and_export_stitched", "stitch")
+    timer.wrap(voice_model2, "upload_to_fish_audio", "upload")
+
+    rng = random.Random(args.seed)
+    os.makedirs("captures", exist_ok=True)
+    os.makedirs(voice_model2.TEMP_FOLDER, exist_ok=True)
+    os.makedirs(voice_model2.SPOOL_FOLDER, exist_ok=True)
+    upload_queue = UploadQueue("benchmark_queue.sqlite3")
+
+    # Clips are copies of one generated capture; copying happens outside the timed section
+    template = os.path.join("captures", "template.wav")
+    write_clip(template, args.clip_seconds, args.clip_sample_rate, rng)
+
+    failures = 0
+    total = args.warmup + args.batches
+    for b in range(total):
+        timer.recording = b >= args.warmup
+        clip_paths = []
+        for c in range(args.clips_per_batch):
+            path = os.path.join("captures", f"clip_{b}_{c}.wav")
+            shutil.copy(template, path)
+            clip_paths.append(path)
+
+        start = time.perf_counter()
+        for path in clip_paths:
+            voice_model2.ingest_clip(upload_queue, path)
+        clips = upload_queue.pending_clips()
+        batch_id = upload_queue.create_batch(f"Batch_bench_{b}", [clip["id"] for clip in clips])
+        ok = voice_model2.process_batch(upload_queue, upload_queue.get_batch(batch_id))
+        timer.record("end_to_end", time.perf_counter() - start)
+        if not ok and timer.recording:
+            failures += 1
+
+    upload_queue.close()
+    return {"runs": args.batches, "failures": failures}
+
+
+def run_worker(args):
+    """Runs one scenario in this process and prints a JSON result line."""
+    timer = StageTimer()
+    if args.tracemalloc:
+        tracemalloc.start()
+    baseline_rss = peak_rss_bytes()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import logging
+        logging.disable(logging.INFO)
+        if args.worker == "ingame":
+            result = run_ingame(args, timer)
+        else:
+            result = run_voice_model(args, timer)
+
+    result["stages"] = timer.summary()
+    result["memory"] = {"baseline_rss_bytes": baseline_rss, "peak_rss_bytes": peak_rss_bytes()}
+    if args.tracemalloc:
+        result["memory"]["python_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print(json.dumps(result))
+
+
+# --- Driver ---
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PACKAGE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(name, args, server_url, forwarded):
+    work_dir = tempfile.mkdtemp(prefix=f"pipeline_bench_{name}_")
+    env = dict(os.environ,
+               FISH_AUDIO_BASE_URL=server_url,
+               OPENAI_BASE_URL=f"{server_url}/v1",
+               OPENAI_API_KEY=BENCH_API_KEY,
+               FISH_AUDIO_API_KEY=BENCH_API_KEY)
+    try:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", name] + forwarded,
+            cwd=work_dir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{name} worker failed:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        if not args.keep_work_dirs:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_report(report):
+    for name, scenario in report["scenarios"].items():
+        memory = scenario["memory"]
+        rss = memory.get("peak_rss_bytes")
+        rss_text = f", peak RSS {rss / 1e6:.1f} MB" if rss else ""
+        print(f"\n{name}: {scenario['runs']} run(s), {scenario['failures']} failure(s){rss_text}")
+        print(f"  {'stage':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'n':>5}")
+        for stage, stats in scenario["stages"].items():
+            print(f"  {stage:<18} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} "
+                  f"{stats['mean_ms']:>9.1f} {stats['count']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS + ["all"], default="all")
+    parser.add_argument("--contexts", type=int, default=30, help="Context files processed by the ingame scenario")
+    parser.add_argument("--batches", type=int, default=3, help="Batches uploaded by the voice_model scenario")
+    parser.add_argument("--clips-per-batch", type=int, default=10)
+    parser.add_argument("--clip-seconds", type=float, default=5.0)
+    parser.add_argument("--clip-sample-rate", type=int, default=48000)
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs before each scenario")
+    parser.add_argument("--openai-latency-ms", type=float, default=400.0)
+    parser.add_argument("--list-latency-ms", type=float, default=150.0)
+    parser.add_argument("--tts-latency-ms", type=float, default=300.0, help="Time to first TTS byte")
+    parser.add_argument("--upload-latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform random latency added per request")
+    parser.add_argument("--openai-token-ms", type=float, default=20.0, help="Simulated LLM generation time per token")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache enabled")
+    parser.add_argument("--tts-cache", action="store_true", help="Enable the TTS audio cache (TTS_CACHE_ENABLED)")
+    parser.add_argument("--no-llm-streaming", action="store_true", help="Wait for the full LLM response (STREAMING_LLM = False)")
+    parser.add_argument("--llm-deadline", type=float, help="Override LLM_DEADLINE_SECONDS (seconds)")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also trace Python allocations (slower)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="pipeline_benchmark.json", help="Where to write the JSON report")
+    parser.add_argument("--keep-work-dirs", action="store_true", help="Keep each scenario's scratch directory")
+    parser.add_argument("--worker", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    from mock_servers import MockAPIServer, MockLatency
+
+    latency = MockLatency(openai_ms=args.openai_latency_ms, list_ms=args.list_latency_ms,
+                          tts_ms=args.tts_latency_ms, upload_ms=args.upload_latency_ms,
+                          jitter_ms=args.jitter_ms, openai_token_ms=args.openai_token_ms, seed=args.seed)
+    forwarded = sys.argv[1:]
+    scenarios = SCENARIOS if args.scenario == "all" else [args.scenario]
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("worker", "output", "keep_work_dirs")},
+        "scenarios": {},
+    }
+    with MockAPIServer(latency) as server:
+        for name in scenarios:
+            print(f"Running {name} scenario against {server.url} ...")
+            report["scenarios"][name] = run_scenario(name, args, server.url, forwarded)
+        report["mock_server_requests"] = dict(server.requests)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nReport written to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
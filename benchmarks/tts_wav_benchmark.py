@@ -0,0 +1,161 @@
+"""
+Compares the two TTS output paths in cloned_tts.py:
+
+  legacy    - MP3 stream -> temp file -> pydub/ffmpeg decode -> +gain -> WAV export
+  streaming - PCM stream -> per-chunk gain -> WAV written in one pass
+
+The Fish Audio stream is replaced by a fake session that replays pre-encoded
+audio in network-sized chunks, so no API credits are used. Each run happens in a
+fresh subprocess so peak RSS is measured per path rather than per benchmark.
+
+Usage:
+    python benchmarks/tts_wav_benchmark.py [--seconds 4] [--runs 5] [--chunk-delay-ms 0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+SAMPLE_RATE = 44100
+CHUNK_SIZE = 4096 # Roughly what an HTTP chunked response delivers per read
+
+
+class FakeTTSSession:
+    """Stands in for fish_audio_sdk.Session; tts() yields the payload for the requested format."""
+
+    def __init__(self, payloads, chunk_delay_s=0.0):
+        self.payloads = payloads
+        self.chunk_delay_s = chunk_delay_s
+
+    def tts(self, request):
+        payload = self.payloads[getattr(request, "format", "mp3")]
+        for start in range(0, len(payload), CHUNK_SIZE):
+            if self.chunk_delay_s:
+                time.sleep(self.chunk_delay_s)
+            yield payload[start:start + CHUNK_SIZE]
+
+
+class FakeRequest:
+    def __init__(self, format, sample_rate=None):
+        self.format = format
+        self.sample_rate = sample_rate
+
+
+def build_payloads(seconds, work_dir):
+    """Builds matching MP3 and PCM payloads for a speech-like test tone."""
+    from pydub.generators import Sine
+
+    tone = Sine(220).to_audio_segment(duration=int(seconds * 1000)).apply_gain(-12)
+    tone = tone.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+
+    mp3_path = os.path.join(work_dir, "payload.mp3")
+    tone.export(mp3_path, format="mp3", bitrate="128k")
+    pcm_path = os.path.join(work_dir, "payload.pcm")
+    with open(pcm_path, "wb") as f:
+        f.write(tone.raw_data)
+    return mp3_path, pcm_path
+
+
+def peak_rss_bytes():
+    """
+    Peak resident set size of this process or of its largest child (ffmpeg in the
+    legacy path), or None where the resource module is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_worker(mode, mp3_path, pcm_path, chunk_delay_ms):
+    """Runs one conversion in this process and prints a JSON result line."""
+    import cloned_tts
+
+    with open(mp3_path, "rb") as f:
+        mp3_bytes = f.read()
+    with open(pcm_path, "rb") as f:
+        pcm_bytes = f.read()
+    session = FakeTTSSession({"mp3": mp3_bytes, "pcm": pcm_bytes}, chunk_delay_ms / 1000.0)
+
+    out_dir = tempfile.mkdtemp(prefix="tts_bench_")
+    output_file = os.path.join(out_dir, "out.wav")
+
+    baseline_rss = peak_rss_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == "legacy":
+        cloned_tts.write_tts_mp3_to_wav(session, FakeRequest("mp3"), output_file, cloned_tts.BOOST_DB)
+    else:
+        cloned_tts.stream_tts_to_wav(session, FakeRequest("pcm", SAMPLE_RATE), output_file, cloned_tts.BOOST_DB)
+    wall_s = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "mode": mode,
+        "wall_s": wall_s,
+        "python_peak_bytes": traced_peak,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "baseline_rss_bytes": baseline_rss,
+        "output_bytes": os.path.getsize(output_file),
+    }
+    os.remove(output_file)
+    os.rmdir(out_dir)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=4.0, help="Length of the synthesized voice line")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per path")
+    parser.add_argument("--chunk-delay-ms", type=float, default=0.0, help="Simulated network delay per chunk")
+    parser.add_argument("--worker", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--mp3", help=argparse.SUPPRESS)
+    parser.add_argument("--pcm", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.mp3, args.pcm, args.chunk_delay_ms)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="tts_bench_payload_")
+    mp3_path, pcm_path = build_payloads(args.seconds, work_dir)
+
+    results = {"legacy": [], "streaming": []}
+    for _ in range(args.runs):
+        for mode in results:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", mode,
+                 "--mp3", mp3_path, "--pcm", pcm_path, "--chunk-delay-ms", str(args.chunk_delay_ms)],
+                capture_output=True, text=True, check=True, cwd=PACKAGE_DIR
+            )
+            results[mode].append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"Voice line: {args.seconds:.1f}s, {args.runs} run(s) per path, chunk delay {args.chunk_delay_ms} ms\n")
+    print(f"{'path':<10} {'median wall (ms)':>17} {'py peak (KiB)':>14} {'peak RSS (MiB)':>15}")
+    for mode, runs in results.items():
+        wall_ms = statistics.median(r["wall_s"] for r in runs) * 1000
+        py_peak = statistics.median(r["python_peak_bytes"] for r in runs) / 1024
+        rss_values = [r["peak_rss_bytes"] for r in runs if r["peak_rss_bytes"] is not None]
+        rss = f"{statistics.median(rss_values) / (1024 * 1024):.1f}" if rss_values else "n/a"
+        print(f"{mode:<10} {wall_ms:>17.1f} {py_peak:>14.1f} {rss:>15}")
+
+    for path in (mp3_path, pcm_path):
+        os.remove(path)
+    os.rmdir(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Bytes on the wire and upload time of a stitched training batch per UPLOAD_ENCODING,
+against the local stand-in Fish Audio API (benchmarks/mock_servers.py).
+
+For each encoding (wav, flac, opus, mp3) a stitched-style 16 kHz mono WAV is encoded
+with upload_encoding.encode_for_upload and uploaded --runs times through
+voice_model2.upload_to_fish_audio. The stand-in reads uploads at --uplink-mbps, like a
+home connection. Uploads run in a separate process so its Python allocation peak
+(tracemalloc) covers the client only; "buffered" repeats the old requests files= upload,
+which builds the whole multipart body in memory, for comparison with the streamed one.
+
+Encoders other than wav need ffmpeg (on the PATH or in FFMPEG_BINARY); without it
+those rows fall back to WAV, as the daemon does.
+
+Usage:
+    python benchmarks/upload_encoding_benchmark.py [--seconds 50] [--runs 5] [--uplink-mbps 10]
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PACKAGE_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import numpy as np
+
+ENCODINGS = ["wav", "flac", "opus", "mp3"]
+BENCH_API_KEY = "benchmark-key"
+
+
+def write_stitched_wav(path, seconds, sample_rate):
+    """Speech-like test audio: harmonics with a syllable-rate envelope, short pauses and noise."""
+    from audio_engine import write_wav
+    rng = np.random.default_rng(1234)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = sum(np.sin(2 * math.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 560, 1120, 2240)))
+    signal *= 0.2 * np.clip(np.sin(2 * math.pi * 2.5 * t), 0, None)
+    signal += rng.normal(0, 0.005, len(t))
+    write_wav(path, signal.astype(np.float32), sample_rate)
+
+
+# --- Upload Worker (separate process) ---
+def run_worker(args):
+    """Uploads args.file args.runs times and prints a JSON result line."""
+    import voice_model2
+    from http_clients import get_requests_session, request_timeout
+    from upload_encoding import content_type_for
+
+    def upload_buffered(path):
+        # The upload as it was before MultipartFileBody: requests encodes the body in memory
+        with open(path, "rb") as audio_file:
+            files = {"voices": ("Batch_bench" + os.path.splitext(path)[1], audio_file, content_type_for(path))}
+            data = {"visibility": "private", "type": "tts", "title": "Batch_bench",
+                    "train_mode": "fast", "enhance_audio_quality": "true"}
+            response = get_requests_session().post(voice_model2.API_ENDPOINT, files=files, data=data,
+                                                   headers={"Authorization": f"Bearer {BENCH_API_KEY}"},
+                                                   timeout=request_timeout())
+        response.raise_for_status()
+        return response.json()
+
+    def upload_streamed(path):
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                return voice_model2.upload_to_fish_audio(BENCH_API_KEY, path, "Batch_bench")
+            finally:
+                sys.stdout = stdout
+
+    upload = upload_buffered if args.worker == "buffered" else upload_streamed
+    upload(args.file) # Warm-up (imports, connection)
+    times = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = upload(args.file)
+        times.append(time.perf_counter() - started)
+        if not result:
+            raise SystemExit("upload failed")
+    tracemalloc.start()
+    upload(args.file)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(json.dumps({"times": times, "python_peak_bytes": peak}))
+
+
+def measure_uploads(mode, path, args):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", mode, "--file", path, "--runs", str(args.runs)],
+        capture_output=True, text=True, env=os.environ.copy(), check=False)
+    if completed.returncode != 0:
+        raise SystemExit(f"{mode} upload worker failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=50.0, help="Length of the stitched batch")
+    parser.add_argument("--runs", type=int, default=5, help="Timed uploads per encoding")
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="Simulated uplink (0 = unlimited)")
+    parser.add_argument("--upload-latency-ms", type=float, default=0.0, help="Server processing time per upload")
+    parser.add_argument("--worker", choices=["buffered", "streamed"], help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    from mock_servers import MockAPIServer, MockLatency
+    import upload_encoding
+    from voice_model2 import TARGET_SAMPLE_RATE
+
+    work_dir = tempfile.mkdtemp(prefix="upload_encoding_bench_")
+    latency = MockLatency(upload_ms=args.upload_latency_ms, upload_kbps=args.uplink_mbps * 1000)
+    ffmpeg = upload_encoding.ffmpeg_binary()
+    print(f"{args.seconds:.0f}s batch at {TARGET_SAMPLE_RATE} Hz mono, {args.runs} upload(s) per encoding, "
+          f"uplink {args.uplink_mbps:g} Mbit/s, ffmpeg: {ffmpeg or 'not found'}\n")
+    print(f"{'encoding':<9} {'encode ms':>9} {'bytes on wire':>14} {'% of wav':>9} {'upload p50 ms':>14} "
+          f"{'client peak KiB':>16} {'(buffered)':>11}")
+    try:
+        with MockAPIServer(latency) as server:
+            os.environ["FISH_AUDIO_BASE_URL"] = server.url
+            wav_bytes = None
+            for encoding in ENCODINGS:
+                wav_path = os.path.join(work_dir, f"stitched_{encoding}.wav")
+                write_stitched_wav(wav_path, args.seconds, TARGET_SAMPLE_RATE)
+                with open(os.devnull, "w") as devnull:
+                    stdout, sys.stdout = sys.stdout, devnull
+                    try:
+                        started = time.perf_counter()
+                        upload_path = upload_encoding.encode_for_upload(wav_path, encoding)
+                        encode_s = time.perf_counter() - started
+                    finally:
+                        sys.stdout = stdout
+
+                buffered = measure_uploads("buffered", upload_path, args)
+                streamed = measure_uploads("streamed", upload_path, args)
+                # Body of the last (streamed: multipart) request, i.e. what crosses the network
+                on_wire = server.upload_sizes[-1]
+                wav_bytes = wav_bytes or on_wire
+                fell_back = upload_path.endswith(".wav") and encoding != "wav"
+                label = encoding + ("*" if fell_back else "")
+                print(f"{label:<9} {encode_s * 1000:>9.1f} {on_wire:>14,} {on_wire / wav_bytes:>9.0%} "
+                      f"{statistics.median(streamed['times']) * 1000:>14.1f} "
+                      f"{streamed['python_peak_bytes'] / 1024:>16.0f} {buffered['python_peak_bytes'] / 1024:>11.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if not ffmpeg:
+        print("\n* ffmpeg not found: uploaded as WAV")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Checks that voice_model2.py never strands or loses captured clips in the upload queue.
+
+Each check runs against a fresh queue database in a temporary folder:
+
+  abandon  - a batch that fails MAX_UPLOAD_ATTEMPTS times returns its clips to pending
+  legacy   - clips of a batch abandoned by an older version are returned at startup
+  waiting  - a pool too small for a batch survives expiry, however old it is
+  expiry   - clips build_batch left out are discarded PENDING_CLIP_MAX_AGE_HOURS later
+  stale    - process_batch handed a stale row of an already uploaded batch does nothing
+  guards   - stitching and upload transitions leave an uploaded batch untouched
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python benchmarks/upload_queue_check.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+from upload_queue import (UploadQueue, MAX_UPLOAD_ATTEMPTS, BATCH_ABANDONED, BATCH_UPLOADED, CLIP_BATCHED,
+                          CLIP_PENDING, CLIP_UPLOADED)
+
+
+def add_clips(queue, count, speech_ms=10000.0):
+    return [queue.add_clip(f"spool/{i}.wav", f"{i}.wav", 1, i, speech_ms, speech_ms) for i in range(count)]
+
+
+def fail_until_abandoned(queue, batch_id):
+    for _ in range(MAX_UPLOAD_ATTEMPTS):
+        queue.finish_attempt(queue.start_attempt(batch_id), batch_id, error="upload failed")
+
+
+def upload_batch(queue, title, clip_count=3):
+    """A stitched batch whose upload succeeded. Returns (batch id, row as it was before the upload)."""
+    batch_id = queue.create_batch(title, add_clips(queue, clip_count))
+    queue.mark_stitched(batch_id, f"stitched_{title}.wav", clip_count * 10000.0)
+    before = queue.get_batch(batch_id)
+    queue.finish_attempt(queue.start_attempt(batch_id), batch_id, model_id=f"model-{title}")
+    return batch_id, before
+
+
+def check_abandon(queue):
+    clip_ids = add_clips(queue, 3)
+    batch_id = queue.create_batch("Batch_abandon", clip_ids)
+    queue.mark_stitched(batch_id, "stitched_Batch_abandon.wav", 30000.0)
+    fail_until_abandoned(queue, batch_id)
+    assert queue.get_batch(batch_id)["state"] == BATCH_ABANDONED
+    assert queue.batch_clips(batch_id) == [], "abandoned batch still holds clips"
+    assert [clip["id"] for clip in queue.pending_clips()] == clip_ids, "clips not back in pending"
+    # A later batch can take them
+    retry_id = queue.create_batch("Batch_retry", clip_ids)
+    assert len(queue.batch_clips(retry_id)) == 3
+
+
+def check_legacy(queue):
+    clip_ids = add_clips(queue, 2)
+    batch_id = queue.create_batch("Batch_legacy", clip_ids)
+    # As an older version left it: abandoned, clips still batched
+    queue._conn.execute("UPDATE batches SET state = ? WHERE id = ?", (BATCH_ABANDONED, batch_id))
+    assert all(clip["state"] == CLIP_BATCHED for clip in queue.batch_clips(batch_id))
+    queue.recover_interrupted()
+    assert [clip["state"] for clip in queue.pending_clips()] == [CLIP_PENDING] * 2, "legacy clips not returned"
+
+
+def check_waiting(queue):
+    from voice_model2 import expire_pending_clips, PENDING_CLIP_MAX_AGE_HOURS
+    clip_ids = add_clips(queue, 3) # 30s: below the candidate pool, so no batch is built
+    later = time.time() + (PENDING_CLIP_MAX_AGE_HOURS + 1) * 3600
+    assert expire_pending_clips(queue, now=later) == 0, "waiting clips were discarded"
+    assert [clip["id"] for clip in queue.pending_clips()] == clip_ids
+
+
+def check_expiry(queue):
+    from voice_model2 import build_batch, expire_pending_clips, PENDING_CLIP_MAX_AGE_HOURS, \
+        TARGET_TOTAL_DURATION_SECONDS
+    count = int(TARGET_TOTAL_DURATION_SECONDS / 10) + 2
+    add_clips(queue, count)
+    build_batch(queue, queue.pending_clips())
+    left_out = [clip["id"] for clip in queue.pending_clips()]
+    assert len(left_out) == 2, f"expected 2 clips left out, got {len(left_out)}"
+    max_age = PENDING_CLIP_MAX_AGE_HOURS * 3600
+    assert expire_pending_clips(queue, now=time.time() + max_age - 60) == 0, "discarded too early"
+    assert expire_pending_clips(queue, now=time.time() + max_age + 60) == 2, "left-out clips not discarded"
+    assert queue.pending_clips() == []
+
+
+def check_stale(queue):
+    import voice_model2
+    batch_id, stale_row = upload_batch(queue, "Batch_stale")
+    uploads = []
+    upload, voice_model2.upload_to_fish_audio = voice_model2.upload_to_fish_audio, \
+        lambda *args: uploads.append(args) or "duplicate-model"
+    try:
+        result = voice_model2.process_batch(queue, stale_row)
+    finally:
+        voice_model2.upload_to_fish_audio = upload
+    assert result is None, f"process_batch returned {result!r} for an uploaded batch"
+    assert not uploads, "uploaded batch was uploaded again"
+    batch = queue.get_batch(batch_id)
+    assert (batch["state"], batch["model_id"]) == (BATCH_UPLOADED, "model-Batch_stale"), dict(batch)
+
+
+def check_guards(queue):
+    batch_id, _ = upload_batch(queue, "Batch_guards")
+    assert queue.start_attempt(batch_id) is None, "upload attempt started on an uploaded batch"
+    assert queue.fail_stitching(batch_id, "clips gone") is False, "stitching failure recorded on an uploaded batch"
+    assert queue.mark_stitched(batch_id, "other.wav", 1.0) is False, "uploaded batch marked stitched"
+    assert queue.get_due_batch(batch_id) is None
+    batch = queue.get_batch(batch_id)
+    assert (batch["state"], batch["attempts"], batch["stitched_path"]) == \
+        (BATCH_UPLOADED, 0, "stitched_Batch_guards.wav"), dict(batch)
+    assert {clip["state"] for clip in queue.batch_clips(batch_id)} == {CLIP_UPLOADED}
+
+
+CHECKS = {"abandon": check_abandon, "legacy": check_legacy, "waiting": check_waiting, "expiry": check_expiry,
+          "stale": check_stale, "guards": check_guards}
+
+
+def main():
+    failed = 0
+    for name, check in CHECKS.items():
+        work_dir = tempfile.mkdtemp(prefix="upload_queue_check_")
+        queue = UploadQueue(os.path.join(work_dir, "queue.sqlite3"))
+        try:
+            check(queue)
+            print(f"{name:<8} ok")
+        except AssertionError as e:
+            failed += 1
+            print(f"{name:<8} FAILED: {e}")
+        finally:
+            queue.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from collections import namedtuple
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from audio_engine import WavInfo, probe_wav, iter_wav_chunks, to_mono
+from voice_activity import (VoiceActivity, FrameEnergies, activity_from_energies, level_db, noise_floor_db)
+
+# --- Configuration ---
+CLIP_LEVEL = 0.99               # |sample| at or above this (of full scale) counts as clipped
+GOOD_SNR_DB = 30                # Speech this far above the noise floor scores full marks for noise
+MAX_CLIPPING_RATIO = 0.01       # A clip with this share of clipped samples scores zero
+GOOD_LEVEL_DBFS = (-30, -10)    # Speech RMS in this range scores full marks for level...
+LEVEL_FALLOFF_DB = 15           # ...dropping to zero this far outside it
+MIN_NOISE_FRAMES = 5            # Non-speech frames needed to measure the noise directly (else it is estimated)
+UNSCORED_CLIP_SCORE = 0.5       # Rank of clips recorded before scoring existed
+
+ClipQuality = namedtuple("ClipQuality", [
+    "score",           # 0 (unusable) .. 1 (clean, well-levelled speech)
+    "snr_db",          # speech level over the clip's noise floor
+    "clipping_ratio",  # share of samples at full scale
+    "rms_dbfs",        # speech level
+])
+
+
+def analyze_clip(filepath: str, info: Optional[WavInfo] = None) -> Tuple[VoiceActivity, ClipQuality]:
+    """Voice activity and quality of a WAV file, from one chunked pass over its samples."""
+    info = info or probe_wav(filepath)
+    energies = FrameEnergies(info.sample_rate)
+    clipped = 0
+    for chunk in iter_wav_chunks(filepath, info):
+        clipped += int(np.count_nonzero((chunk >= CLIP_LEVEL) | (chunk <= -CLIP_LEVEL)))
+        energies.add(to_mono(chunk))
+    frame_energies = energies.finish()
+    activity = activity_from_energies(frame_energies, energies.frame_len, info)
+    speech = _speech_mask(len(frame_energies), energies.frame_len, activity.segments)
+    quality = score_clip(frame_energies, speech, clipped / max(info.frames * info.channels, 1))
+    return activity, quality
+
+
+def score_clip(energies: np.ndarray, speech: np.ndarray, clipping_ratio: float) -> ClipQuality:
+    """
+    Scores a clip from its frame energies and which frames are speech. The score is the
+    product of three terms in [0, 1] (SNR, level, clipping), so one bad property is enough
+    to push a clip to the back of the line.
+    """
+    if not speech.any():
+        return ClipQuality(0.0, 0.0, clipping_ratio, round(float(level_db(np.array([energies.mean()]))[0]), 2))
+    rms_dbfs = float(level_db(np.array([energies[speech].mean()]))[0])
+    if np.count_nonzero(~speech) >= MIN_NOISE_FRAMES:
+        noise_dbfs = float(level_db(np.array([energies[~speech].mean()]))[0])
+    else:
+        noise_dbfs = noise_floor_db(level_db(energies)) # Quietest frames (pauses between words)
+    snr_db = max(rms_dbfs - noise_dbfs, 0.0)
+
+    snr_term = min(snr_db / GOOD_SNR_DB, 1.0)
+    low, high = GOOD_LEVEL_DBFS
+    distance = max(low - rms_dbfs, rms_dbfs - high, 0.0)
+    level_term = max(1.0 - distance / LEVEL_FALLOFF_DB, 0.0)
+    clipping_term = max(1.0 - clipping_ratio / MAX_CLIPPING_RATIO, 0.0)
+    return ClipQuality(round(snr_term * level_term * clipping_term, 4), round(snr_db, 2),
+                       clipping_ratio, round(rms_dbfs, 2))
+
+
+def select_for_batch(clips: Sequence, budget_ms: float) -> List[int]:
+    """
+    IDs of the highest-scoring clips (rows with id, speech_ms and quality_score), best
+    first and oldest first among equals, until their speech reaches budget_ms.
+    """
+    ranked = sorted(clips, key=lambda clip: (-_clip_score(clip), clip["id"]))
+    selected = []
+    total_ms = 0.0
+    for clip in ranked:
+        if total_ms >= budget_ms:
+            break
+        selected.append(clip["id"])
+        total_ms += clip["speech_ms"]
+    return selected
+
+
+def _clip_score(clip) -> float:
+    return clip["quality_score"] if clip["quality_score"] is not None else UNSCORED_CLIP_SCORE
+
+
+def _speech_mask(frame_count: int, frame_len: int, segments) -> np.ndarray:
+    """Boolean per frame: inside one of the (sample) segments."""
+    mask = np.zeros(frame_count, dtype=bool)
+    for start, end in segments:
+        mask[start // frame_len:-(-end // frame_len)] = True
+    return mask
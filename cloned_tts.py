@@ -1,14 +1,24 @@
 import os
 from dotenv import load_dotenv
-from fish_audio_sdk import Session, TTSRequest
-from fish_audio_sdk.schemas import PaginatedResponse, ModelEntity, Prosody # Import relevant schemas
+from fish_audio_sdk import TTSRequest
+from fish_audio_sdk.schemas import Prosody
 import logging
 import sys # To exit gracefully
 from thefuzz import process # Import for fuzzy matching
 import random
+import time
 
 from pydub import AudioSegment
 import tempfile
+import numpy as np
+
+from audio_engine import CHUNK_FRAMES, WavWriter, apply_gain, pcm16_view, to_float32
+
+from model_registry import get_registry
+from backend_limits import backend_slot
+from http_clients import get_fish_session
+from tts_cache import get_tts_cache, tts_cache_key
+import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -25,10 +35,97 @@ TEXT_TO_SPEAK = "Oh nice! Where did you find it??"
 # Output filename
 OUTPUT_FILENAME = "cloned_voice.mp3"
 
-# How many models to fetch per page when searching (increase if you have many models)
-MODELS_PER_PAGE_SEARCH = 50
 OUTPUT_DIR = "data" # Define output directory
 
+# Volume boost applied to generated speech (in dB)
+BOOST_DB = 12
+
+# Streaming mode: request raw PCM from Fish Audio and write the boosted WAV in one pass
+# as chunks arrive. Set to False to use the MP3 -> pydub -> WAV path.
+STREAMING_TTS = True
+TTS_SAMPLE_RATE = 44100 # Sample rate requested from Fish Audio in streaming mode
+TTS_SAMPLE_WIDTH = 2    # Fish Audio PCM output is 16-bit signed little-endian mono
+
+# Reuse finished WAVs for repeated (model, text, prosody) requests, see tts_cache.py
+TTS_CACHE_ENABLED = True
+
+# --- TTS Output Writers ---
+def write_tts_mp3_to_wav(session, request, output_file: str, boost_db: float):
+    """
+    Original path: saves the full MP3 stream to a temp file and decodes it with
+    pydub (ffmpeg); the gain and WAV export are done by audio_engine.
+
+    Like the streaming path, the WAV is exported to '<output_file>.part' and renamed,
+    so an existing output file (possibly a hardlink into the TTS cache) is replaced
+    rather than overwritten in place.
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_mp3:
+        tmp_mp3_path = tmp_mp3.name
+        print(f"Saving temporary MP3 to: {tmp_mp3_path}")
+        with metrics.span("tts_stream"):
+            for chunk in session.tts(request):
+                tmp_mp3.write(chunk)
+
+    try:
+        # Convert to WAV using pydub
+        print(f"Converting MP3 to WAV and saving to: {output_file}")
+
+        with metrics.span("mp3_decode"):
+            audio = AudioSegment.from_mp3(tmp_mp3_path)
+
+        # INDREASE VOLUME and export louder audio, a chunk at a time
+        dtype = {1: np.uint8, 2: np.dtype("<i2"), 4: np.dtype("<i4")}[audio.sample_width]
+        samples = np.frombuffer(audio.raw_data, dtype=dtype).reshape(-1, audio.channels)
+        partial_path = output_file + ".part"
+        with metrics.span("wav_export"), WavWriter(partial_path, audio.frame_rate, audio.channels) as wav_out:
+            for start in range(0, len(samples), CHUNK_FRAMES):
+                wav_out.write(apply_gain(to_float32(samples[start:start + CHUNK_FRAMES]), boost_db))
+        os.replace(partial_path, output_file)
+    finally:
+        # Clean up temporary MP3
+        os.remove(tmp_mp3_path)
+        if os.path.exists(output_file + ".part"):
+            os.remove(output_file + ".part")
+
+def stream_tts_to_wav(session, request, output_file: str, boost_db: float):
+    """
+    Streaming path: expects a request with format="pcm" and writes each chunk to
+    the WAV file as soon as it arrives, with the gain applied per chunk.
+
+    The WAV is written to '<output_file>.part' and renamed when complete, so
+    readers never see a half-written file.
+    """
+    sample_rate = getattr(request, "sample_rate", None) or TTS_SAMPLE_RATE
+    partial_path = output_file + ".part"
+    pending = b"" # Odd trailing byte carried over between chunks
+    # Gain and WAV writes are interleaved with the download, so their time is summed per chunk
+    gain_seconds = 0.0
+    export_seconds = 0.0
+
+    try:
+        with metrics.span("tts_stream"), WavWriter(partial_path, sample_rate) as wav_out:
+            for chunk in session.tts(request):
+                if pending:
+                    chunk = pending + chunk
+                usable = len(chunk) - (len(chunk) % TTS_SAMPLE_WIDTH)
+                pending = chunk[usable:]
+                if usable:
+                    # The limiter is memoryless, so chunks can be boosted independently
+                    started = time.perf_counter()
+                    boosted = apply_gain(to_float32(pcm16_view(chunk)), boost_db)
+                    boosted_at = time.perf_counter()
+                    wav_out.write(boosted)
+                    gain_seconds += boosted_at - started
+                    export_seconds += time.perf_counter() - boosted_at
+
+        metrics.observe("gain", gain_seconds)
+        metrics.observe("wav_export", export_seconds)
+
+        os.replace(partial_path, output_file)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
 # --- Function Definition (Keep find_and_generate_with_model_name as is) ---
 def find_and_generate_with_model_name(api_key: str, model_name_to_find: str, text: str, output_file: str, emotion):
 
@@ -59,43 +156,27 @@ def find_and_generate_with_model_name(api_key: str, model_name_to_find: str, tex
     found_model_id = None
 
     try:
-        print("Initializing Fish Audio session...")
-        session = Session(api_key)
-
-        print(f"Fetching own voice models (page size: {MODELS_PER_PAGE_SEARCH}) to find exact match for '{model_name_to_find}'...")
-        paginated_response: PaginatedResponse[ModelEntity] = session.list_models(
-            self_only=True,
-            page_size=MODELS_PER_PAGE_SEARCH
-        )
-
-        if paginated_response and hasattr(paginated_response, 'items') and paginated_response.items:
-            models_list = paginated_response.items
+        # Shared session: its keep-alive connections are reused across calls
+        session = get_fish_session(api_key)
 
-            model_title_to_id = {
-                getattr(m, 'title', ''): getattr(m, 'id', None)
-                for m in models_list if hasattr(m, 'title') and hasattr(m, 'id') and getattr(m, 'title', '')
-            }
+        print(f"Looking up model ID for '{model_name_to_find}' in the model registry...")
+        registry = get_registry(api_key)
+        with metrics.span("model_listing"):
+            found_model_id = registry.get_model_id(model_name_to_find)
 
+        if found_model_id:
+            print(f"Exact match found: '{model_name_to_find}' with ID: {found_model_id}")
+        else:
+            model_title_to_id = registry.get_title_to_id()
             if not model_title_to_id:
-                 print("ERROR: Could not extract any valid model titles and IDs from the fetched list.")
-                 return False
-
-            print(f"Found {len(model_title_to_id)} owned models with titles. Searching for exact match '{model_name_to_find}'...")
-
-            if model_name_to_find in model_title_to_id:
-                found_model_id = model_title_to_id[model_name_to_find]
-                print(f"Exact match found: '{model_name_to_find}' with ID: {found_model_id}")
-            else:
-                print(f"ERROR: Exact match not found for '{model_name_to_find}'.")
-                print("Available model titles:")
-                for title in model_title_to_id.keys():
-                    print(f"  - {title}")
-                # Don't return False here in the loop context, just skip this iteration maybe?
-                # Or let the caller handle it. For now, returning False as before.
+                print("ERROR: No models found for your account or failed to retrieve models.")
                 return False
 
-        else:
-            print("ERROR: No models found for your account or failed to retrieve models.")
+            metrics.incr("tts_failures", reason="model_not_found")
+            print(f"ERROR: Exact match not found for '{model_name_to_find}'.")
+            print("Available model titles:")
+            for title in model_title_to_id.keys():
+                print(f"  - {title}")
             return False
 
         # MODIFY THIS
@@ -110,41 +191,52 @@ def find_and_generate_with_model_name(api_key: str, model_name_to_find: str, tex
         # 3. Generate audio using the found model ID
         logging.info(f"Preparing TTS request for model ID: {found_model_id}")
         # request = TTSRequest(text=text, reference_id=found_model_id) # Use reference_id for TTS with a specific model
-        request = TTSRequest(
-            text=text,
-            reference_id=found_model_id,
-            prosody=prosody
-        )
+        if STREAMING_TTS:
+            # Ask for raw PCM so chunks can be boosted and written as they arrive
+            request = TTSRequest(
+                text=text,
+                reference_id=found_model_id,
+                prosody=prosody,
+                format="pcm",
+                sample_rate=TTS_SAMPLE_RATE
+            )
+        else:
+            request = TTSRequest(
+                text=text,
+                reference_id=found_model_id,
+                prosody=prosody
+            )
+
+        cache_key = None
+        if TTS_CACHE_ENABLED:
+            cache_key = tts_cache_key(
+                found_model_id, text, prosody,
+                audio_format=request.format,
+                sample_rate=request.sample_rate,
+                boost_db=BOOST_DB
+            )
+            if get_tts_cache().publish(cache_key, output_file):
+                print(f"Served cached audio for text: '{text}'")
+                print(f"Saved audio to: {output_file}")
+                return True
 
         print(f"Generating audio for text: '{text}'")
         print(f"Saving audio to: {output_file}")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_mp3:
-            tmp_mp3_path = tmp_mp3.name
-            print(f"Saving temporary MP3 to: {tmp_mp3_path}")
-            for chunk in session.tts(request):
-                tmp_mp3.write(chunk)
-        
-        # Convert to WAV using pydub
-        print(f"Converting MP3 to WAV and saving to: {output_file}")
-
-        audio = AudioSegment.from_mp3(tmp_mp3_path)
-
-        # INDREASE VOLUME
-        boost_db = 12
-        louder_audio = audio + boost_db
-
-        # Export louder audio
-        louder_audio.export(output_file, format="wav")
-
+        with backend_slot("fish_audio"):
+            if STREAMING_TTS:
+                stream_tts_to_wav(session, request, output_file, BOOST_DB)
+            else:
+                write_tts_mp3_to_wav(session, request, output_file, BOOST_DB)
 
-        # Clean up temporary MP3
-        os.remove(tmp_mp3_path)
+        if cache_key is not None:
+            get_tts_cache().store(cache_key, output_file)
 
         print(f"Successfully generated audio file: {output_file}")
         return True
 
     except Exception as e:
+        metrics.incr("tts_failures", reason="error")
         print(f"ERROR: An unexpected error occurred during generation for '{output_file}': {e}")
         import traceback
         traceback.print_exc()
@@ -0,0 +1,158 @@
+import time
+import heapq
+import threading
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+import metrics
+
+# --- Configuration ---
+MAX_CONTEXT_AGE_SECONDS = 5.0   # Contexts older than this when a worker frees up are dropped
+COALESCE_WINDOW_SECONDS = 3.0   # Contexts for the same (enemy, emotion) within this window are merged
+
+
+def context_key(context: dict) -> Tuple[str, str]:
+    """Contexts with the same key are near-duplicates: they would produce interchangeable lines."""
+    return (str(context.get("enemy_name", "")).strip().lower(),
+            str(context.get("preferred_emotion", "")).strip().lower())
+
+
+def context_urgency(context: dict) -> float:
+    """Sort key: the closer the enemy is to the player, the sooner the line is needed."""
+    try:
+        return float(context.get("distance_to_player"))
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+class ContextScheduler:
+    """
+    Sits in front of a ContextExecutor and decides which context files get a worker.
+
+    Work is only handed to the executor when one of its workers is free; until then it
+    waits here, ordered by urgency (distance to player), so a burst of context files does
+    not queue up in arrival order. Before dispatch:
+
+    - a context for the same (enemy, emotion) as one still waiting replaces it, and one
+      for a key dispatched less than coalesce_window_seconds ago is dropped;
+    - a context older than max_age_seconds (by its file time) is dropped, since its
+      line would arrive too late to be played.
+
+    run_fn(name, context, created_at) does the actual work and runs on the executor.
+    """
+
+    def __init__(self, executor, run_fn: Callable[[str, dict, float], object],
+                 max_age_seconds: float = MAX_CONTEXT_AGE_SECONDS,
+                 coalesce_window_seconds: float = COALESCE_WINDOW_SECONDS):
+        self.executor = executor
+        self.run_fn = run_fn
+        self.max_age_seconds = max_age_seconds
+        self.coalesce_window_seconds = coalesce_window_seconds
+
+        self._lock = threading.Lock()
+        self._heap = []                     # (urgency, seq, key)
+        self._pending: Dict[tuple, dict] = {} # key -> {"seq", "name", "context", "created_at", "queued_at"}
+        self._last_dispatch: Dict[tuple, float] = {} # key -> monotonic time of the last dispatch
+        self._seq = 0
+        self._in_flight = 0
+        self.submitted = 0
+        self.dispatched = 0
+        self.coalesced = 0
+        self.dropped_stale = 0
+
+    # --- Public API ---
+    def submit(self, name: str, context: dict, created_at: Optional[float] = None):
+        """
+        Offers a parsed context. created_at is the wall-clock time the game wrote it
+        (e.g. the file mtime) and defaults to now.
+        """
+        created_at = time.time() if created_at is None else created_at
+        key = context_key(context)
+        now = time.monotonic()
+        with self._lock:
+            self.submitted += 1
+            last = self._last_dispatch.get(key)
+            if last is not None and now - last < self.coalesce_window_seconds:
+                self.coalesced += 1
+                metrics.incr("contexts_coalesced")
+                print(f"Coalesced context file: {name} (same enemy/emotion line already in progress)")
+                return
+
+            replaced = self._pending.get(key)
+            if replaced is not None:
+                # The newer context has the more current distance; it keeps the older one's wait time
+                self.coalesced += 1
+                metrics.incr("contexts_coalesced")
+                print(f"Coalesced context file: {replaced['name']} -> {name}")
+            self._seq += 1
+            self._pending[key] = {
+                "seq": self._seq,
+                "name": name,
+                "context": context,
+                "created_at": created_at,
+                "queued_at": replaced["queued_at"] if replaced else now,
+            }
+            heapq.heappush(self._heap, (context_urgency(context), self._seq, key))
+        self._pump()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.time()
+            oldest = min((entry["created_at"] for entry in self._pending.values()), default=None)
+            return {
+                "pending": len(self._pending),
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "dispatched": self.dispatched,
+                "coalesced": self.coalesced,
+                "dropped_stale": self.dropped_stale,
+                "oldest_pending_age": round(now - oldest, 3) if oldest is not None else 0.0,
+            }
+
+    # --- Internal Helpers ---
+    def _pump(self):
+        """Hands the most urgent fresh contexts to the executor while it has free workers."""
+        to_run = []
+        with self._lock:
+            now = time.monotonic()
+            wall_now = time.time()
+            while self._heap and self._in_flight + len(to_run) < self.executor.max_workers:
+                _, seq, key = heapq.heappop(self._heap)
+                entry = self._pending.get(key)
+                if entry is None or entry["seq"] != seq:
+                    continue # Superseded by a newer context for the same key
+                del self._pending[key]
+
+                age = wall_now - entry["created_at"]
+                if age > self.max_age_seconds:
+                    self.dropped_stale += 1
+                    metrics.incr("contexts_dropped_stale")
+                    print(f"Dropped stale context file: {entry['name']} ({age:.1f}s old)")
+                    continue
+
+                self._last_dispatch[key] = now
+                metrics.observe("context_queue_wait", now - entry["queued_at"])
+                to_run.append(entry)
+            self._in_flight += len(to_run)
+            self.dispatched += len(to_run)
+            # Forget dispatch times that can no longer coalesce anything
+            for key in [k for k, t in self._last_dispatch.items() if now - t >= self.coalesce_window_seconds]:
+                del self._last_dispatch[key]
+
+        for entry in to_run:
+            try:
+                future = self.executor.submit(entry["name"], self.run_fn, entry["name"], entry["context"], entry["created_at"])
+            except Exception as e:
+                logging.error(f"Could not start context '{entry['name']}': {e}")
+                self._on_done(None)
+                continue
+            future.add_done_callback(self._on_done)
+
+    def _on_done(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._pump()
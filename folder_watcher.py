@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import metrics
+
+# --- Configuration ---
+POLL_INTERVAL_SECONDS = 0.25 # Scan interval of the stat-based fallback
+# A file is treated as complete once its size and mtime have not changed for this long
+SETTLE_SECONDS = 0.5
+
+# inotify event masks (from <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len
+
+
+class FolderWatcher:
+    """
+    Delivers files in a folder once they are completely written, each file at most once.
+
+    On Linux this waits on inotify IN_CLOSE_WRITE / IN_MOVED_TO events, so files are
+    delivered the moment the writer closes them. Elsewhere (or if inotify is unavailable)
+    it falls back to scanning with os.scandir and waiting until size and mtime settle.
+    Files already present when the watcher starts are delivered on the first call.
+    """
+
+    def __init__(self, folder: str, suffixes: Sequence[str], poll_interval: float = POLL_INTERVAL_SECONDS,
+                 settle_seconds: float = SETTLE_SECONDS, use_inotify: Optional[bool] = None):
+        self.folder = folder
+        self.suffixes = tuple(s.lower() for s in suffixes)
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+
+        self._delivered = set()                                # names handed out and still present
+        self._last_seen: Dict[str, Tuple[int, int]] = {}       # name -> (size, mtime_ns) from the previous scan
+        self._needs_scan = True                                # inotify: rescan pending (startup / overflow)
+        self._unsettled = 0
+        self._inotify_fd: Optional[int] = None
+
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith("linux")
+        if use_inotify:
+            self._inotify_fd = self._open_inotify()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify_fd is not None else "polling"
+
+    # --- Public API ---
+    def wait_for_files(self, timeout: float) -> List[str]:
+        """
+        Blocks for up to `timeout` seconds and returns the paths of newly completed files
+        (possibly an empty list). Returns as soon as at least one file is ready.
+        """
+        if self._inotify_fd is not None:
+            return self._wait_inotify(timeout)
+        return self._wait_polling(timeout)
+
+    def close(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+    # --- Shared Helpers ---
+    def _matches(self, name: str) -> bool:
+        return name.lower().endswith(self.suffixes)
+
+    def _scan(self) -> List[str]:
+        with metrics.span("scan"):
+            return self._scan_entries()
+
+    def _scan_entries(self) -> List[str]:
+        """
+        Scans the folder once. Returns files that have not been modified for settle_seconds
+        and whose size/mtime match the previous scan (or that predate it).
+        Sets _unsettled to the number of matching files that are not ready yet.
+        """
+        ready = []
+        self._unsettled = 0
+        current: Dict[str, Tuple[int, int]] = {}
+        now_ns = time.time_ns()
+        settle_ns = int(self.settle_seconds * 1e9)
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError as e:
+            print(f"Error listing directory {self.folder}: {e}. Retrying next cycle.")
+            return ready
+
+        for entry in entries:
+            if not self._matches(entry.name):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue # Removed between scandir() and stat()
+            signature = (st.st_size, st.st_mtime_ns)
+            current[entry.name] = signature
+            if entry.name in self._delivered:
+                continue
+            settled = now_ns - st.st_mtime_ns >= settle_ns
+            previous = self._last_seen.get(entry.name)
+            unchanged = previous is None or previous == signature
+            if settled and unchanged:
+                self._delivered.add(entry.name)
+                ready.append(entry.path)
+            else:
+                self._unsettled += 1
+
+        # Forget files that disappeared so the bookkeeping stays as small as the folder
+        self._delivered.intersection_update(current.keys())
+        self._last_seen = current
+        return ready
+
+    # --- Polling Backend ---
+    def _wait_polling(self, timeout: float) -> List[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            ready = self._scan()
+            remaining = deadline - time.monotonic()
+            if ready or remaining <= 0:
+                return ready
+            time.sleep(min(self.poll_interval, remaining))
+
+    # --- inotify Backend ---
+    def _open_inotify(self) -> Optional[int]:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+            wd = libc.inotify_add_watch(fd, os.fsencode(self.folder), mask)
+            if wd < 0:
+                err = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(err, f"inotify_add_watch failed for {self.folder}")
+            return fd
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify unavailable ({e}); falling back to polling {self.folder}.")
+            return None
+
+    def _wait_inotify(self, timeout: float) -> List[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._needs_scan:
+                # Files written before the watch existed (or lost to a queue overflow) produce
+                # no further events, so keep scanning until none of them are left unsettled.
+                ready = self._scan()
+                self._needs_scan = self._unsettled > 0
+                if ready:
+                    return ready
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            wait = min(remaining, self.poll_interval) if self._needs_scan else remaining
+            readable, _, _ = select.select([self._inotify_fd], [], [], wait)
+            if readable:
+                ready = self._read_events()
+                if ready:
+                    return ready
+
+    def _read_events(self) -> List[str]:
+        try:
+            data = os.read(self._inotify_fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        ready = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                self._needs_scan = True
+                continue
+            if not name or not self._matches(name):
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._delivered.discard(name)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and name not in self._delivered:
+                path = os.path.join(self.folder, name)
+                if os.path.isfile(path):
+                    self._delivered.add(name)
+                    ready.append(path)
+        return ready
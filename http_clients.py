@@ -0,0 +1,248 @@
+import os
+import uuid
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from fish_audio_sdk import Session
+from openai import OpenAI
+
+# --- Configuration ---
+load_dotenv() # Base URL overrides may come from .env; this module is imported before the scripts load it
+FISH_AUDIO_BASE_URL = os.getenv("FISH_AUDIO_BASE_URL", "https://api.fish.audio")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") # None means the OpenAI default
+# Keep-alive connections per host. Requests beyond the limit wait for a free connection.
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 8
+MAX_CONNECTIONS_PER_HOST = {
+    "api.fish.audio": 8,
+    "api.openai.com": 8,
+}
+CONNECT_TIMEOUT_SECONDS = 10
+READ_TIMEOUT_SECONDS = 120   # Model uploads and TTS streams can take a while
+KEEPALIVE_EXPIRY_SECONDS = 60
+
+
+# --- Connection Reuse Counters ---
+class ConnectionStats:
+    """Counts requests and newly opened connections per host; the difference is reuse."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Dict[str, int] = defaultdict(int)
+        self._connections: Dict[str, int] = defaultdict(int)
+
+    def record_request(self, host: str):
+        with self._lock:
+            self._requests[host] += 1
+
+    def record_connection(self, host: str):
+        with self._lock:
+            self._connections[host] += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                host: {
+                    "requests": self._requests[host],
+                    "new_connections": self._connections[host],
+                    "reused": max(self._requests[host] - self._connections[host], 0),
+                }
+                for host in set(self._requests) | set(self._connections)
+            }
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._connections.clear()
+
+stats = ConnectionStats()
+
+def connection_stats() -> Dict[str, dict]:
+    """Returns {host: {"requests", "new_connections", "reused"}} across all shared clients."""
+    return stats.snapshot()
+
+def _host_limit(url_or_host: str) -> int:
+    host = urlsplit(url_or_host).hostname if "://" in url_or_host else url_or_host
+    return MAX_CONNECTIONS_PER_HOST.get(host, DEFAULT_MAX_CONNECTIONS_PER_HOST)
+
+
+# --- requests (used for multipart model uploads) ---
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        stats.record_connection(self.host)
+        return super()._new_conn()
+
+    def urlopen(self, *args, **kwargs):
+        stats.record_request(self.host)
+        return super().urlopen(*args, **kwargs)
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        stats.record_connection(self.host)
+        return super()._new_conn()
+
+    def urlopen(self, *args, **kwargs):
+        stats.record_request(self.host)
+        return super().urlopen(*args, **kwargs)
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+_requests_session: Optional[requests.Session] = None
+_requests_lock = threading.Lock()
+
+def get_requests_session() -> requests.Session:
+    """Shared requests.Session with keep-alive pools sized per host."""
+    global _requests_session
+    with _requests_lock:
+        if _requests_session is None:
+            session = requests.Session()
+            for host, limit in MAX_CONNECTIONS_PER_HOST.items():
+                session.mount(f"https://{host}", _PooledAdapter(pool_maxsize=limit, pool_block=True))
+            # Everything else (including local stand-in servers) uses the default size
+            default_adapter = _PooledAdapter(pool_maxsize=DEFAULT_MAX_CONNECTIONS_PER_HOST, pool_block=True)
+            session.mount("https://", default_adapter)
+            session.mount("http://", default_adapter)
+            _requests_session = session
+        return _requests_session
+
+def request_timeout():
+    """(connect, read) timeout tuple for requests calls."""
+    return (CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)
+
+class MultipartFileBody:
+    """
+    multipart/form-data body with form fields and one file, read from disk while it is sent.
+
+    requests' files= builds the whole body in memory; pass this as data= instead (with
+    content_type as the Content-Type header). It has a length, so the request carries a
+    Content-Length rather than chunked encoding. Use it for one request, then close it.
+    """
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, fields: Dict[str, str], file_field: str, filepath: str,
+                 filename: Optional[str] = None, file_content_type: str = "application/octet-stream"):
+        self.boundary = uuid.uuid4().hex
+        filename = filename or os.path.basename(filepath)
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+            for name, value in fields.items())
+        head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                 f"Content-Type: {file_content_type}\r\n\r\n").encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self._file = open(filepath, "rb")
+        self._length = len(head) + os.fstat(self._file.fileno()).st_size + len(tail)
+        self._pieces = [head, self._file, tail] # bytes are sent as they are, the file is read in blocks
+        self._offset = 0 # Position within the current bytes piece
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        size = self._length if size is None or size < 0 else size
+        out = []
+        while size > 0 and self._pieces:
+            piece = self._pieces[0]
+            if isinstance(piece, bytes):
+                data = piece[self._offset:self._offset + size]
+                self._offset += len(data)
+                if self._offset >= len(piece):
+                    self._pieces.pop(0)
+                    self._offset = 0
+            else:
+                data = piece.read(size)
+                if not data:
+                    self._pieces.pop(0)
+                    continue
+            out.append(data)
+            size -= len(data)
+        return b"".join(out)
+
+    def __iter__(self):
+        while True:
+            block = self.read(self.BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# --- httpx (used by the Fish Audio SDK and the OpenAI client) ---
+def _trace_hook(request: httpx.Request):
+    host = request.url.host
+    stats.record_request(host)
+
+    def trace(event_name, info):
+        # httpcore reports this event only when it opens a new connection
+        if event_name == "connection.connect_tcp.complete":
+            stats.record_connection(host)
+
+    request.extensions["trace"] = trace
+
+def build_httpx_client(base_url: str, headers: Optional[dict] = None) -> httpx.Client:
+    """A keep-alive httpx client for one host, with the configured pool limit and timeouts."""
+    limit = _host_limit(base_url)
+    return httpx.Client(
+        base_url=base_url,
+        headers=headers,
+        limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit,
+                            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS),
+        timeout=httpx.Timeout(READ_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+        event_hooks={"request": [_trace_hook]},
+    )
+
+class PooledSession(Session):
+    """Fish Audio Session whose sync client uses the shared pool settings and reuse counters."""
+
+    def init_sync_client(self):
+        self._sync_client = build_httpx_client(self._base_url, {"Authorization": f"Bearer {self._apikey}"})
+
+_fish_sessions: Dict[str, PooledSession] = {}
+_openai_clients: Dict[str, OpenAI] = {}
+_clients_lock = threading.Lock()
+
+def get_fish_session(api_key: str) -> PooledSession:
+    """Process-wide Fish Audio session for an API key; its connections are kept alive between calls."""
+    with _clients_lock:
+        session = _fish_sessions.get(api_key)
+        if session is None:
+            session = _fish_sessions[api_key] = PooledSession(api_key, base_url=FISH_AUDIO_BASE_URL)
+        return session
+
+def get_openai_client(api_key: str) -> OpenAI:
+    """Process-wide OpenAI client for an API key, on a pooled httpx client."""
+    with _clients_lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            base_url = OPENAI_BASE_URL or "https://api.openai.com/v1"
+            client = _openai_clients[api_key] = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=build_httpx_client(base_url),
+            )
+        return client
@@ -1,13 +1,29 @@
 import openai
-from openai import OpenAI
 
 import os
 import time
 import json
 import random
+import logging
+import concurrent.futures
 from dotenv import load_dotenv
 from cloned_tts import find_and_generate_with_model_name
-from models_list import list_my_voice_models, MODELS_PER_PAGE # Import the function and constant
+from model_registry import get_registry
+from speculative_pool import SpeculativePool
+from folder_watcher import FolderWatcher
+from pipeline_executor import ContextExecutor
+from context_scheduler import ContextScheduler
+from processed_journal import ProcessedJournal, archive_folder, prune_archive, COMPACTION_INTERVAL_SECONDS, OUTPUT_ARCHIVE_AGE_SECONDS
+import backend_limits
+from backend_limits import backend_slot
+from llm_cache import LLMResponseCache, context_signature
+from phrase_store import get_phrase_store
+from llm_stream import StreamedLines
+from local_personalizer import personalize_locally
+from token_budget import estimate_message_tokens, record_usage
+from http_clients import get_openai_client, connection_stats
+from tts_cache import get_tts_cache
+import metrics
 
 from pydub import AudioSegment
 
@@ -16,7 +32,31 @@ load_dotenv()
 
 # Set up OpenAI API key
 openai_api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=openai_api_key)
+client = get_openai_client(openai_api_key) # Pooled keep-alive connections, see http_clients.py
+
+# Players in the lobby; used to personalize voice lines
+PLAYER_NAMES = ["Allan", "Matthew", "Matt", "Andy", "Ushan"]
+PHRASES_FILE = "emotion_phrases.json"
+LLM_MODEL = "gpt-4o-mini-2024-07-18"
+# Stream the LLM response and start TTS on the first complete line; the other lines
+# are cached for later voice lines. Set to False to wait for the whole response.
+STREAMING_LLM = True
+# Upper bound for the estimated input tokens (system + user message) of one LLM call.
+# Over budget, candidate phrases and then loot items are dropped until it fits.
+# OpenAI only caches prompts of 1024 tokens or more, so prompts within this budget are
+# never served from its prompt cache (llm_cached_prompt_tokens stays 0); a short prompt
+# is cheaper and faster than padding one up to that minimum.
+PROMPT_TOKEN_BUDGET = 900
+MIN_PROMPT_PHRASES = 5 # Never trim the candidate list below this
+MIN_PROMPT_LOOT = 3
+# Hard upper bound on waiting for the LLM per voice line. Past it (or if the LLM fails)
+# the line comes from local templates; a late LLM response still fills the cache.
+LLM_DEADLINE_SECONDS = 3.0
+
+# Persistent cache of personalize_phrases results
+response_cache = LLMResponseCache()
+# Runs non-streaming LLM calls so they can be abandoned at the deadline
+llm_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm")
 
 lethal_company_moon_loot = {
     "Experimentation": ["Gold Bar", "Cash Register", "Laser Pointer", "Wedding Ring", "Air Horn", "V-type Engine", "Metal Sheet", "Large Axle", "Big Bolt", "Steering Wheel"],
@@ -66,42 +106,22 @@ lethal_company_monsters = {
 
 
 def load_and_select_phrases(file_path, preferred_emotion, num_per_category=15):
-    with open(file_path, "r", encoding="utf-8") as f:
-        all_phrases = json.load(f)
+    # The store parses the file once (and again only if it changes) and avoids recent repeats
+    with metrics.span("phrase_sampling"):
+        return get_phrase_store(file_path).sample(preferred_emotion, num_per_category)
 
-    if preferred_emotion not in all_phrases:
-        raise ValueError(f"Emotion category '{preferred_emotion}' not found in phrase file.")
 
-    return random.sample(all_phrases[preferred_emotion], 
-                         min(num_per_category, len(all_phrases[preferred_emotion])))
 
-
-
-def build_prompt(phrases, context, moon_loot, monster_description):
-    return f"""
-You are helping develop a horror mod for the game *Lethal Company*. In this game, an enemy NPC mimics real players by speaking voice lines over voice chat. These lines are played using a **low-quality text-to-speech model**, so it’s absolutely critical that the phrasing sounds:
+# Static instructions, identical on every call and sent ahead of the variable part, which
+# is kept short so it can be trimmed to PROMPT_TOKEN_BUDGET.
+SYSTEM_PROMPT = """You are helping develop a horror mod for the game *Lethal Company*. In this game, an enemy NPC mimics real players by speaking voice lines over voice chat. These lines are played using a **low-quality text-to-speech model**, so it’s absolutely critical that the phrasing sounds:
 
 - **Short**
 - **Natural**
 - **Emotionally expressive**
 - And most importantly: **like something a real player would say in voice chat.**
 
-You are given:
-- A list of candidate voice lines from the current emotional category (`{context["preferred_emotion"]}`)
-- The current game context (player names, monster, moon loot, etc.)
-
----
-
-### GAME CONTEXT
-
-- Players in this session: {", ".join(context["player_names"])}
-- Current moon: {context["current_moon"]}
-- Enemy nearby: {context["enemy_name"]}
-- Enemy behavior: {monster_description}
-- Distance to target player: {context["distance_to_player"]}
-- Loot found on this moon: {", ".join(moon_loot)}
-
----
+Each request gives you the current game context (emotion, players, moon, nearby enemy and its behavior, distance, loot on this moon) followed by candidate voice lines from that emotional category.
 
 ### FORMAT RULES
 
@@ -109,39 +129,61 @@ You are given:
 - Use **casual spoken English** — contractions, slang, filler words
 - Use **ALL CAPS** for yelling and **extra vowels** for drama (e.g., “ruuuuun!”, “nooo way!”)
 
----
-
 ### YOUR TASK
 
-1. Select and rewrite voice lines from the list provided.
+1. Select and rewrite voice lines from the candidate list.
 2. Make the lines **feel like real player speech** — panicked, curious, mocking, or urgent — depending on the situation.
 3. Inject contextual hints using:
    - **Player names** from the session — like calling someone out or pretending to help.
    - **Monster behavior** — fake warnings like “DON’T RUN! It tracks sound!” or “It’s the spider, stay above ground!”
    - **Loot items** — suggest lures like “Gold bar over here!”, “Who left a clown horn?”, “Air horn, grab it!”
-
 4. The NPC is trying to **trick, bait, or mislead** real players. Keep this in mind.
 5. Voice lines must be **short, casual, emotionally expressive**, and optimized for **low-quality TTS** (like voice chat).
 
----
+### OUTPUT
 
-### FORMAT
+Return only a flat JSON array of voice lines, like this:
 
-Return your output as a flat list of voice lines, like this:
+["line 1", "line 2", "line 3"]"""
 
-[
-  "line 1",
-  "line 2",
-  "line 3",
-  ...
-]
 
----
-
-### CANDIDATE PHRASES TO PERSONALIZE
+def build_prompt(phrases, context, moon_loot, monster_description):
+    """The variable part of the prompt: game context and candidate phrases, packed compactly."""
+    return "\n".join([
+        f"Emotion: {context['preferred_emotion']}",
+        f"Players: {', '.join(context['player_names'])}",
+        f"Moon: {context['current_moon']}",
+        f"Enemy: {context['enemy_name']} ({monster_description})",
+        f"Distance to target player: {context['distance_to_player']}",
+        f"Loot: {', '.join(moon_loot)}",
+        f"Candidates: {json.dumps(phrases, ensure_ascii=False)}",
+    ])
+
+
+def build_messages(phrases, context):
+    """
+    Chat messages for one personalization call, trimmed to PROMPT_TOKEN_BUDGET.
+    Returns (messages, estimated input tokens).
+    """
+    moon_loot = lethal_company_moon_loot.get(context["current_moon"], [])
+    monster_description = lethal_company_monsters.get(context["enemy_name"], "Unknown creature.")
+    phrases = list(phrases)
 
-{json.dumps(phrases, indent=2)}
-"""
+    while True:
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_prompt(phrases, context, moon_loot, monster_description)},
+        ]
+        estimated_tokens = estimate_message_tokens(messages)
+        if estimated_tokens <= PROMPT_TOKEN_BUDGET:
+            return messages, estimated_tokens
+        if len(phrases) > MIN_PROMPT_PHRASES:
+            phrases.pop()
+        elif len(moon_loot) > MIN_PROMPT_LOOT:
+            moon_loot = moon_loot[:-1]
+        else:
+            logging.warning(f"Prompt needs ~{estimated_tokens} tokens, over the budget of {PROMPT_TOKEN_BUDGET}.")
+            return messages, estimated_tokens
 
 
 
@@ -149,133 +191,368 @@ def personalize_phrases(phrases, context):
     moon_name = context["current_moon"]
     enemy_name = context["enemy_name"]
 
-    moon_loot = lethal_company_moon_loot.get(moon_name, [])
-    monster_description = lethal_company_monsters.get(enemy_name, "Unknown creature.")
+    # Repeat encounters are served from the on-disk cache without an LLM round trip
+    cache_key, cache_group = context_signature(phrases, context)
+    cached_lines = response_cache.get(cache_key, cache_group)
+    if cached_lines is not None:
+        metrics.incr("llm_cache_hits")
+        print(f"Using cached personalized phrases for {moon_name} / {enemy_name} / {context['preferred_emotion']}.")
+        return cached_lines
 
-    prompt_text = build_prompt(phrases, context, moon_loot, monster_description)
+    metrics.incr("llm_cache_misses")
+    messages, estimated_tokens = build_messages(phrases, context)
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini-2024-07-18",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant optimizing horror game dialogue."},
-            {"role": "user", "content": prompt_text}
-        ],
-    )
+    with backend_slot("openai"), metrics.span("personalize_llm"):
+        response = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+        )
+    record_usage(response.usage, estimated_tokens)
 
     try:
-        return json.loads(response.choices[0].message.content)
+        personalized_lines = json.loads(response.choices[0].message.content)
+        if isinstance(personalized_lines, list) and personalized_lines:
+            response_cache.put(cache_key, cache_group, personalized_lines)
+        return personalized_lines
     except json.JSONDecodeError:
+        metrics.incr("llm_parse_failures")
         print("Failed to parse JSON from response.")
         print(response.choices[0].message.content)
         return {}
 
 
 
+def personalize_phrases_streaming(phrases, context):
+    """
+    Streaming variant of personalize_phrases. Returns a StreamedLines right away;
+    its first() is available as soon as the LLM has finished the first line.
+    """
+    cache_key, cache_group = context_signature(phrases, context)
+    cached_lines = response_cache.get(cache_key, cache_group)
+    if cached_lines is not None:
+        metrics.incr("llm_cache_hits")
+        print(f"Using cached personalized phrases for {context['current_moon']} / {context['enemy_name']} / {context['preferred_emotion']}.")
+        random.shuffle(cached_lines)
+        return StreamedLines.from_lines(cached_lines)
+
+    metrics.incr("llm_cache_misses")
+    messages, estimated_tokens = build_messages(phrases, context)
+
+    def deltas():
+        # Runs on the StreamedLines thread, so the backend slot is held until the response is read
+        with backend_slot("openai"), metrics.span("personalize_llm"):
+            stream = client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            try:
+                for chunk in stream:
+                    if chunk.usage is not None:
+                        record_usage(chunk.usage, estimated_tokens) # Sent in the last chunk
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+
+    return StreamedLines(deltas(), on_complete=lambda lines: response_cache.put(cache_key, cache_group, lines))
+
+
+
+def read_context_file(path):
+    """Loads an in-game context JSON and returns the personalization context for it."""
+    with metrics.span("parse_json"), open(path, "r", encoding="utf-8") as f:
+        context_json = json.load(f)
+
+    moon_raw = context_json.get("moonName", "")
+    moon_clean = moon_raw.split(" ", 1)[-1] if " " in moon_raw else moon_raw
+
+    enemy_raw = context_json.get("enemyName", "")
+    enemy_clean = enemy_raw.split(" (")[0] if " (" in enemy_raw else enemy_raw
+
+    emotion = context_json.get("preferredEmotion", "interest")
+    distance_to_player = context_json.get("distanceToPlayer", "unknown")
+
+    return {
+        "player_names": PLAYER_NAMES,
+        "current_moon": moon_clean,
+        "enemy_name": enemy_clean,
+        "preferred_emotion": emotion,
+        "distance_to_player": distance_to_player
+    }
+
+
+def print_context(personalization_context):
+    print(f"\nStep 1: Parsed context:")
+    print(f"  - Moon:        {personalization_context['current_moon']}")
+    print(f"  - Enemy:       {personalization_context['enemy_name']}")
+    print(f"  - Emotion:     {personalization_context['preferred_emotion']}")
+    print(f"  - Distance:    {personalization_context['distance_to_player']}")
+
+
+def parse_context_file(path):
+    """STEP 1: Load and parse input JSON."""
+    personalization_context = read_context_file(path)
+    print_context(personalization_context)
+    return personalization_context
+
+
+
+def personalize_line(phrases, context, deadline_seconds=None):
+    """
+    Picks the personalized line to speak. The LLM gets deadline_seconds to deliver a
+    usable line; if it is slower, fails or returns no lines, a local template line is
+    used instead, so this never blocks for (much) longer than the deadline.
+    """
+    if deadline_seconds is None:
+        deadline_seconds = LLM_DEADLINE_SECONDS
+    started = time.perf_counter()
+    text = None
+    failure = None
+    if STREAMING_LLM:
+        # TTS starts on the first line; the rest keep streaming in and are cached for reuse
+        streamed_lines = personalize_phrases_streaming(phrases, context)
+        text = streamed_lines.first(timeout=deadline_seconds)
+        if text is None:
+            failure = "failed" if streamed_lines.finished else "deadline"
+        else:
+            print(f"\nStep 3: First personalized phrase: {text}")
+    else:
+        future = llm_executor.submit(personalize_phrases, phrases, context)
+        try:
+            personalized_lines = future.result(timeout=deadline_seconds)
+        except concurrent.futures.TimeoutError:
+            failure = "deadline"
+        except Exception as e:
+            print(f"Warning: LLM personalization failed: {e}")
+            failure = "failed"
+        else:
+            # A parse failure comes back as {}; only non-empty strings are usable
+            if not isinstance(personalized_lines, list):
+                personalized_lines = []
+            personalized_lines = [line for line in personalized_lines if isinstance(line, str) and line.strip()]
+            if personalized_lines:
+                print(f"\nStep 3: Personalized phrases:")
+                for i, phrase in enumerate(personalized_lines, 1):
+                    print(f"  {i}. {phrase}")
+                text = random.choice(personalized_lines)
+            else:
+                failure = "failed"
+
+    if text is not None:
+        return text
+
+    metrics.incr("llm_fallbacks", reason=failure)
+    local_lines = personalize_locally(
+        phrases,
+        context,
+        lethal_company_moon_loot.get(context["current_moon"], []),
+        lethal_company_monsters.get(context["enemy_name"], "Unknown creature."),
+    )
+    if not local_lines:
+        raise RuntimeError("No phrases available to personalize.")
+    reason = f"missed the {deadline_seconds:g}s deadline" if failure == "deadline" else "returned no usable lines"
+    print(f"\nStep 3: LLM {reason} after {time.perf_counter() - started:.2f}s; using local template line: {local_lines[0]}")
+    return local_lines[0]
+
+
+def generate_voice_line(personalization_context, out_path, fish_api_key):
+    """
+    Runs the LLM -> TTS chain for one personalization context and writes the WAV to out_path.
+    Returns True if the audio file was generated.
+    """
+    emotion = personalization_context["preferred_emotion"]
+
+    # STEP 2: Load and sample phrases
+    selected_phrases = load_and_select_phrases(PHRASES_FILE, preferred_emotion=emotion)
+    print(f"\nStep 2: Sampled {len(selected_phrases)} raw phrases:")
+    for i, phrase in enumerate(selected_phrases, 1):
+        print(f"  {i}. {phrase}")
+
+    # STEP 3: Personalize phrases
+    text = personalize_line(selected_phrases, personalization_context)
+
+    # STEP 4: Select TTS model
+    # Fetch available voice model titles
+    print("Fetching available voice model titles from the model registry...")
+    with metrics.span("model_listing"):
+        available_model_titles = get_registry(fish_api_key).get_titles()
+
+    if not available_model_titles:
+        raise RuntimeError("No voice models found or failed to retrieve model list. Please ensure models are available on your Fish Audio account.")
+    print(f"Successfully retrieved {len(available_model_titles)} model titles: {', '.join(available_model_titles)}")
+
+    model = random.choice(available_model_titles)
+
+    print(f"\nStep 4: Generating TTS output")
+    print(f"  - Voice model:  {model}")
+    print(f"  - Output file:  {out_path}")
+    print(f"  - Selected line: \"{text}\"")
+
+    return find_and_generate_with_model_name(
+        api_key=fish_api_key,
+        model_name_to_find=model,
+        text=text,
+        output_file=out_path,
+        emotion=emotion
+    )
+
+
+
+def process_context_file(path, output_dir, fish_api_key, speculative_pool=None, personalization_context=None):
+    """
+    Handles one context file end to end: parse, personalize, TTS. Returns True on success.
+    A context already read by the scheduler can be passed in to skip parsing.
+    """
+    fname = os.path.basename(path)
+    success = False
+    started = time.perf_counter()
+    try:
+        print(f"\n--- Detected new context file: {fname} ---")
+
+        if personalization_context is None:
+            personalization_context = parse_context_file(path)
+        else:
+            print_context(personalization_context)
+        out_path = os.path.join(output_dir, fname.replace(".json", ".wav"))
+
+        if speculative_pool and speculative_pool.take(personalization_context, out_path):
+            print(f"\nStep 2-4: Served pre-generated line from speculative pool")
+            metrics.incr("speculative_hits")
+            success = True
+        else:
+            if speculative_pool:
+                metrics.incr("speculative_misses")
+            success = generate_voice_line(personalization_context, out_path, fish_api_key)
+
+        # Final status
+        if success:
+            print(f"\nStep 5: TTS generation complete. mp3 saved to: {out_path}")
+        else:
+            print(f"\nStep 5: TTS generation failed for: {fname}")
+
+        if speculative_pool:
+            speculative_pool.observe(personalization_context)
+            pool_stats = speculative_pool.stats()
+            print(f"Speculative pool: {pool_stats['hits']} hit(s), {pool_stats['misses']} miss(es), "
+                  f"{pool_stats['entries']} line(s) ready, {pool_stats['disk_bytes'] / 1024:.0f} KiB")
+
+        cache_stats = get_tts_cache().stats()
+        print(f"TTS cache: {cache_stats['hit_rate']:.0%} hit rate, {cache_stats['bytes_saved'] / 1024:.0f} KiB served from cache, "
+              f"{cache_stats['entries']} file(s) / {cache_stats['bytes'] / 1024 / 1024:.1f} MiB cached")
+
+        for host, host_stats in connection_stats().items():
+            print(f"HTTP {host}: {host_stats['requests']} request(s), {host_stats['reused']} on reused connections")
+
+    except Exception as e:
+        print(f"\nError processing file '{fname}': {e}")
+
+    metrics.observe("context_end_to_end", time.perf_counter() - started)
+    metrics.incr("contexts_processed" if success else "context_failures")
+    print("\n--- Processing complete ---\n")
+    return success
+
+
+def compact_folders(journal, watch_dir, output_dir):
+    """Moves handled context files and already played audio out of the hot folders, and trims the journal."""
+    contexts = archive_folder(watch_dir, (".json",), journal=journal)
+    audio = archive_folder(output_dir, (".wav",), min_age_seconds=OUTPUT_ARCHIVE_AGE_SECONDS)
+    pruned = prune_archive()
+    journal.compact()
+    if contexts or audio or pruned:
+        print(f"Archived {contexts} context file(s) and {audio} audio file(s); removed {pruned} old archive folder(s).")
+
+
+
 if __name__ == "__main__":
     # --------------------------------------------
     # MODIFY THIS PART FOR YOUR USE CASE
     WATCH_DIR = "VoiceContexts"
     OUTPUT_DIR = "ReceivedAudio"
+    # Pre-render lines for the current moon in the background (uses extra API credits)
+    SPECULATIVE_ENABLED = True
+    # Context files processed at once, and max requests in flight per backend
+    MAX_CONCURRENT_CONTEXTS = 4
+    # Contexts older than this (seconds) are dropped unplayed; same enemy/emotion contexts
+    # within the coalesce window share one voice line
+    MAX_CONTEXT_AGE_SECONDS = 5.0
+    COALESCE_WINDOW_SECONDS = 3.0
+    # Move handled context files and played audio into dated folders under Archive/
+    ARCHIVE_ENABLED = True
+    OPENAI_MAX_CONCURRENCY = 3
+    FISH_AUDIO_MAX_CONCURRENCY = 2
     # --------------------------------------------
 
     os.makedirs(WATCH_DIR, exist_ok=True)
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    seen_files = set()
+    # Context files already handled, kept across restarts (see processed_journal.py)
+    journal = ProcessedJournal()
+    next_compaction = time.monotonic()
 
     fish_api_key = os.getenv("FISH_AUDIO_API_KEY")
     if not fish_api_key:
         print("Missing FISH_AUDIO_API_KEY in .env.")
         exit(1)
 
+    # Shared title -> ID cache; cloned_tts resolves IDs from the same instance.
+    model_registry = get_registry(fish_api_key)
+
+    speculative_pool = None
+    if SPECULATIVE_ENABLED:
+        speculative_pool = SpeculativePool(
+            render_fn=lambda ctx, out: generate_voice_line(ctx, out, fish_api_key),
+            player_names=PLAYER_NAMES,
+            known_moons=list(lethal_company_moon_loot.keys()),
+            known_enemies=list(lethal_company_monsters.keys())
+        )
+
+    backend_limits.configure("openai", OPENAI_MAX_CONCURRENCY)
+    backend_limits.configure("fish_audio", FISH_AUDIO_MAX_CONCURRENCY)
+    # Bursts of context files are processed in parallel; output stays grouped per file
+    executor = ContextExecutor(max_workers=MAX_CONCURRENT_CONTEXTS)
+    # Chooses what the executor works on next: closest enemy first, stale and duplicate contexts dropped
+    scheduler = ContextScheduler(
+        executor,
+        run_fn=lambda fname, ctx, created_at: process_context_file(
+            os.path.join(WATCH_DIR, fname), OUTPUT_DIR, fish_api_key, speculative_pool, personalization_context=ctx),
+        max_age_seconds=MAX_CONTEXT_AGE_SECONDS,
+        coalesce_window_seconds=COALESCE_WINDOW_SECONDS
+    )
+
+    # Stage timings and counters, exported periodically (see metrics.py)
+    metrics.configure(service="ingame_llm_tts")
+    metrics.start_exporter()
+    if metrics.enabled():
+        print(f"Exporting metrics to: {metrics.export_path()}")
+
     print(f"Monitoring folder: '{WATCH_DIR}' for in-game context files...\n")
 
+    # Delivers each context file as soon as the game has finished writing it
+    watcher = FolderWatcher(WATCH_DIR, suffixes=(".json",))
+    print(f"Folder watch mode: {watcher.mode}")
+
     while True:
-        for fname in os.listdir(WATCH_DIR):
-            if not fname.endswith(".json") or fname in seen_files:
+        for path in watcher.wait_for_files(timeout=1.0):
+            fname = os.path.basename(path)
+            if journal.contains(path):
                 continue
+            journal.add(path)
 
-            path = os.path.join(WATCH_DIR, fname)
             try:
-                print(f"\n--- Detected new context file: {fname} ---")
-
-                # STEP 1: Load and parse input JSON
-                with open(path, "r", encoding="utf-8") as f:
-                    context_json = json.load(f)
-
-                moon_raw = context_json.get("moonName", "")
-                moon_clean = moon_raw.split(" ", 1)[-1] if " " in moon_raw else moon_raw
-
-                enemy_raw = context_json.get("enemyName", "")
-                enemy_clean = enemy_raw.split(" (")[0] if " (" in enemy_raw else enemy_raw
-
-                emotion = context_json.get("preferredEmotion", "interest")
-                distance_to_player = context_json.get("distanceToPlayer", "unknown")
-
-                personalization_context = {
-                    "player_names": ["Allan", "Matthew", "Matt", "Andy", "Ushan"],
-                    "current_moon": moon_clean,
-                    "enemy_name": enemy_clean,
-                    "preferred_emotion": emotion,
-                    "distance_to_player": distance_to_player
-                }
-
-                print(f"\nStep 1: Parsed context:")
-                print(f"  - Moon:        {moon_clean}")
-                print(f"  - Enemy:       {enemy_clean}")
-                print(f"  - Emotion:     {emotion}")
-                print(f"  - Distance:    {distance_to_player}")
-
-                # STEP 2: Load and sample phrases
-                selected_phrases = load_and_select_phrases("emotion_phrases.json", preferred_emotion=emotion)
-                print(f"\nStep 2: Sampled {len(selected_phrases)} raw phrases:")
-                for i, phrase in enumerate(selected_phrases, 1):
-                    print(f"  {i}. {phrase}")
-
-                # STEP 3: Personalize phrases
-                personalized_lines = personalize_phrases(selected_phrases, personalization_context)
-                print(f"\nStep 3: Personalized phrases:")
-                for i, phrase in enumerate(personalized_lines, 1):
-                    print(f"  {i}. {phrase}")
-
-                # STEP 4: Select voice line and TTS model
-                text = random.choice(personalized_lines)
-
-                # Fetch available voice model titles
-                print("Fetching available voice model titles from Fish Audio...")
-                available_model_titles = list_my_voice_models(fish_api_key, page_size=MODELS_PER_PAGE)
-
-                if not available_model_titles:
-                    print("Error: No voice models found or failed to retrieve model list. Please ensure models are available on your Fish Audio account.")
-                    exit(1)
-                print(f"Successfully retrieved {len(available_model_titles)} model titles: {', '.join(available_model_titles)}")
-                
-                model = random.choice(available_model_titles)
-                out_path = os.path.join(OUTPUT_DIR, fname.replace(".json", ".wav"))
-
-                print(f"\nStep 4: Generating TTS output")
-                print(f"  - Voice model:  {model}")
-                print(f"  - Output file:  {out_path}")
-                print(f"  - Selected line: \"{text}\"")
-
-                success = find_and_generate_with_model_name(
-                    api_key=fish_api_key,
-                    model_name_to_find=model,
-                    text=text,
-                    output_file=out_path,
-                    emotion=emotion
-                )
-
-                # Final status
-                if success:
-                    print(f"\nStep 5: TTS generation complete. mp3 saved to: {out_path}")
-                else:
-                    print(f"\nStep 5: TTS generation failed for: {fname}")
-
+                personalization_context = read_context_file(path)
+                created_at = os.path.getmtime(path)
             except Exception as e:
-                print(f"\nError processing file '{fname}': {e}")
-            finally:
-                seen_files.add(fname)
+                metrics.incr("context_failures")
+                print(f"\nError reading context file '{fname}': {e}")
+                continue
 
-            print("\n--- Processing complete ---\n")
+            scheduler.submit(fname, personalization_context, created_at)
+            scheduler_stats = scheduler.stats()
+            print(f"Queued context file: {fname} (waiting: {scheduler_stats['pending']}, "
+                  f"in progress: {scheduler_stats['in_flight']}, coalesced: {scheduler_stats['coalesced']}, "
+                  f"dropped stale: {scheduler_stats['dropped_stale']})")
 
-        time.sleep(1)
+        if ARCHIVE_ENABLED and time.monotonic() >= next_compaction:
+            next_compaction = time.monotonic() + COMPACTION_INTERVAL_SECONDS
+            compact_folders(journal, WATCH_DIR, OUTPUT_DIR)
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# --- Configuration ---
+CACHE_FILE = "llm_cache.json"       # On-disk cache of personalized phrase batches
+CACHE_TTL_SECONDS = 7 * 24 * 3600   # Entries older than this are ignored and evicted
+CACHE_MAX_ENTRIES = 500             # LRU size cap
+# Allow serving a cached batch for the same (moon, enemy, emotion) even when the sampled phrases differ
+ALLOW_GROUP_HITS = True
+# Distance (in game units) upper bounds for the "near" and "mid" buckets
+DISTANCE_BUCKETS = [("near", 5.0), ("mid", 15.0)]
+
+
+def distance_bucket(distance) -> str:
+    """Maps distanceToPlayer onto a coarse bucket so nearby values share cache entries."""
+    try:
+        value = float(distance)
+    except (TypeError, ValueError):
+        return "unknown"
+    for name, upper in DISTANCE_BUCKETS:
+        if value < upper:
+            return name
+    return "far"
+
+
+def context_signature(phrases: List[str], context: dict) -> Tuple[str, str]:
+    """
+    Returns (key, group) for a personalize_phrases call.
+
+    key covers everything the LLM output depends on; group is the (moon, enemy, emotion)
+    tuple used for fallback hits when only the sampled phrases differ.
+    """
+    moon = str(context.get("current_moon", "")).strip().lower()
+    enemy = str(context.get("enemy_name", "")).strip().lower()
+    emotion = str(context.get("preferred_emotion", "")).strip().lower()
+    group = f"{moon}|{enemy}|{emotion}"
+
+    normalized = {
+        "group": group,
+        "distance": distance_bucket(context.get("distance_to_player")),
+        "players": sorted(name.strip().lower() for name in context.get("player_names", [])),
+        "phrases": sorted(p.strip().lower() for p in phrases),
+    }
+    key = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+    return key, group
+
+
+class LLMResponseCache:
+    """
+    Persistent LRU cache of personalized phrase batches.
+
+    The whole cache is small (a few hundred short lists), so it is kept in memory and
+    rewritten atomically to CACHE_FILE after every insert.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 max_entries: int = CACHE_MAX_ENTRIES, allow_group_hits: bool = ALLOW_GROUP_HITS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.allow_group_hits = allow_group_hits
+
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries: "OrderedDict[str, dict]" = OrderedDict() # least recently used first
+        self.exact_hits = 0
+        self.group_hits = 0
+        self.misses = 0
+        self._load()
+
+    # --- Public API ---
+    def get(self, key: str, group: str) -> Optional[List[str]]:
+        """Returns cached lines for key, else (if allowed) the freshest batch for the same group, else None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry, now):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return list(entry["lines"])
+
+            if self.allow_group_hits:
+                for other_key in reversed(self._entries):
+                    other = self._entries[other_key]
+                    if other["group"] == group and not self._expired(other, now):
+                        self._entries.move_to_end(other_key)
+                        self.group_hits += 1
+                        return list(other["lines"])
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, group: str, lines: List[str]):
+        """Stores a batch, evicts expired and least recently used entries, and saves the cache."""
+        now = time.time()
+        with self._lock:
+            self._entries[key] = {"group": group, "lines": list(lines), "created": now}
+            self._entries.move_to_end(key)
+            self._evict(now)
+        self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "group_hits": self.group_hits,
+                "misses": self.misses,
+            }
+
+    # --- Internal Helpers ---
+    def _expired(self, entry: dict, now: float) -> bool:
+        return now - entry["created"] > self.ttl_seconds
+
+    def _evict(self, now: float):
+        for key in [k for k, entry in self._entries.items() if self._expired(entry, now)]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            for entry in stored.get("entries", []):
+                key = entry.pop("key")
+                self._entries[key] = entry
+            self._evict(time.time())
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logging.warning(f"Ignoring unreadable LLM cache '{self.path}': {e}")
+            self._entries.clear()
+
+    def _save(self):
+        # Serialized so an older snapshot can never replace a newer one
+        with self._save_lock:
+            with self._lock:
+                snapshot = [dict(entry, key=k) for k, entry in self._entries.items()]
+            self._write(snapshot)
+
+    def _write(self, snapshot: List[dict]):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": snapshot}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save LLM cache '{self.path}': {e}")
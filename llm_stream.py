@@ -0,0 +1,146 @@
+import json
+import time
+import threading
+import logging
+from typing import Callable, Iterable, List, Optional
+
+import metrics
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for a JSON array of strings arriving in arbitrary text pieces.
+
+    feed() returns the strings completed by that piece, so the first line can be used
+    long before the closing bracket arrives. Text before the opening bracket (e.g. a
+    ```json fence) is skipped, and non-string items are ignored.
+    """
+
+    def __init__(self):
+        self.started = False  # Seen the opening '['
+        self.done = False     # Seen the matching ']'
+        self._depth = 0       # Bracket/brace nesting, 1 = top-level array
+        self._in_string = False
+        self._escaped = False
+        self._current: List[str] = [] # Raw characters of the top-level string being read
+
+    def feed(self, text: str) -> List[str]:
+        completed = []
+        for char in text:
+            if self.done:
+                break
+            if not self.started:
+                if char == "[":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                top_level = self._depth == 1
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if top_level:
+                        value = self._decode("".join(self._current))
+                        if value is not None:
+                            completed.append(value)
+                    continue
+                if top_level:
+                    self._current.append(char)
+            elif char == '"':
+                self._in_string = True
+                self._current = []
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+        return completed
+
+    @staticmethod
+    def _decode(raw: str) -> Optional[str]:
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return None
+
+
+class StreamedLines:
+    """
+    Personalized lines read from a streaming LLM response on a background thread.
+
+    first() returns as soon as the first usable line has been parsed; the remaining
+    lines keep arriving in the background and are handed to on_complete (e.g. to be
+    cached for later voice lines) once the response has been read completely.
+    """
+
+    def __init__(self, deltas: Optional[Iterable[str]] = None,
+                 on_complete: Optional[Callable[[List[str]], None]] = None,
+                 lines: Optional[List[str]] = None):
+        self.lines: List[str] = list(lines or [])
+        self.error: Optional[Exception] = None
+        self._on_complete = on_complete
+        self._condition = threading.Condition()
+        self._finished = deltas is None
+        if deltas is not None:
+            self._thread = threading.Thread(target=self._consume, args=(deltas,), name="llm-stream", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_lines(cls, lines: List[str]) -> "StreamedLines":
+        """An already complete result, e.g. from the cache."""
+        return cls(lines=lines)
+
+    def first(self, timeout: Optional[float] = None) -> Optional[str]:
+        """The first usable line, or None if the stream ended (or timed out) without one."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.lines or self._finished, timeout)
+            return self.lines[0] if self.lines else None
+
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        """Blocks until the whole response has been read and returns every line."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._finished, timeout)
+            return list(self.lines)
+
+    @property
+    def finished(self) -> bool:
+        with self._condition:
+            return self._finished
+
+    def _consume(self, deltas: Iterable[str]):
+        parser = JSONArrayStreamParser()
+        started = time.perf_counter()
+        try:
+            for delta in deltas:
+                new_lines = [line.strip() for line in parser.feed(delta) if line.strip()]
+                if new_lines:
+                    with self._condition:
+                        if not self.lines:
+                            metrics.observe("llm_first_line", time.perf_counter() - started)
+                        self.lines.extend(new_lines)
+                        self._condition.notify_all()
+                # Keep reading after the closing bracket so the connection can be reused
+        except Exception as e:
+            logging.error(f"Streaming LLM response failed: {e}")
+            self.error = e
+        finally:
+            close = getattr(deltas, "close", None)
+            if close is not None:
+                close() # Releases whatever the generator holds (connection, backend slot)
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+        if not parser.started:
+            logging.warning("Streaming LLM response contained no JSON array.")
+        # Only complete responses are handed on; a cut-off stream may be missing lines
+        if self.lines and parser.done and self.error is None and self._on_complete is not None:
+            try:
+                self._on_complete(list(self.lines))
+            except Exception as e:
+                logging.warning(f"Could not store streamed lines: {e}")
@@ -0,0 +1,89 @@
+import re
+import random
+from typing import List, Optional
+
+# --- Configuration ---
+# Share of sampled phrases that get a player name put in front of them
+ADDRESS_PROBABILITY = 0.5
+# Extra context lines (loot lure, enemy warning) added to the personalized phrases
+CONTEXT_LINES = 2
+MAX_HINT_WORDS = 6 # Enemy behavior hints longer than this are too long for TTS
+
+# Short lines in the style of the LLM output, per emotion. {player}, {loot} and {enemy}
+# are filled in from the game context; {hint} is a short behavior note for the enemy.
+LOOT_TEMPLATES = {
+    "panic":     ["{player}, DROP the {loot}! RUN!", "Forget the {loot}, go go go!"],
+    "confusion": ["Wait, who left a {loot} here?", "{player}, did you drop the {loot}?"],
+    "interest":  ["{player}, {loot} over here!", "Ooooh, a {loot}! Come look!"],
+}
+ENEMY_TEMPLATES = {
+    "panic":     ["{player}! It's the {enemy}! RUUUN!", "{enemy}! {hint}!"],
+    "confusion": ["Was that the {enemy}, {player}?", "Is the {enemy} still behind us?"],
+    "interest":  ["Guys, {enemy} over here. {hint}.", "{player}, I think I saw a {enemy}."],
+}
+
+
+def _spoken_name(name: str) -> str:
+    """Splits in-game identifiers for TTS: 'BunkerSpider' -> 'Bunker Spider', 'Coil-Head' -> 'Coil Head'."""
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", " ", name).replace("-", " ")
+
+
+def _behavior_hint(monster_description: str) -> Optional[str]:
+    """
+    The behavior part of a monster description (after the ';'), if it is short enough
+    to say, e.g. "Large spider ...; best avoided unless necessary." -> "Best avoided unless necessary".
+    """
+    if ";" not in monster_description:
+        return None
+    hint = monster_description.split(";", 1)[1].strip().rstrip(".")
+    if not hint or len(hint.split()) > MAX_HINT_WORDS:
+        return None
+    return hint[0].upper() + hint[1:]
+
+
+def _address(phrase: str, player: str) -> str:
+    """'Watch out for the mine!' -> 'Matt, watch out for the mine!' (keeps 'I' and ALL CAPS words)."""
+    first_word = phrase.split(" ", 1)[0]
+    if first_word.endswith(","):
+        return phrase # Already opens with a name or interjection ("Bob, run!", "Oh, look!")
+    pronoun = first_word == "I" or first_word.startswith(("I'", "I’")) # "Matt, I'm hurt!"
+    if not pronoun and len(first_word) > 1 and first_word[1:].islower():
+        phrase = phrase[0].lower() + phrase[1:]
+    return f"{player}, {phrase}"
+
+
+def personalize_locally(phrases: List[str], context: dict, moon_loot: List[str],
+                        monster_description: str, rng: Optional[random.Random] = None) -> List[str]:
+    """
+    Template-based stand-in for the LLM personalization: puts player names in front of
+    some of the sampled phrases and adds lines built from the moon's loot and the nearby
+    enemy. Runs in well under a millisecond, so it can always meet the voice-line deadline.
+
+    Returns the lines in random order; never empty as long as phrases is not.
+    """
+    rng = rng or random
+    emotion = context.get("preferred_emotion", "interest")
+    players = context.get("player_names") or ["guys"]
+    enemy = _spoken_name(context.get("enemy_name") or "thing")
+    hint = _behavior_hint(monster_description or "")
+
+    lines = []
+    for phrase in phrases:
+        phrase = phrase.strip()
+        if not phrase:
+            continue
+        if rng.random() < ADDRESS_PROBABILITY:
+            phrase = _address(phrase, rng.choice(players))
+        lines.append(phrase)
+
+    templates = []
+    if moon_loot:
+        templates += [(t, rng.choice(moon_loot)) for t in LOOT_TEMPLATES.get(emotion, LOOT_TEMPLATES["interest"])]
+    enemy_templates = ENEMY_TEMPLATES.get(emotion, ENEMY_TEMPLATES["interest"])
+    templates += [(t, None) for t in enemy_templates if hint or "{hint}" not in t]
+
+    for template, loot in rng.sample(templates, min(CONTEXT_LINES, len(templates))):
+        lines.append(template.format(player=rng.choice(players), loot=loot, enemy=enemy, hint=hint))
+
+    rng.shuffle(lines)
+    return lines
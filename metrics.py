@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import atexit
+import threading
+import logging
+import numbers
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+# --- Configuration ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0" # Set METRICS_ENABLED=0 to turn all recording off
+METRICS_FORMAT = os.getenv("METRICS_FORMAT", "prometheus") # "prometheus" (text file snapshot) or "jsonl" (event log)
+METRICS_DIR = "metrics"            # Exported files go here, one per service
+EXPORT_INTERVAL_SECONDS = 15       # How often the background exporter writes the file
+MAX_PENDING_EVENTS = 10000         # jsonl: span events kept between exports; older ones are dropped
+# Histogram bucket upper bounds (seconds) for stage durations
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = "lc_mimicry"
+
+_lock = threading.Lock()
+_enabled = METRICS_ENABLED
+_format = METRICS_FORMAT
+_service = "default"
+_path: Optional[str] = None
+# (stage, labels) -> [bucket counts..., +Inf count], sum, max
+_histograms: Dict[Tuple[str, tuple], list] = {}
+_counters: Dict[Tuple[str, tuple], float] = {}
+_events: deque = deque(maxlen=MAX_PENDING_EVENTS)
+_dropped_events = 0
+_exporter: Optional[threading.Thread] = None
+_stop_exporter = threading.Event()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("stage", "labels", "start")
+
+    def __init__(self, stage: str, labels: dict):
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.stage, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            incr("stage_errors", stage=self.stage)
+        return False
+
+
+def configure(service: Optional[str] = None, enabled: Optional[bool] = None,
+              fmt: Optional[str] = None, path: Optional[str] = None):
+    """
+    Sets the service name (used as a label and in the default file name), turns
+    recording on/off and picks the export format and file.
+    """
+    global _service, _enabled, _format, _path
+    with _lock:
+        if service is not None:
+            _service = service
+        if enabled is not None:
+            _enabled = enabled
+        if fmt is not None:
+            if fmt not in ("prometheus", "jsonl"):
+                raise ValueError(f"Unknown metrics format '{fmt}', expected 'prometheus' or 'jsonl'.")
+            _format = fmt
+        if path is not None:
+            _path = path
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+# --- Recording ---
+def span(stage: str, **labels):
+    """
+    Context manager timing a pipeline stage:
+
+        with metrics.span("tts_stream"):
+            ...
+
+    Returns a shared no-op object when metrics are disabled.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(stage, labels)
+
+
+def observe(stage: str, seconds: float, **labels):
+    """Records a duration measured by the caller (for work spread over many small steps)."""
+    if not _enabled:
+        return
+    key = (stage, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(DURATION_BUCKETS) + 1), 0.0, 0.0]
+        buckets = histogram[0]
+        for i, upper in enumerate(DURATION_BUCKETS):
+            if seconds <= upper:
+                buckets[i] += 1
+                break
+        else:
+            buckets[-1] += 1
+        histogram[1] += seconds
+        histogram[2] = max(histogram[2], seconds)
+        if _format == "jsonl":
+            _append_event({"ts": time.time(), "type": "span", "stage": stage,
+                           "ms": round(seconds * 1000.0, 3), **labels})
+
+
+def incr(counter: str, value: float = 1, **labels):
+    """Adds to a counter, e.g. incr("llm_cache_hits") or incr("upload_failures")."""
+    if not _enabled:
+        return
+    key = (counter, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _append_event(event: dict):
+    """Must be called with _lock held."""
+    global _dropped_events
+    if len(_events) == _events.maxlen:
+        _dropped_events += 1 # The deque drops the oldest event
+    _events.append(event)
+
+
+# --- Reading and Export ---
+def snapshot() -> dict:
+    """Returns {"stages": {stage: {count, mean_ms, max_ms}}, "counters": {name: value}} (labels folded in)."""
+    with _lock:
+        stages = {}
+        for (stage, labels), (buckets, total, peak) in _histograms.items():
+            count = sum(buckets)
+            stages[_display_name(stage, labels)] = {
+                "count": count,
+                "mean_ms": round(total / count * 1000.0, 3) if count else 0.0,
+                "max_ms": round(peak * 1000.0, 3),
+            }
+        counters = {_display_name(name, labels): value for (name, labels), value in _counters.items()}
+    return {"stages": stages, "counters": counters}
+
+
+def export_path() -> str:
+    if _path:
+        return _path
+    extension = "prom" if _format == "prometheus" else "jsonl"
+    return os.path.join(METRICS_DIR, f"{_service}.{extension}")
+
+
+def flush():
+    """Writes the metrics file now. Prometheus files are replaced atomically; jsonl files are appended to."""
+    if not _enabled:
+        return
+    path = export_path()
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if _format == "prometheus":
+            _write_prometheus(path)
+        else:
+            _append_jsonl(path)
+    except OSError as e:
+        logging.warning(f"Could not export metrics to '{path}': {e}")
+
+
+def start_exporter(interval_seconds: float = EXPORT_INTERVAL_SECONDS):
+    """Exports periodically from a daemon thread, and once more when the process exits."""
+    global _exporter
+    if not _enabled:
+        return
+    with _lock:
+        if _exporter is not None:
+            return
+        _exporter = threading.Thread(target=_export_loop, args=(interval_seconds,), name="metrics-exporter", daemon=True)
+        _exporter.start()
+    atexit.register(flush)
+
+
+def _export_loop(interval_seconds: float):
+    while not _stop_exporter.wait(interval_seconds):
+        flush()
+
+
+def _display_name(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def _prometheus_labels(pairs) -> str:
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def _prometheus_value(value) -> str:
+    """Exact text for a counter: integers in full (byte and token totals), floats at full precision."""
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _write_prometheus(path: str):
+    with _lock:
+        histograms = {key: ([*buckets], total) for key, (buckets, total, _) in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = [
+        f"# HELP {METRIC_PREFIX}_stage_duration_seconds Time spent per pipeline stage.",
+        f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram",
+    ]
+    for (stage, labels), (buckets, total) in sorted(histograms.items()):
+        base = [("service", _service), ("stage", stage), *labels]
+        cumulative = 0
+        for upper, count in zip((*DURATION_BUCKETS, "+Inf"), buckets):
+            cumulative += count
+            lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_bucket{_prometheus_labels([*base, ('le', upper)])} {cumulative}")
+        lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_sum{_prometheus_labels(base)} {total:.6f}")
+        lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_count{_prometheus_labels(base)} {cumulative}")
+
+    lines.append(f"# HELP {METRIC_PREFIX}_events_total Pipeline event counters (cache hits, retries, failures).")
+    lines.append(f"# TYPE {METRIC_PREFIX}_events_total counter")
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"{METRIC_PREFIX}_events_total{_prometheus_labels([('service', _service), ('event', name), *labels])} {_prometheus_value(value)}")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _append_jsonl(path: str):
+    global _dropped_events
+    with _lock:
+        events = list(_events)
+        _events.clear()
+        dropped = _dropped_events
+        _dropped_events = 0
+        counters = {_display_name(name, labels): value for (name, labels), value in _counters.items()}
+
+    with open(path, "a", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(dict(event, service=_service)) + "\n")
+        f.write(json.dumps({"ts": time.time(), "type": "counters", "service": _service,
+                            "dropped_events": dropped, "counters": counters}) + "\n")
@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+import logging
+from typing import Dict, List, Optional
+
+from models_list import sync_voice_models, read_snapshot, snapshot_title_to_id, MODELS_PER_PAGE, SNAPSHOT_FILE
+from model_retention import read_retired_ids, RETIRED_MODELS_FILE
+
+# --- Configuration ---
+# How long a fetched title -> ID mapping is considered fresh (in seconds).
+# Once expired, the old mapping keeps being served while a background refresh runs.
+REGISTRY_TTL_SECONDS = 300
+# Marker file used to invalidate the registry across processes.
+# voice_model2.py touches it after a successful upload so ingame_llm_tts.py picks up new models
+# and drops retired ones.
+STALE_MARKER_FILE = ".model_registry_stale"
+
+
+class ModelRegistry:
+    """
+    In-process cache of the user's Fish Audio voice models (title -> ID).
+
+    The hot path (get_title_to_id / get_titles / get_model_id) never touches the
+    network once the registry has been loaded. Expired or invalidated entries are
+    served as-is while a single background thread refreshes them. Models that
+    voice_model2.py retired (see model_retention.py) are left out, even before their
+    deletion from the account has gone through.
+    """
+
+    def __init__(self, api_key: str, ttl_seconds: float = REGISTRY_TTL_SECONDS,
+                 page_size: int = MODELS_PER_PAGE, stale_marker_path: str = STALE_MARKER_FILE,
+                 snapshot_path: str = SNAPSHOT_FILE, retired_path: str = RETIRED_MODELS_FILE):
+        self.api_key = api_key
+        self.ttl_seconds = ttl_seconds
+        self.page_size = page_size
+        self.stale_marker_path = stale_marker_path
+        self.snapshot_path = snapshot_path
+        self.retired_path = retired_path
+
+        self._lock = threading.Lock()
+        self._title_to_id: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._marker_mtime = self._read_marker_mtime()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    # --- Public API ---
+    def get_title_to_id(self) -> Dict[str, str]:
+        """Returns a copy of the title -> ID mapping, loading it synchronously only on first use."""
+        if self._loaded_at is None:
+            self.refresh()
+        elif self._needs_refresh():
+            self.refresh_in_background()
+        with self._lock:
+            return dict(self._title_to_id)
+
+    def get_titles(self) -> List[str]:
+        """Returns the list of known model titles."""
+        return list(self.get_title_to_id().keys())
+
+    def get_model_id(self, title: str) -> Optional[str]:
+        """
+        Looks up the model ID for an exact title.
+
+        A miss triggers one synchronous refresh, since it usually means a model
+        was created after the last fetch.
+        """
+        model_id = self.get_title_to_id().get(title)
+        if model_id is None:
+            self.refresh()
+            with self._lock:
+                model_id = self._title_to_id.get(title)
+        return model_id
+
+    def invalidate(self):
+        """Marks the cached mapping as stale. The next access schedules a background refresh."""
+        with self._lock:
+            self._stale = True
+
+    def refresh(self) -> bool:
+        """
+        Syncs the model list now (incrementally, via the snapshot file) and replaces
+        the cached mapping. Returns True on success. On failure the previous mapping
+        is kept; if there is none yet, the last snapshot is served until a sync succeeds.
+        """
+        marker_mtime = self._read_marker_mtime()
+        try:
+            title_to_id = self._without_retired(sync_voice_models(self.api_key, self.page_size, self.snapshot_path))
+        except Exception as e:
+            logging.error(f"Model registry refresh failed: {e}")
+            self._load_snapshot_fallback()
+            return False
+
+        with self._lock:
+            self._title_to_id = title_to_id
+            self._loaded_at = time.monotonic()
+            self._stale = False
+            self._marker_mtime = marker_mtime
+        logging.info(f"Model registry refreshed: {len(title_to_id)} model(s).")
+        return True
+
+    def refresh_in_background(self):
+        """Starts a background refresh unless one is already running."""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name="model-registry-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    # --- Internal Helpers ---
+    def _load_snapshot_fallback(self):
+        snapshot = read_snapshot(self.api_key, self.snapshot_path)
+        with self._lock:
+            if self._loaded_at is not None or snapshot is None:
+                return
+            self._title_to_id = self._without_retired(snapshot_title_to_id(snapshot))
+            self._loaded_at = time.monotonic()
+            self._stale = True # Keep trying to sync in the background
+        logging.warning(f"Model registry is serving {len(self._title_to_id)} model(s) from the last snapshot.")
+
+    def _without_retired(self, title_to_id: Dict[str, str]) -> Dict[str, str]:
+        retired = read_retired_ids(self.retired_path)
+        return {title: model_id for title, model_id in title_to_id.items() if model_id not in retired}
+
+    def _needs_refresh(self) -> bool:
+        with self._lock:
+            if self._stale:
+                return True
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at > self.ttl_seconds:
+                return True
+            marker_mtime = self._marker_mtime
+        # A single stat() call; cheap enough to do on every access.
+        return self._read_marker_mtime() != marker_mtime
+
+    def _read_marker_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.stale_marker_path).st_mtime
+        except OSError:
+            return None
+
+
+# --- Shared Instances ---
+_registries: Dict[str, ModelRegistry] = {}
+_registries_lock = threading.Lock()
+
+def get_registry(api_key: str) -> ModelRegistry:
+    """Returns the process-wide registry for the given API key, creating it on first use."""
+    with _registries_lock:
+        registry = _registries.get(api_key)
+        if registry is None:
+            registry = ModelRegistry(api_key)
+            _registries[api_key] = registry
+        return registry
+
+def mark_stale(marker_path: str = STALE_MARKER_FILE):
+    """
+    Invalidates every registry that watches marker_path, including ones in other processes.
+    Also invalidates the registries of the current process directly.
+    """
+    try:
+        with open(marker_path, "a"):
+            pass
+        os.utime(marker_path, None)
+    except OSError as e:
+        logging.warning(f"Could not update model registry marker '{marker_path}': {e}")
+
+    with _registries_lock:
+        for registry in _registries.values():
+            registry.invalidate()
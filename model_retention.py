@@ -0,0 +1,97 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Set
+
+from fish_audio_sdk.exceptions import HttpCodeErr
+
+import metrics
+from http_clients import get_fish_session
+from upload_queue import MODEL_ACTIVE, MODEL_RETIRED, MODEL_DELETED
+
+# --- Configuration ---
+# Each voice_model2.py batch creates a new model. Only the newest ones of a voice are offered
+# for TTS; older ones were trained on less audio and only slow down model listings.
+KEEP_MODELS_PER_VOICE = 3       # 0 keeps every model
+DELETE_RETIRED_MODELS = True    # Delete superseded models from the account (False: only stop offering them)
+# Whose voice this voice_model2.py instance records. Give each player's instance its own name
+# when several share one Fish Audio account, so retention never touches another player's models.
+VOICE_NAME = os.getenv("VOICE_MODEL_VOICE", "default")
+# IDs of superseded models, read by model_registry.py so they are never picked for TTS
+RETIRED_MODELS_FILE = "retired_voice_models.json"
+
+_retention_lock = threading.Lock() # Parallel uploads finish concurrently
+
+
+def apply_retention(upload_queue, api_key: str, keep: int = KEEP_MODELS_PER_VOICE,
+                    delete: bool = DELETE_RETIRED_MODELS, retired_path: str = RETIRED_MODELS_FILE) -> Dict[str, int]:
+    """
+    Retires all but the newest `keep` recorded models of every voice, deletes retired models
+    from the account (retrying earlier failures) and rewrites the retired-models file.
+    Returns {"retired": ..., "deleted": ...} for this call.
+    """
+    with _retention_lock:
+        retired = []
+        if keep > 0:
+            newest: Dict[str, int] = {}
+            for model in upload_queue.models(MODEL_ACTIVE):
+                newest[model["voice"]] = newest.get(model["voice"], 0) + 1
+                if newest[model["voice"]] > keep:
+                    retired.append(model)
+        if retired:
+            upload_queue.retire_models([model["model_id"] for model in retired])
+            metrics.incr("models_retired", len(retired))
+            for model in retired:
+                print(f"Retired model {model['title']} ({model['model_id']}, voice '{model['voice']}', "
+                      f"{model['speech_ms'] / 1000.0:.0f}s of speech): superseded by newer models.")
+
+        deleted = 0
+        if delete:
+            for model in upload_queue.models(MODEL_RETIRED):
+                if delete_model(api_key, model["model_id"]):
+                    upload_queue.mark_model_deleted(model["model_id"])
+                    deleted += 1
+            if deleted:
+                metrics.incr("models_deleted", deleted)
+                print(f"Deleted {deleted} superseded model(s) from the Fish Audio account.")
+
+        write_retired_ids(retired_path, [model["model_id"] for model in upload_queue.models()
+                                         if model["state"] in (MODEL_RETIRED, MODEL_DELETED)])
+    return {"retired": len(retired), "deleted": deleted}
+
+
+def delete_model(api_key: str, model_id: str) -> bool:
+    """Deletes a model from the account. A model that is already gone counts as deleted."""
+    try:
+        get_fish_session(api_key).delete_model(model_id)
+        return True
+    except HttpCodeErr as e:
+        if e.status == 404:
+            return True
+        print(f"Warning: Could not delete model {model_id}, will retry later: {e}")
+    except Exception as e:
+        print(f"Warning: Could not delete model {model_id}, will retry later: {e}")
+    return False
+
+
+def read_retired_ids(retired_path: str = RETIRED_MODELS_FILE) -> Set[str]:
+    """IDs of superseded models (empty if the file does not exist yet)."""
+    try:
+        with open(retired_path, "r", encoding="utf-8") as f:
+            return set(json.load(f)["models"])
+    except FileNotFoundError:
+        return set()
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Ignoring unreadable retired models file '{retired_path}': {e}")
+        return set()
+
+
+def write_retired_ids(retired_path: str, model_ids: List[str]):
+    tmp_path = f"{retired_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"models": sorted(model_ids)}, f)
+        os.replace(tmp_path, retired_path)
+    except OSError as e:
+        logging.warning(f"Could not save retired models file '{retired_path}': {e}")
@@ -1,70 +1,192 @@
 import os
 import sys
+import json
+import math
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 # Note that FishAudioError is not available with the currently available library, do not use it
-from typing import List # Import List for type hinting
-from fish_audio_sdk import Session
+from typing import Dict, List, Optional # Import List for type hinting
 from fish_audio_sdk.schemas import PaginatedResponse, ModelEntity # Import relevant schemas
+from http_clients import get_fish_session
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
 # --- Configuration ---
 # Set how many models you want to retrieve per API call.
-# Adjust if you have a very large number of your own models.
 # The API default is 10 if not specified.
 MODELS_PER_PAGE = 50 # Adjusted default, can be increased if needed
+MAX_CONCURRENT_PAGES = 4 # Pages requested in parallel during a full listing
+# Last known model list. Lets a cold start fetch only the models created since, instead of every page.
+SNAPSHOT_FILE = "voice_models_snapshot.json"
+
+def _fetch_page(session, page_number: int, page_size: int) -> PaginatedResponse[ModelEntity]:
+    """One page of the user's models, newest first."""
+    return session.list_models(
+        self_only=True,
+        page_size=page_size,
+        page_number=page_number,
+        sort_by="created_at"
+    )
+
+def _to_record(model_entity: ModelEntity) -> Dict[str, str]:
+    return {
+        "id": model_entity.id,
+        "title": model_entity.title,
+        "created_at": model_entity.created_at.isoformat(),
+    }
+
+def _title_to_id(records: List[Dict[str, str]]) -> Dict[str, str]:
+    """If several models share a title, the newest one wins."""
+    title_to_id: Dict[str, str] = {}
+    for record in sorted(records, key=lambda r: r["created_at"]):
+        if record["title"] and record["id"]:
+            title_to_id[record["title"]] = record["id"]
+    return title_to_id
+
+def _dedupe(records: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    return list({record["id"]: record for record in records}.values())
+
+def _fetch_all_records(session, page_size: int, max_workers: int = MAX_CONCURRENT_PAGES) -> List[Dict[str, str]]:
+    """
+    Lists every model of the account. The first page gives the total; the remaining
+    pages are then requested concurrently.
+    """
+    pages = {1: _fetch_page(session, 1, page_size)}
+    page_count = math.ceil(pages[1].total / page_size)
+    if page_count > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            numbers = range(2, page_count + 1)
+            for number, page in zip(numbers, executor.map(lambda n: _fetch_page(session, n, page_size), numbers)):
+                pages[number] = page
+
+    # Models created while we were listing push older ones onto pages we did not request
+    number = page_count + 1
+    while (number - 1) * page_size < max(page.total for page in pages.values()):
+        pages[number] = _fetch_page(session, number, page_size)
+        number += 1
+
+    return _dedupe([_to_record(entity) for page in pages.values() for entity in page.items])
+
+def _sync_records(session, snapshot: dict, page_size: int) -> Optional[List[Dict[str, str]]]:
+    """
+    Fetches pages (newest first) only until reaching models already in the snapshot.
+    Returns None when the result cannot be trusted and a full listing is needed,
+    i.e. when models were deleted or the API did not return them newest first.
+    """
+    known = snapshot["models"]
+    known_ids = {record["id"] for record in known}
+    new_records: List[Dict[str, str]] = []
+    number = 1
+    while True:
+        page = _fetch_page(session, number, page_size)
+        if number == 1:
+            total = page.total
+        records = [_to_record(entity) for entity in page.items]
+        created = [record["created_at"] for record in records]
+        if created != sorted(created, reverse=True):
+            return None
+        fresh = [record for record in records if record["id"] not in known_ids]
+        new_records.extend(fresh)
+        if len(fresh) < len(records) or number * page_size >= page.total:
+            break
+        number += 1
+
+    merged = _dedupe(new_records + known)
+    if len(merged) != total:
+        return None
+    return merged
+
+def _account_fingerprint(api_key: str) -> str:
+    # Ties a snapshot to the account without storing the key itself
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+def read_snapshot(api_key: str, snapshot_path: str = SNAPSHOT_FILE) -> Optional[dict]:
+    """Returns the saved snapshot for this account, or None if there is no usable one."""
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if snapshot.get("account") != _account_fingerprint(api_key) or not isinstance(snapshot.get("models"), list):
+            return None
+        return snapshot
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, AttributeError) as e:
+        logging.warning(f"Ignoring unreadable model snapshot '{snapshot_path}': {e}")
+        return None
+
+def snapshot_title_to_id(snapshot: dict) -> Dict[str, str]:
+    return _title_to_id(snapshot["models"])
+
+def _write_snapshot(api_key: str, snapshot_path: str, records: List[Dict[str, str]]):
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"account": _account_fingerprint(api_key), "models": records}, f)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as e:
+        logging.warning(f"Could not save model snapshot '{snapshot_path}': {e}")
+
+def sync_voice_models(api_key: str, page_size: int = MODELS_PER_PAGE,
+                      snapshot_path: str = SNAPSHOT_FILE) -> Dict[str, str]:
+    """
+    Returns {model title: model ID} for all of the user's models, keeping the
+    snapshot file up to date.
 
-def list_my_voice_models(api_key: str, page_size: int) -> List[str]:
+    With a snapshot on disk only the models created since the last sync are fetched
+    (usually a single page). Without one, or if models were deleted in the meantime,
+    every page is listed concurrently. Errors are raised, not swallowed.
     """
-    Connects to Fish Audio and retrieves a list of voice model titles
-    created by the user (using self_only=True) for the current page.
+    session = get_fish_session(api_key)
+    snapshot = read_snapshot(api_key, snapshot_path)
+
+    records = _sync_records(session, snapshot, page_size) if snapshot is not None else None
+    if records is None:
+        records = _fetch_all_records(session, page_size)
+        logging.info(f"Full model listing: {len(records)} model(s).")
+
+    _write_snapshot(api_key, snapshot_path, records)
+    return _title_to_id(records)
+
+def fetch_my_voice_models(api_key: str, page_size: int) -> Dict[str, str]:
+    """
+    Connects to Fish Audio and retrieves a mapping of voice model title to
+    model ID for all models created by the user (using self_only=True),
+    requesting the pages concurrently. The snapshot file is not used.
+
+    Errors are not swallowed here so that callers can tell an empty account
+    from a failed call.
 
     Args:
         api_key: Your Fish Audio API key.
         page_size: The maximum number of models to request per page.
 
     Returns:
-        A list of model titles. Returns an empty list if an error occurs,
-        the API key is invalid, or no models are found on the current page.
+        A dict of {model title: model ID}. Models without a title or ID are skipped.
     """
-    model_titles: List[str] = []
+    return _title_to_id(_fetch_all_records(get_fish_session(api_key), page_size))
 
-    if not api_key:
-        return model_titles # Return empty list if API key is missing
+def list_my_voice_models(api_key: str, page_size: int) -> List[str]:
+    """
+    Connects to Fish Audio and retrieves the titles of all voice models
+    created by the user (using self_only=True), across every page.
 
-    try:
-        session = Session(api_key)
-
-        # Pass self_only=True and page_size to the SDK function
-        paginated_response: PaginatedResponse[ModelEntity] = session.list_models(
-            self_only=True,
-            page_size=page_size
-        )
-
-        # Check if the response object exists and has the expected attributes
-        if paginated_response and hasattr(paginated_response, 'items'):
-            models_list = paginated_response.items
-
-            if isinstance(models_list, list) and models_list:
-                for model_entity in models_list:
-                    if not isinstance(model_entity, ModelEntity):
-                         continue
-                    try:
-                        title = getattr(model_entity, 'title', None)
-                        if title is not None:
-                            model_titles.append(title)
-                    except AttributeError:
-                        # Silently skip if 'title' attribute is missing or other attribute error
-                        continue
-    except Exception as e:
-        # In case of any API error or other exception, return an empty list.
-        # The calling script can decide how to handle this (e.g., log, retry).
-        # For now, we ensure the function doesn't crash and returns the specified type.
-        return [] # Return empty list on any exception
+    Args:
+        api_key: Your Fish Audio API key.
+        page_size: The maximum number of models to request per page.
 
-    return model_titles
+    Returns:
+        A list of model titles, newest first. Returns an empty list if the
+        API key is missing or no models are found. API errors are raised.
+    """
+    if not api_key:
+        return [] # Return empty list if API key is missing
+
+    records = _fetch_all_records(get_fish_session(api_key), page_size)
+    return [record["title"] for record in sorted(records, key=lambda r: r["created_at"], reverse=True)
+            if record["title"]]
 
 # Main execution block
 if __name__ == "__main__":
@@ -80,13 +202,16 @@ if __name__ == "__main__":
         sys.exit(1) # Exit if key is missing
 
     # Call the function to get model titles
-    retrieved_titles = list_my_voice_models(fish_api_key, page_size=MODELS_PER_PAGE)
+    try:
+        retrieved_titles = list_my_voice_models(fish_api_key, page_size=MODELS_PER_PAGE)
+    except Exception as e:
+        print(f"Error: Could not retrieve voice models: {e}")
+        sys.exit(1)
 
     if retrieved_titles:
-        print("\n--- Your Voice Model Titles (from current page) ---")
+        print("\n--- Your Voice Model Titles (newest first) ---")
         for idx, title in enumerate(retrieved_titles):
             print(f"{idx + 1}. {title}")
         print(f"\nRetrieved {len(retrieved_titles)} model titles.")
-        print(f"Note: This list may be paginated. Increase MODELS_PER_PAGE or implement full pagination to see all models if more exist.")
     else:
-        print("No voice model titles found for your account on the current page, or an error occurred during retrieval.")
+        print("No voice model titles found for your account.")
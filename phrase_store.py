@@ -0,0 +1,121 @@
+import os
+import json
+import random
+import threading
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+from thefuzz import fuzz, process # Fuzzy matching for near-duplicate phrases
+
+# --- Configuration ---
+# Phrases scoring at least this similar (0-100) to an earlier phrase in the same emotion are dropped
+FUZZY_DEDUPE_THRESHOLD = 90
+# Phrases dealt this recently are kept out of the top of a freshly shuffled deck
+RECENT_WINDOW = 60
+
+
+class PhraseStore:
+    """
+    In-memory, per-emotion index of emotion_phrases.json.
+
+    The file is parsed once and reloaded only when its mtime changes. Sampling deals
+    phrases from a shuffled deck per emotion, so a phrase is not repeated until the
+    rest of the emotion's phrases have been used, and each call costs O(k).
+    """
+
+    def __init__(self, path: str, dedupe_threshold: int = FUZZY_DEDUPE_THRESHOLD,
+                 recent_window: int = RECENT_WINDOW):
+        self.path = path
+        self.dedupe_threshold = dedupe_threshold
+        self.recent_window = recent_window
+
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._phrases: Dict[str, List[str]] = {} # emotion -> deduplicated phrases
+        self._decks: Dict[str, List[int]] = {}   # emotion -> indices not dealt yet (dealt from the end)
+        self._recent: Dict[str, deque] = {}      # emotion -> most recently dealt indices
+
+    # --- Public API ---
+    def sample(self, emotion: str, k: int) -> List[str]:
+        """Returns up to k distinct phrases for the emotion, avoiding recently used ones."""
+        with self._lock:
+            self._reload_if_changed()
+            if emotion not in self._phrases:
+                raise ValueError(f"Emotion category '{emotion}' not found in phrase file.")
+
+            phrases = self._phrases[emotion]
+            k = min(k, len(phrases))
+            deck = self._decks[emotion]
+            recent = self._recent[emotion]
+            picked = []
+            while len(picked) < k:
+                if not deck:
+                    deck = self._decks[emotion] = self._new_deck(len(phrases), recent, picked)
+                index = deck.pop()
+                picked.append(index)
+                recent.append(index)
+            return [phrases[i] for i in picked]
+
+    def emotions(self) -> List[str]:
+        with self._lock:
+            self._reload_if_changed()
+            return list(self._phrases.keys())
+
+    # --- Internal Helpers ---
+    def _reload_if_changed(self):
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self._mtime:
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            all_phrases = json.load(f)
+
+        self._phrases = {}
+        for emotion, phrases in all_phrases.items():
+            unique = self._dedupe(phrases)
+            if len(unique) < len(phrases):
+                logging.info(f"Phrase store: dropped {len(phrases) - len(unique)} near-duplicate '{emotion}' phrase(s).")
+            self._phrases[emotion] = unique
+        self._decks = {emotion: self._new_deck(len(phrases)) for emotion, phrases in self._phrases.items()}
+        self._recent = {emotion: deque(maxlen=min(self.recent_window, len(phrases) // 2))
+                        for emotion, phrases in self._phrases.items()}
+        self._mtime = mtime
+
+    def _dedupe(self, phrases: List[str]) -> List[str]:
+        kept: List[str] = []
+        seen_exact = set()
+        for phrase in phrases:
+            normalized = phrase.strip().lower()
+            if not normalized or normalized in seen_exact:
+                continue
+            if kept and process.extractOne(phrase, kept, scorer=fuzz.ratio, score_cutoff=self.dedupe_threshold):
+                continue
+            seen_exact.add(normalized)
+            kept.append(phrase)
+        return kept
+
+    def _new_deck(self, size: int, recent=(), picked=()) -> List[int]:
+        """
+        Shuffled indices, dealt from the end. Phrases picked in the current call and recently
+        dealt ones go to the bottom (most recent last), so none of them repeats right away.
+        """
+        held_back = list(dict.fromkeys(list(reversed(picked)) + list(reversed(recent))))
+        excluded = set(held_back)
+        deck = [i for i in range(size) if i not in excluded]
+        random.shuffle(deck)
+        return held_back + deck
+
+
+# --- Shared Instances ---
+_stores: Dict[str, PhraseStore] = {}
+_stores_lock = threading.Lock()
+
+def get_phrase_store(path: str) -> PhraseStore:
+    """Returns the process-wide store for a phrase file, creating it on first use."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = PhraseStore(path)
+        return store
@@ -0,0 +1,131 @@
+import io
+import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable
+
+# --- Configuration ---
+MAX_CONCURRENT_CONTEXTS = 4 # Context files processed at the same time
+
+
+class _ThreadLocalStdout:
+    """
+    Replacement for sys.stdout that sends print() output from pipeline workers to a
+    per-job buffer, and everything else straight to the real stdout.
+    """
+
+    def __init__(self, real_stdout):
+        self.real_stdout = real_stdout
+        self._local = threading.local()
+
+    def set_buffer(self, buffer):
+        self._local.buffer = buffer
+
+    def get_buffer(self):
+        return getattr(self._local, "buffer", None)
+
+    def write(self, text):
+        buffer = self.get_buffer()
+        if buffer is not None:
+            return buffer.write(text)
+        return self.real_stdout.write(text)
+
+    def flush(self):
+        self.real_stdout.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.real_stdout, name)
+
+
+_stdout_lock = threading.Lock()
+
+def _thread_local_stdout() -> _ThreadLocalStdout:
+    """Installs the per-thread stdout (once per process) and returns it."""
+    with _stdout_lock:
+        if not isinstance(sys.stdout, _ThreadLocalStdout):
+            sys.stdout = _ThreadLocalStdout(sys.stdout)
+        return sys.stdout
+
+
+@contextmanager
+def capture_thread_output():
+    """Collects what the current thread print()s inside the block in a StringIO, which is yielded."""
+    stdout = _thread_local_stdout()
+    previous = stdout.get_buffer()
+    buffer = io.StringIO()
+    stdout.set_buffer(buffer)
+    try:
+        yield buffer
+    finally:
+        stdout.set_buffer(previous)
+
+
+class ContextExecutor:
+    """
+    Runs context-file jobs on a bounded thread pool.
+
+    Each job's printed output is captured and written out in one block, in the order
+    the jobs were submitted, so logs for different context files never interleave.
+    Per-backend request limits are enforced separately by backend_limits.
+    """
+
+    def __init__(self, max_workers: int = MAX_CONCURRENT_CONTEXTS, thread_name_prefix: str = "context"):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._lock = threading.Lock()
+        self._order = deque() # (name, future, buffer) in submission order
+        self._submitted = 0
+        self._completed = 0
+
+        self._stdout = _thread_local_stdout()
+
+    def submit(self, name: str, fn: Callable, *args, **kwargs) -> Future:
+        """Queues fn(*args, **kwargs) for the context file `name`."""
+        buffer = io.StringIO()
+
+        def run():
+            self._stdout.set_buffer(buffer)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._stdout.set_buffer(None)
+
+        with self._lock:
+            future = self._pool.submit(run)
+            self._order.append((name, future, buffer))
+            self._submitted += 1
+        future.add_done_callback(self._on_done)
+        return future
+
+    def queue_depth(self) -> int:
+        """Number of submitted jobs that have not finished yet (running or waiting)."""
+        with self._lock:
+            return self._submitted - self._completed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "queue_depth": self._submitted - self._completed,
+                "max_workers": self.max_workers,
+            }
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """Stops accepting jobs. With cancel_pending, jobs that have not started yet are dropped."""
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_pending)
+
+    def _on_done(self, _future: Future):
+        with self._lock:
+            self._completed += 1
+            # Emit finished jobs from the head of the queue; later ones wait for earlier ones
+            while self._order and self._order[0][1].done():
+                name, future, buffer = self._order.popleft()
+                output = buffer.getvalue()
+                exc = None if future.cancelled() else future.exception()
+                if exc is not None:
+                    output += f"\nError processing file '{name}': {exc}\n"
+                self._stdout.real_stdout.write(output)
+            self._stdout.real_stdout.flush()
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import shutil
+import threading
+import logging
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+# --- Configuration ---
+JOURNAL_FILE = "processed_contexts.jsonl" # One [name, size, mtime_ns] per line, appended as files are handled
+MAX_JOURNAL_ENTRIES = 5000                # Most recent entries kept in memory (and on disk after compaction)
+ARCHIVE_DIR = "Archive"                   # Handled files are moved to Archive/<YYYY-MM-DD>/<folder name>/
+OUTPUT_ARCHIVE_AGE_SECONDS = 600          # Generated audio is archived once it is this old (the game has played it)
+ARCHIVE_RETENTION_DAYS = 7                # Dated archive folders older than this are deleted
+COMPACTION_INTERVAL_SECONDS = 60          # How often the hot folders are compacted
+
+FileKey = Tuple[str, int, int] # (name, size, mtime_ns)
+
+
+def file_key(path: str) -> FileKey:
+    """Identifies a file by name, size and mtime, so a rewritten file with the same name counts as new."""
+    st = os.stat(path)
+    return (os.path.basename(path), st.st_size, st.st_mtime_ns)
+
+
+class ProcessedJournal:
+    """
+    Persistent record of the context files that have already been handled.
+
+    Replaces an in-memory set of names: the journal survives restarts, memory is bounded
+    to the max_entries most recent files, and the append-only file is rewritten (atomically)
+    with just those entries once it grows past twice that size.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE, max_entries: int = MAX_JOURNAL_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[FileKey, None]" = OrderedDict() # oldest first
+        self._file_lines = 0
+        self._load()
+
+    # --- Public API ---
+    def contains(self, path: str) -> bool:
+        """True if this exact file (name, size, mtime) was handled before. Missing files count as handled."""
+        try:
+            key = file_key(path)
+        except OSError:
+            return True
+        with self._lock:
+            return key in self._entries
+
+    def add(self, path: str):
+        """Records a file as handled."""
+        try:
+            key = file_key(path)
+        except OSError:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(list(key)) + "\n")
+                self._file_lines += 1
+            except OSError as e:
+                logging.warning(f"Could not append to processed-file journal '{self.path}': {e}")
+
+    def compact(self):
+        """Rewrites the journal file with only the entries kept in memory, if it has grown past 2x max_entries."""
+        with self._lock:
+            if self._file_lines <= 2 * self.max_entries:
+                return
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for key in self._entries:
+                        f.write(json.dumps(list(key)) + "\n")
+                os.replace(tmp_path, self.path)
+                self._file_lines = len(self._entries)
+            except OSError as e:
+                logging.warning(f"Could not compact processed-file journal '{self.path}': {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "file_lines": self._file_lines}
+
+    # --- Internal Helpers ---
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._file_lines += 1
+                    try:
+                        name, size, mtime_ns = json.loads(line)
+                    except ValueError:
+                        continue # Torn last line from a crash
+                    key = (name, size, mtime_ns)
+                    self._entries.pop(key, None)
+                    self._entries[key] = None
+                    if len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        except OSError as e:
+            logging.warning(f"Ignoring unreadable processed-file journal '{self.path}': {e}")
+
+
+# --- Archival ---
+def archive_file(path: str, archive_dir: str = ARCHIVE_DIR) -> Optional[str]:
+    """
+    Moves a file to <archive_dir>/<YYYY-MM-DD of its mtime>/<name of its folder>/ and
+    returns the new path (None if it could not be moved). Existing names get a numeric suffix.
+    """
+    try:
+        day = time.strftime("%Y-%m-%d", time.localtime(os.path.getmtime(path)))
+        folder_name = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        target_dir = os.path.join(archive_dir, day, folder_name)
+        os.makedirs(target_dir, exist_ok=True)
+        stem, ext = os.path.splitext(os.path.basename(path))
+        target = os.path.join(target_dir, stem + ext)
+        counter = 1
+        while os.path.exists(target):
+            target = os.path.join(target_dir, f"{stem}_{counter}{ext}")
+            counter += 1
+        shutil.move(path, target)
+        return target
+    except OSError as e:
+        logging.warning(f"Could not archive '{path}': {e}")
+        return None
+
+
+def archive_folder(folder: str, suffixes: Iterable[str], archive_dir: str = ARCHIVE_DIR,
+                   min_age_seconds: float = 0.0, journal: Optional[ProcessedJournal] = None) -> int:
+    """
+    Moves the matching files of folder that are at least min_age_seconds old (and, if a
+    journal is given, recorded in it) into the dated archive. Returns the number moved.
+    """
+    suffixes = tuple(s.lower() for s in suffixes)
+    cutoff = time.time() - min_age_seconds
+    moved = 0
+    try:
+        entries = list(os.scandir(folder))
+    except OSError as e:
+        logging.warning(f"Could not list '{folder}' for archiving: {e}")
+        return 0
+    for entry in entries:
+        if not entry.name.lower().endswith(suffixes):
+            continue
+        try:
+            if not entry.is_file() or entry.stat().st_mtime > cutoff:
+                continue
+        except OSError:
+            continue
+        if journal is not None and not journal.contains(entry.path):
+            continue
+        if archive_file(entry.path, archive_dir) is not None:
+            moved += 1
+    return moved
+
+
+def prune_archive(archive_dir: str = ARCHIVE_DIR, retention_days: float = ARCHIVE_RETENTION_DAYS) -> int:
+    """Deletes dated archive folders older than retention_days. Returns the number removed."""
+    if not os.path.isdir(archive_dir):
+        return 0
+    oldest_kept = time.strftime("%Y-%m-%d", time.localtime(time.time() - retention_days * 86400))
+    removed = 0
+    for entry in os.scandir(archive_dir):
+        # Only touch folders named like dates; ISO dates compare correctly as strings
+        is_dated = len(entry.name) == 10 and entry.name[4] == entry.name[7] == "-"
+        if entry.is_dir() and is_dated and entry.name < oldest_kept:
+            try:
+                shutil.rmtree(entry.path)
+                removed += 1
+            except OSError as e:
+                logging.warning(f"Could not remove old archive folder '{entry.path}': {e}")
+    return removed
@@ -0,0 +1,223 @@
+import os
+import time
+import shutil
+import queue
+import threading
+import logging
+from collections import Counter, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pipeline_executor import capture_thread_output
+
+# --- Configuration ---
+POOL_DIR = "SpeculativePool"     # Where pre-rendered WAVs are kept until served
+LINES_PER_COMBO = 2              # Pre-rendered lines kept per (moon, enemy, emotion)
+MAX_COMBOS_PER_MOON = 6          # How many (enemy, emotion) combinations to pre-render per moon
+MAX_POOL_ENTRIES = 12            # Memory budget: max pre-rendered lines tracked at once
+MAX_POOL_DISK_BYTES = 20 * 1024 * 1024 # Disk budget for pre-rendered WAVs
+# Interior enemies that most often trigger voice lines; used until enough real contexts are seen
+DEFAULT_LIKELY_ENEMIES = ["HoardingBug", "BunkerSpider", "SnareFlea", "Thumper", "Bracken", "Coil-Head"]
+EMOTIONS = ["panic", "interest", "confusion"]
+
+PoolKey = Tuple[str, str, str] # (moon, enemy, emotion)
+
+
+class SpeculativePool:
+    """
+    Pre-renders voice lines in the background for the current moon's likely
+    (enemy, emotion) combinations, so later context files can be served instantly.
+
+    render_fn(personalization_context, output_path) -> bool does the actual
+    LLM -> TTS work and is called only from the pool's worker thread. What it prints
+    is logged as one block per render (debug level, warning if the render failed),
+    so it does not interleave with the grouped per-context output.
+    """
+
+    def __init__(self, render_fn: Callable[[dict, str], bool], player_names: List[str],
+                 known_moons: List[str], known_enemies: List[str], pool_dir: str = POOL_DIR,
+                 lines_per_combo: int = LINES_PER_COMBO, max_combos_per_moon: int = MAX_COMBOS_PER_MOON,
+                 max_entries: int = MAX_POOL_ENTRIES, max_disk_bytes: int = MAX_POOL_DISK_BYTES):
+        self.render_fn = render_fn
+        self.player_names = player_names
+        self.known_moons = set(known_moons)
+        self.known_enemies = list(known_enemies)
+        self.pool_dir = pool_dir
+        self.lines_per_combo = lines_per_combo
+        self.max_combos_per_moon = max_combos_per_moon
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._entries: Dict[PoolKey, deque] = {} # key -> deque of (path, size_bytes)
+        self._entry_count = 0
+        self._disk_bytes = 0
+        self._current_moon: Optional[str] = None
+        self._enemy_counts: Counter = Counter()  # (enemy, emotion) seen on the current moon
+        self._pending = set()                    # keys queued for rendering
+        self._work = queue.Queue()
+        self._file_counter = 0
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.render_failures = 0
+
+        os.makedirs(self.pool_dir, exist_ok=True)
+        self._clear_pool_dir()
+        self._worker = threading.Thread(target=self._worker_loop, name="speculative-pool", daemon=True)
+        self._worker.start()
+
+    # --- Public API ---
+    def take(self, context: dict, output_path: str) -> bool:
+        """
+        Serves a pre-rendered line for the context's (moon, enemy, emotion) by moving it
+        to output_path. Returns False on a miss. The served combination is refilled in the background.
+        """
+        key = self._key(context)
+        with self._lock:
+            entries = self._entries.get(key)
+            entry = entries.popleft() if entries else None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entry_count -= 1
+                self._disk_bytes -= entry[1]
+        if entry is None:
+            return False
+
+        try:
+            os.replace(entry[0], output_path)
+        except OSError:
+            # Pool folder may sit on a different drive than the output folder
+            shutil.move(entry[0], output_path)
+        self._schedule(key)
+        return True
+
+    def observe(self, context: dict):
+        """
+        Records a real context. The first context for a new moon drops the previous
+        moon's pool and queues pre-rendering for its likely combinations.
+        """
+        moon = context.get("current_moon", "")
+        if moon not in self.known_moons:
+            return
+
+        with self._lock:
+            new_moon = moon != self._current_moon
+            if new_moon:
+                self._current_moon = moon
+                self._enemy_counts.clear()
+                self._drop_entries_locked(lambda key: key[0] != moon)
+            self._enemy_counts[(context.get("enemy_name", ""), context.get("preferred_emotion", "interest"))] += 1
+
+        for key in self._likely_keys(moon):
+            self._schedule(key)
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and current pool usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "renders": self.renders,
+                "render_failures": self.render_failures,
+                "entries": self._entry_count,
+                "disk_bytes": self._disk_bytes,
+                "pending": len(self._pending),
+            }
+
+    # --- Internal Helpers ---
+    def _key(self, context: dict) -> PoolKey:
+        return (context.get("current_moon", ""), context.get("enemy_name", ""), context.get("preferred_emotion", "interest"))
+
+    def _likely_keys(self, moon: str) -> List[PoolKey]:
+        """Combinations seen on this moon first (most frequent first), then the default enemies."""
+        with self._lock:
+            seen = [combo for combo, _ in self._enemy_counts.most_common()]
+        combos = [combo for combo in seen if combo[0] in self.known_enemies]
+        for enemy in DEFAULT_LIKELY_ENEMIES:
+            if enemy in self.known_enemies:
+                for emotion in EMOTIONS:
+                    if (enemy, emotion) not in combos:
+                        combos.append((enemy, emotion))
+        return [(moon, enemy, emotion) for enemy, emotion in combos[:self.max_combos_per_moon]]
+
+    def _schedule(self, key: PoolKey):
+        with self._lock:
+            if key in self._pending or key[0] != self._current_moon:
+                return
+            self._pending.add(key)
+        self._work.put(key)
+
+    def _has_budget_locked(self) -> bool:
+        return self._entry_count < self.max_entries and self._disk_bytes < self.max_disk_bytes
+
+    def _worker_loop(self):
+        while True:
+            key = self._work.get()
+            try:
+                while True:
+                    with self._lock:
+                        stocked = len(self._entries.get(key, ()))
+                        if key[0] != self._current_moon or stocked >= self.lines_per_combo or not self._has_budget_locked():
+                            break
+                        self._file_counter += 1
+                        path = os.path.join(self.pool_dir, f"pool_{int(time.time())}_{self._file_counter}.wav")
+                    if not self._render(key, path):
+                        break
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def _render(self, key: PoolKey, path: str) -> bool:
+        moon, enemy, emotion = key
+        context = {
+            "player_names": self.player_names,
+            "current_moon": moon,
+            "enemy_name": enemy,
+            "preferred_emotion": emotion,
+            "distance_to_player": "unknown"
+        }
+        with capture_thread_output() as output:
+            try:
+                success = self.render_fn(context, path)
+            except Exception as e:
+                print(f"Error: {e}")
+                success = False
+        log = logging.debug if success else logging.warning
+        log(f"Speculative render {'done' if success else 'failed'} for {key}:\n{output.getvalue().rstrip()}")
+
+        with self._lock:
+            if not success or not os.path.exists(path):
+                self.render_failures += 1
+                return False
+            self.renders += 1
+            if key[0] != self._current_moon:
+                # Moon changed while rendering; the line is no longer useful
+                self._remove_file(path)
+                return False
+            size = os.path.getsize(path)
+            self._entries.setdefault(key, deque()).append((path, size))
+            self._entry_count += 1
+            self._disk_bytes += size
+        return True
+
+    def _drop_entries_locked(self, predicate):
+        for key in [k for k in self._entries if predicate(k)]:
+            for path, size in self._entries.pop(key):
+                self._entry_count -= 1
+                self._disk_bytes -= size
+                self._remove_file(path)
+
+    def _clear_pool_dir(self):
+        """Leftovers from a previous run are not tracked, so remove them."""
+        for fname in os.listdir(self.pool_dir):
+            self._remove_file(os.path.join(self.pool_dir, fname))
+
+    def _remove_file(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
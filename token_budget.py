@@ -0,0 +1,67 @@
+import re
+import math
+import logging
+from typing import List, Optional
+
+import metrics
+
+# --- Configuration ---
+# Encoding used for exact counts when the optional tiktoken package is installed
+TIKTOKEN_ENCODING = "o200k_base"
+
+_WORD_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_encoding = None
+_encoding_checked = False
+
+
+def _get_encoding():
+    """tiktoken encoding if available (it is optional and may need to download its tables once)."""
+    global _encoding, _encoding_checked
+    if not _encoding_checked:
+        _encoding_checked = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Number of tokens in text. Exact with tiktoken; otherwise a slightly pessimistic
+    estimate: one token per punctuation mark or number, and one per ~5 letters of a word.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    tokens = 0
+    for piece in _WORD_PATTERN.findall(text):
+        tokens += math.ceil(len(piece) / 5) if piece[0].isalpha() else math.ceil(len(piece) / 3)
+    return tokens
+
+
+def estimate_message_tokens(messages: List[dict]) -> int:
+    """Chat messages carry a few tokens of framing each on top of their content."""
+    return sum(estimate_tokens(message["content"]) + 4 for message in messages) + 2
+
+
+def record_usage(usage, estimated_prompt_tokens: Optional[int] = None):
+    """
+    Logs and counts the token usage of one chat completion, including how much of
+    the prompt was served from the provider's prompt cache (OpenAI caches prompts
+    of 1024 tokens or more only, so with the default PROMPT_TOKEN_BUDGET this is 0).
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+
+    metrics.incr("llm_prompt_tokens", prompt_tokens)
+    metrics.incr("llm_completion_tokens", completion_tokens)
+    metrics.incr("llm_cached_prompt_tokens", cached_tokens)
+    estimate = f" (estimated {estimated_prompt_tokens})" if estimated_prompt_tokens is not None else ""
+    logging.info(f"LLM tokens: {prompt_tokens} sent{estimate}, {cached_tokens} of them cached, "
+                 f"{completion_tokens} received.")
@@ -0,0 +1,201 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import metrics
+
+# --- Configuration ---
+CACHE_DIR = "tts_cache"                  # One '<key>.wav' per cached synthesis
+CACHE_MAX_BYTES = 200 * 1024 * 1024      # Byte budget; least recently used files are evicted past it
+
+
+def tts_cache_key(model_id: str, text: str, prosody=None, audio_format: str = "mp3",
+                  sample_rate: Optional[int] = None, boost_db: float = 0.0) -> str:
+    """
+    Content address of a synthesized line: everything the final (post-gain) WAV depends on.
+    prosody may be a fish_audio_sdk Prosody, a dict or None.
+    """
+    if prosody is not None and hasattr(prosody, "model_dump"):
+        prosody = prosody.model_dump()
+    normalized = {
+        "model_id": model_id,
+        "text": text,
+        "prosody": prosody,
+        "format": audio_format,
+        "sample_rate": sample_rate,
+        "boost_db": boost_db,
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class TTSAudioCache:
+    """
+    Content-addressed on-disk cache of finished TTS WAV files with a byte budget.
+
+    Files are named by their key, so the directory itself is the index: it is scanned
+    once at startup and recency is kept in each file's mtime (bumped on every hit).
+    Inserts are written to a temp name and renamed into place, and hits are published
+    to the output path the same way, as a hardlink where the filesystem allows it and
+    as a copy otherwise. Output files must therefore be replaced, never edited in place.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict() # key -> size, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._load()
+
+    # --- Public API ---
+    def publish(self, key: str, output_file: str) -> bool:
+        """Places the cached WAV for key at output_file. Returns False on a miss."""
+        with self._lock:
+            size = self._entries.get(key)
+            if size is not None:
+                self._entries.move_to_end(key)
+
+        if size is not None:
+            cached_path = self._path(key)
+            try:
+                _link_or_copy(cached_path, output_file)
+                os.utime(cached_path, None) # Recency survives restarts
+            except FileNotFoundError:
+                with self._lock: # Removed behind our back; forget it and treat as a miss
+                    if self._entries.pop(key, None) is not None:
+                        self.total_bytes -= size
+                size = None
+            except OSError as e:
+                logging.warning(f"Could not publish cached TTS audio to '{output_file}': {e}")
+                size = None
+
+        with self._lock:
+            if size is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.bytes_saved += size
+        if size is None:
+            metrics.incr("tts_cache_misses")
+            return False
+        metrics.incr("tts_cache_hits")
+        metrics.incr("tts_cache_bytes_saved", size)
+        return True
+
+    def store(self, key: str, source_file: str):
+        """Adds a finished WAV under key and evicts least recently used files past the byte budget."""
+        try:
+            size = os.path.getsize(source_file)
+            if size > self.max_bytes:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _link_or_copy(source_file, self._path(key))
+        except OSError as e:
+            logging.warning(f"Could not add '{source_file}' to the TTS cache: {e}")
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous
+            self._entries[key] = size
+            self.total_bytes += size
+            evicted = self._evict()
+        for evicted_key in evicted:
+            try:
+                os.remove(self._path(evicted_key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Could not remove evicted TTS cache file for '{evicted_key}': {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "evictions": self.evictions,
+            }
+
+    # --- Internal Helpers ---
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _evict(self):
+        """Must be called with _lock held. Returns the evicted keys; their files are removed by the caller."""
+        evicted = []
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            evicted.append(key)
+        if evicted:
+            self.evictions += len(evicted)
+            metrics.incr("tts_cache_evictions", len(evicted))
+        return evicted
+
+    def _load(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(".tmp"):
+                try:
+                    os.remove(entry.path) # Left over from an interrupted insert
+                except OSError:
+                    pass
+            elif entry.name.endswith(".wav"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name[:-len(".wav")], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+        for key in self._evict():
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+def _link_or_copy(source: str, destination: str):
+    """Atomically makes destination a hardlink to (or, failing that, a copy of) source."""
+    tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            # Different filesystem, or links not supported
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# --- Shared Instance ---
+_cache: Optional[TTSAudioCache] = None
+_cache_lock = threading.Lock()
+
+def get_tts_cache() -> TTSAudioCache:
+    """Returns the process-wide TTS cache, creating it (and scanning CACHE_DIR) on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSAudioCache()
+        return _cache
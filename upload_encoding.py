@@ -0,0 +1,76 @@
+import os
+import shutil
+import subprocess
+from collections import namedtuple
+from typing import Optional
+
+import metrics
+
+# --- Configuration ---
+UPLOAD_ENCODING = "flac"        # "flac" (lossless), "opus" or "mp3" (lossy, high bitrate), or "wav" (as stitched)
+UPLOAD_OPUS_BITRATE = "64k"     # Mono 16 kHz speech; well above Opus's transparent range for voice
+UPLOAD_MP3_BITRATE = "128k"
+ENCODE_TIMEOUT_SECONDS = 120
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY") # Defaults to ffmpeg on the PATH (the one pydub uses)
+
+UploadFormat = namedtuple("UploadFormat", ["extension", "content_type", "container", "codec_args"])
+
+UPLOAD_FORMATS = {
+    "wav": UploadFormat(".wav", "audio/wav", None, None),
+    "flac": UploadFormat(".flac", "audio/flac", "flac", ["-c:a", "flac", "-compression_level", "8"]),
+    "opus": UploadFormat(".ogg", "audio/ogg", "ogg", ["-c:a", "libopus", "-b:a", UPLOAD_OPUS_BITRATE,
+                                                      "-application", "voip"]),
+    "mp3": UploadFormat(".mp3", "audio/mpeg", "mp3", ["-c:a", "libmp3lame", "-b:a", UPLOAD_MP3_BITRATE]),
+}
+
+
+def ffmpeg_binary() -> Optional[str]:
+    return FFMPEG_BINARY or shutil.which("ffmpeg")
+
+
+def content_type_for(filepath: str) -> str:
+    """MIME type of an upload file, from its extension."""
+    extension = os.path.splitext(filepath)[1].lower()
+    for upload_format in UPLOAD_FORMATS.values():
+        if upload_format.extension == extension:
+            return upload_format.content_type
+    return "application/octet-stream"
+
+
+def encode_for_upload(wav_path: str, encoding: str = UPLOAD_ENCODING) -> str:
+    """
+    Encodes a stitched WAV for upload with ffmpeg, next to it with the format's extension,
+    and removes the WAV. Returns the path to upload: the encoded file, or the WAV itself
+    for "wav" or if encoding is not possible (no ffmpeg, encoder error).
+    """
+    upload_format = UPLOAD_FORMATS.get(encoding)
+    if upload_format is None:
+        print(f"Warning: Unknown upload encoding '{encoding}', uploading WAV.")
+        return wav_path
+    if upload_format.codec_args is None:
+        return wav_path
+    ffmpeg = ffmpeg_binary()
+    if not ffmpeg:
+        print(f"Warning: ffmpeg not found, uploading WAV instead of {encoding}.")
+        return wav_path
+
+    output_path = os.path.splitext(wav_path)[0] + upload_format.extension
+    partial_path = output_path + ".part"
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin", "-y", "-i", wav_path,
+               *upload_format.codec_args, "-f", upload_format.container, partial_path]
+    try:
+        with metrics.span("encode", encoding=encoding):
+            subprocess.run(command, check=True, capture_output=True, timeout=ENCODE_TIMEOUT_SECONDS)
+        os.replace(partial_path, output_path)
+    except (OSError, subprocess.SubprocessError) as e:
+        detail = e.stderr.decode("utf-8", "replace").strip() if getattr(e, "stderr", None) else e
+        print(f"Warning: Could not encode {wav_path} as {encoding}, uploading WAV: {detail}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return wav_path
+
+    wav_bytes = os.path.getsize(wav_path)
+    encoded_bytes = os.path.getsize(output_path)
+    print(f"Encoded upload as {encoding}: {encoded_bytes / 1024:.0f} KiB ({encoded_bytes / wav_bytes:.0%} of WAV)")
+    os.remove(wav_path)
+    return output_path
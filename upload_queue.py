@@ -0,0 +1,396 @@
+import time
+import json
+import sqlite3
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+# --- Configuration ---
+QUEUE_DB_PATH = "voice_model_queue.sqlite3"
+MAX_UPLOAD_ATTEMPTS = 8           # After this many failed uploads a batch is abandoned (its clips return to pending)
+UPLOAD_RETRY_BASE_SECONDS = 30    # First retry delay; doubles after every failure
+UPLOAD_RETRY_MAX_SECONDS = 1800   # Upper bound for the retry delay
+
+# Clip states
+CLIP_PENDING = "pending"     # Spooled, waiting for a batch
+CLIP_BATCHED = "batched"     # Assigned to a batch that has not been uploaded yet
+CLIP_UPLOADED = "uploaded"   # Part of an uploaded batch
+CLIP_DISCARDED = "discarded" # Dropped by the retention policy without being uploaded
+# Batch states
+BATCH_CREATED = "created"     # Clips assigned, not stitched yet
+BATCH_STITCHED = "stitched"   # Stitched artifact on disk, waiting for (another) upload attempt
+BATCH_UPLOADING = "uploading" # Upload in progress
+BATCH_UPLOADED = "uploaded"
+BATCH_ABANDONED = "abandoned" # Gave up; its clips went back to pending for a later batch
+# Model states
+MODEL_ACTIVE = "active"     # Offered for TTS
+MODEL_RETIRED = "retired"   # Superseded by newer models of the same voice; not offered, deletion pending
+MODEL_DELETED = "deleted"   # Removed from the Fish Audio account
+# Upload results of voice_model2.py that did not create a usable model
+NON_MODEL_IDS = ("upload_disabled", "submitted_no_id")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spool_path TEXT NOT NULL UNIQUE,
+    source_name TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration_ms REAL NOT NULL,
+    speech_ms REAL,
+    speech_segments TEXT,
+    quality_score REAL,
+    snr_db REAL,
+    clipping_ratio REAL,
+    rms_dbfs REAL,
+    passed_over_at REAL,
+    state TEXT NOT NULL,
+    batch_id INTEGER REFERENCES batches(id),
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clips_state ON clips(state);
+CREATE UNIQUE INDEX IF NOT EXISTS clips_source ON clips(source_name, size_bytes, mtime_ns);
+
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL,
+    stitched_path TEXT,
+    duration_ms REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    model_id TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS upload_attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id INTEGER NOT NULL REFERENCES batches(id),
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    success INTEGER,
+    model_id TEXT,
+    error TEXT
+);
+
+CREATE TABLE IF NOT EXISTS models (
+    model_id TEXT PRIMARY KEY,
+    batch_id INTEGER REFERENCES batches(id),
+    title TEXT NOT NULL,
+    voice TEXT NOT NULL,
+    clip_count INTEGER NOT NULL,
+    speech_ms REAL NOT NULL,
+    mean_quality REAL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    retired_at REAL
+);
+CREATE INDEX IF NOT EXISTS models_voice ON models(voice, state);
+"""
+
+
+class UploadQueue:
+    """
+    Durable record of every captured clip, batch, stitched artifact and upload attempt.
+
+    All state lives in one SQLite file, so after a crash or restart voice_model2.py resumes
+    where it stopped: stitched batches are uploaded without re-stitching and uploaded
+    batches are never sent again. Safe to share between threads.
+    """
+
+    def __init__(self, db_path: str = QUEUE_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Clips ---
+    def has_clip(self, source_name: str, size_bytes: int, mtime_ns: int) -> bool:
+        """True if this exact capture (name, size, mtime) was already spooled."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM clips WHERE source_name = ? AND size_bytes = ? AND mtime_ns = ?",
+                (source_name, size_bytes, mtime_ns)).fetchone()
+        return row is not None
+
+    def add_clip(self, spool_path: str, source_name: str, size_bytes: int, mtime_ns: int, duration_ms: float,
+                 speech_ms: Optional[float] = None, speech_segments: Optional[List[Tuple[int, int]]] = None,
+                 quality: Optional[dict] = None) -> int:
+        """
+        Records a spooled clip. speech_ms is what counts toward a batch (the whole file if
+        not given); speech_segments are the frame ranges that get stitched (all of it if None).
+        quality has the clip's quality_score, snr_db, clipping_ratio and rms_dbfs, if scored.
+        """
+        segments_json = json.dumps(speech_segments) if speech_segments is not None else None
+        quality = quality or {}
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO clips (spool_path, source_name, size_bytes, mtime_ns, duration_ms, speech_ms, "
+                "speech_segments, quality_score, snr_db, clipping_ratio, rms_dbfs, state, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (spool_path, source_name, size_bytes, mtime_ns, duration_ms,
+                 duration_ms if speech_ms is None else speech_ms, segments_json,
+                 quality.get("quality_score"), quality.get("snr_db"), quality.get("clipping_ratio"),
+                 quality.get("rms_dbfs"), CLIP_PENDING, time.time()))
+        return cursor.lastrowid
+
+    def discard_clips(self, clip_ids: List[int]) -> List[sqlite3.Row]:
+        """Marks pending clips as discarded and returns their rows (the caller deletes the files)."""
+        with self._lock, self._transaction():
+            rows = [self._conn.execute("SELECT * FROM clips WHERE id = ? AND state = ?",
+                                       (clip_id, CLIP_PENDING)).fetchone() for clip_id in clip_ids]
+            rows = [row for row in rows if row is not None]
+            self._conn.executemany("UPDATE clips SET state = ? WHERE id = ?",
+                                   [(CLIP_DISCARDED, row["id"]) for row in rows])
+        return rows
+
+    def pending_clips(self) -> List[sqlite3.Row]:
+        """Clips waiting for a batch, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM clips WHERE state = ? ORDER BY id", (CLIP_PENDING,)).fetchall()
+
+    def pending_duration_ms(self) -> float:
+        """Speech duration of the clips waiting for a batch."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(speech_ms), 0) FROM clips WHERE state = ?", (CLIP_PENDING,)).fetchone()
+        return row[0]
+
+    @staticmethod
+    def clip_segments(clip: sqlite3.Row) -> Optional[List[Tuple[int, int]]]:
+        """The frame ranges of a clip row to stitch, or None for the whole file."""
+        return [tuple(segment) for segment in json.loads(clip["speech_segments"])] if clip["speech_segments"] else None
+
+    def batch_clips(self, batch_id: int) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM clips WHERE batch_id = ? ORDER BY id", (batch_id,)).fetchall()
+
+    # --- Batches ---
+    def create_batch(self, title: str, clip_ids: List[int], passed_over_ids: Sequence[int] = ()) -> int:
+        """
+        Creates a batch and assigns the given pending clips to it in one transaction.
+        passed_over_ids are pending clips that were considered for it but left out; the
+        first time a clip is passed over is recorded (see passed_over_at).
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            cursor = self._conn.execute(
+                "INSERT INTO batches (title, state, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (title, BATCH_CREATED, now, now))
+            batch_id = cursor.lastrowid
+            self._conn.executemany(
+                "UPDATE clips SET state = ?, batch_id = ?, passed_over_at = NULL WHERE id = ? AND state = ?",
+                [(CLIP_BATCHED, batch_id, clip_id, CLIP_PENDING) for clip_id in clip_ids])
+            self._conn.executemany(
+                "UPDATE clips SET passed_over_at = ? WHERE id = ? AND state = ? AND passed_over_at IS NULL",
+                [(now, clip_id, CLIP_PENDING) for clip_id in passed_over_ids])
+        return batch_id
+
+    def get_batch(self, batch_id: int) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+
+    def get_due_batch(self, batch_id: int, now: Optional[float] = None) -> Optional[sqlite3.Row]:
+        """The batch's current row if it still needs stitching or uploading and is due, else None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM batches WHERE id = ? AND state IN (?, ?) AND next_attempt_at <= ?",
+                (batch_id, BATCH_CREATED, BATCH_STITCHED, now)).fetchone()
+
+    def mark_stitched(self, batch_id: int, stitched_path: str, duration_ms: float) -> bool:
+        """Records the stitched artifact. False if the batch was no longer waiting for stitching or upload."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE batches SET state = ?, stitched_path = ?, duration_ms = ?, updated_at = ? "
+                "WHERE id = ? AND state IN (?, ?)",
+                (BATCH_STITCHED, stitched_path, duration_ms, time.time(), batch_id, BATCH_CREATED, BATCH_STITCHED))
+        return cursor.rowcount == 1
+
+    def due_batches(self, now: Optional[float] = None) -> List[sqlite3.Row]:
+        """Batches that still need stitching or uploading and whose retry delay has passed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM batches WHERE state IN (?, ?) AND next_attempt_at <= ? ORDER BY id",
+                (BATCH_CREATED, BATCH_STITCHED, now)).fetchall()
+
+    def open_batches(self) -> List[sqlite3.Row]:
+        """Batches that are not finished (uploaded or abandoned), regardless of retry delay."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM batches WHERE state IN (?, ?, ?) ORDER BY id",
+                (BATCH_CREATED, BATCH_STITCHED, BATCH_UPLOADING)).fetchall()
+
+    def recover_interrupted(self) -> int:
+        """
+        Puts batches that were mid-upload when the process died back in line for upload, and
+        returns clips still held by abandoned batches (from older versions) to pending.
+        Returns the number of batches recovered.
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE upload_attempts SET finished_at = ?, success = 0, error = 'interrupted' "
+                "WHERE finished_at IS NULL", (now,))
+            cursor = self._conn.execute(
+                "UPDATE batches SET state = CASE WHEN stitched_path IS NULL THEN ? ELSE ? END, updated_at = ? "
+                "WHERE state = ?", (BATCH_CREATED, BATCH_STITCHED, now, BATCH_UPLOADING))
+            for batch in self._conn.execute("SELECT id FROM batches WHERE state = ?", (BATCH_ABANDONED,)).fetchall():
+                self._release_clips(batch["id"])
+        return cursor.rowcount
+
+    # --- Upload Attempts ---
+    def start_attempt(self, batch_id: int) -> Optional[int]:
+        """
+        Moves a stitched batch to uploading and records the attempt. Returns None (and records
+        nothing) if the batch is not stitched, e.g. because it was uploaded in the meantime.
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            cursor = self._conn.execute("UPDATE batches SET state = ?, updated_at = ? WHERE id = ? AND state = ?",
+                                        (BATCH_UPLOADING, now, batch_id, BATCH_STITCHED))
+            if cursor.rowcount != 1:
+                return None
+            cursor = self._conn.execute(
+                "INSERT INTO upload_attempts (batch_id, started_at) VALUES (?, ?)", (batch_id, now))
+        return cursor.lastrowid
+
+    def finish_attempt(self, attempt_id: int, batch_id: int, model_id: Optional[str] = None,
+                       error: Optional[str] = None):
+        """
+        Records the result of an upload attempt. On success the batch and its clips are
+        marked uploaded; on failure the next attempt is scheduled with exponential backoff.
+        """
+        now = time.time()
+        success = model_id is not None
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE upload_attempts SET finished_at = ?, success = ?, model_id = ?, error = ? WHERE id = ?",
+                (now, int(success), model_id, error, attempt_id))
+            if success:
+                cursor = self._conn.execute(
+                    "UPDATE batches SET state = ?, model_id = ?, last_error = NULL, updated_at = ? "
+                    "WHERE id = ? AND state = ?", (BATCH_UPLOADED, model_id, now, batch_id, BATCH_UPLOADING))
+                if cursor.rowcount == 1:
+                    self._conn.execute("UPDATE clips SET state = ? WHERE batch_id = ?", (CLIP_UPLOADED, batch_id))
+                return
+
+            if self._conn.execute("SELECT 1 FROM batches WHERE id = ? AND state = ?",
+                                  (batch_id, BATCH_UPLOADING)).fetchone():
+                self._schedule_retry(batch_id, error, retry_state=BATCH_STITCHED, now=now)
+
+    def fail_stitching(self, batch_id: int, error: str) -> bool:
+        """
+        Stitching failures are retried (from the clips) with the same backoff as upload failures.
+        Returns False, changing nothing, if the batch was no longer waiting for stitching.
+        """
+        with self._lock, self._transaction():
+            cursor = self._conn.execute("UPDATE batches SET stitched_path = NULL WHERE id = ? AND state IN (?, ?)",
+                                        (batch_id, BATCH_CREATED, BATCH_STITCHED))
+            if cursor.rowcount != 1:
+                return False
+            self._schedule_retry(batch_id, f"stitching failed: {error}", retry_state=BATCH_CREATED, now=time.time())
+        return True
+
+    # --- Created Models ---
+    def record_model(self, batch_id: int, model_id: str, voice: str, created_at: Optional[float] = None):
+        """Records the model created from an uploaded batch, with the clip stats of that batch."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO models (model_id, batch_id, title, voice, clip_count, speech_ms, mean_quality, "
+                "state, created_at) "
+                "SELECT ?, b.id, b.title, ?, COUNT(c.id), COALESCE(SUM(c.speech_ms), 0), AVG(c.quality_score), ?, ? "
+                "FROM batches b LEFT JOIN clips c ON c.batch_id = b.id WHERE b.id = ? GROUP BY b.id",
+                (model_id, voice, MODEL_ACTIVE, time.time() if created_at is None else created_at, batch_id))
+
+    def backfill_models(self, voice: str) -> int:
+        """
+        Records the models of batches uploaded before models were tracked, dated by their
+        upload. Returns the number of models added.
+        """
+        with self._lock:
+            batches = self._conn.execute(
+                "SELECT id, model_id, updated_at FROM batches WHERE state = ? AND model_id IS NOT NULL "
+                f"AND model_id NOT IN ({', '.join('?' * len(NON_MODEL_IDS))}) "
+                "AND model_id NOT IN (SELECT model_id FROM models) ORDER BY id",
+                (BATCH_UPLOADED, *NON_MODEL_IDS)).fetchall()
+            for batch in batches:
+                self.record_model(batch["id"], batch["model_id"], voice, created_at=batch["updated_at"])
+        return len(batches)
+
+    def models(self, state: Optional[str] = None) -> List[sqlite3.Row]:
+        """Recorded models (all, or those in one state), newest first."""
+        with self._lock:
+            if state is None:
+                return self._conn.execute("SELECT * FROM models ORDER BY created_at DESC").fetchall()
+            return self._conn.execute(
+                "SELECT * FROM models WHERE state = ? ORDER BY created_at DESC", (state,)).fetchall()
+
+    def retire_models(self, model_ids: List[str]):
+        now = time.time()
+        with self._lock, self._transaction():
+            self._conn.executemany("UPDATE models SET state = ?, retired_at = ? WHERE model_id = ? AND state = ?",
+                                   [(MODEL_RETIRED, now, model_id, MODEL_ACTIVE) for model_id in model_ids])
+
+    def mark_model_deleted(self, model_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE models SET state = ? WHERE model_id = ?", (MODEL_DELETED, model_id))
+
+    # --- Internal Helpers ---
+    def _migrate(self):
+        """Adds columns introduced after a queue database was created."""
+        with self._lock:
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(clips)")}
+            if "speech_ms" not in columns:
+                self._conn.execute("ALTER TABLE clips ADD COLUMN speech_ms REAL")
+                self._conn.execute("UPDATE clips SET speech_ms = duration_ms") # Untrimmed clips: all of it counts
+            for name, sql_type in (("speech_segments", "TEXT"), ("quality_score", "REAL"), ("snr_db", "REAL"),
+                                   ("clipping_ratio", "REAL"), ("rms_dbfs", "REAL"), ("passed_over_at", "REAL")):
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE clips ADD COLUMN {name} {sql_type}")
+
+    def _schedule_retry(self, batch_id: int, error: Optional[str], retry_state: str, now: float):
+        """Must be called inside a transaction."""
+        attempts = self._conn.execute("SELECT attempts FROM batches WHERE id = ?", (batch_id,)).fetchone()[0] + 1
+        delay = min(UPLOAD_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), UPLOAD_RETRY_MAX_SECONDS)
+        state = BATCH_ABANDONED if attempts >= MAX_UPLOAD_ATTEMPTS else retry_state
+        self._conn.execute(
+            "UPDATE batches SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+            "WHERE id = ?", (state, attempts, now + delay, error, now, batch_id))
+        if state == BATCH_ABANDONED:
+            self._release_clips(batch_id)
+
+    def _release_clips(self, batch_id: int):
+        """Must be called inside a transaction. Returns the batch's clips to pending."""
+        self._conn.execute("UPDATE clips SET state = ?, batch_id = NULL WHERE state = ? AND batch_id = ?",
+                           (CLIP_PENDING, CLIP_BATCHED, batch_id))
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+
+class _Transaction:
+    """BEGIN/COMMIT around a block (the connection runs in autocommit mode otherwise)."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,120 @@
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from audio_engine import WavInfo, probe_wav, iter_wav_chunks, to_mono
+
+# --- Configuration ---
+VAD_FRAME_MS = 20               # Analysis frame length; speech/silence is decided per frame
+VAD_NOISE_PERCENTILE = 10       # The quietest 10% of frames estimate the clip's noise floor
+VAD_MARGIN_DB = 10              # Frames this far above the noise floor count as speech...
+VAD_SPEECH_RANGE_DB = 30        # ...or this far below the loudest frame, if lower (clips that are all speech)...
+VAD_MIN_THRESHOLD_DB = -50      # ...but never quieter than this (dBFS), so hiss and dead air are not speech
+VAD_MIN_SPEECH_MS = 60          # Louder runs shorter than this are clicks or pops, not speech
+VAD_PAD_MS = 100                # Silence kept before the first and after the last speech
+VAD_MAX_PAUSE_MS = 300          # Internal silences longer than this are shortened to this
+
+VoiceActivity = namedtuple("VoiceActivity", [
+    "file_ms",    # duration of the whole file
+    "speech_ms",  # duration of the kept segments
+    "segments",   # [start, end) frame ranges of the file to keep, in order
+])
+
+
+def trim_ratio(activity: VoiceActivity) -> float:
+    """Fraction of the file that trimming removes (0.0 keeps everything)."""
+    return 1.0 - activity.speech_ms / activity.file_ms if activity.file_ms > 0 else 0.0
+
+
+class FrameEnergies:
+    """Mean square per frame of a mono signal that arrives in chunks of any length."""
+
+    def __init__(self, sample_rate: int, frame_ms: int = VAD_FRAME_MS):
+        self.frame_len = max(1, sample_rate * frame_ms // 1000)
+        self._energies = []
+        self._carry = np.zeros(0, dtype=np.float32)
+
+    def add(self, mono: np.ndarray):
+        mono = np.concatenate((self._carry, mono))
+        whole = len(mono) // self.frame_len * self.frame_len
+        frames = mono[:whole].reshape(-1, self.frame_len)
+        self._energies.append(np.einsum("ij,ij->i", frames, frames) / self.frame_len)
+        self._carry = mono[whole:]
+
+    def finish(self) -> np.ndarray:
+        """All frame energies; a trailing partial frame counts as a (shorter) frame."""
+        if len(self._carry):
+            self._energies.append(np.array([np.dot(self._carry, self._carry) / len(self._carry)], dtype=np.float32))
+            self._carry = self._carry[:0]
+        return np.concatenate(self._energies) if self._energies else np.zeros(0, dtype=np.float32)
+
+
+def frame_energies(filepath: str, info: Optional[WavInfo] = None, frame_ms: int = VAD_FRAME_MS) -> Tuple[np.ndarray, int]:
+    """
+    Mean square of the mono mix per frame_ms frame (the last frame may be shorter), read
+    chunk by chunk. Returns (energies, frame length in samples).
+    """
+    info = info or probe_wav(filepath)
+    energies = FrameEnergies(info.sample_rate, frame_ms)
+    for chunk in iter_wav_chunks(filepath, info):
+        energies.add(to_mono(chunk))
+    return energies.finish(), energies.frame_len
+
+
+def noise_floor_db(level_db: np.ndarray) -> float:
+    """Estimated background level of a clip from its per-frame levels (dB)."""
+    return float(np.percentile(level_db, VAD_NOISE_PERCENTILE))
+
+
+def level_db(energies: np.ndarray) -> np.ndarray:
+    return 10.0 * np.log10(energies.astype(np.float64) + 1e-12)
+
+
+def speech_frames(energies: np.ndarray, frame_ms: int = VAD_FRAME_MS) -> List[Tuple[int, int]]:
+    """
+    [start, end) frame ranges to keep: speech runs, with VAD_PAD_MS of silence around the
+    whole clip and internal pauses longer than VAD_MAX_PAUSE_MS cut down to that length.
+    """
+    if len(energies) == 0:
+        return []
+    levels = level_db(energies)
+    threshold = max(min(noise_floor_db(levels) + VAD_MARGIN_DB, levels.max() - VAD_SPEECH_RANGE_DB), VAD_MIN_THRESHOLD_DB)
+    starts, ends = _runs(levels > threshold)
+
+    long_enough = ends - starts >= max(1, VAD_MIN_SPEECH_MS // frame_ms)
+    starts, ends = starts[long_enough], ends[long_enough]
+    if len(starts) == 0:
+        return []
+
+    # Runs separated by a short pause become one segment; longer pauses keep
+    # half of VAD_MAX_PAUSE_MS on each side
+    max_pause = VAD_MAX_PAUSE_MS // frame_ms
+    split = starts[1:] - ends[:-1] > max_pause
+    seg_starts = starts[np.concatenate(([True], split))]
+    seg_ends = ends[np.concatenate((split, [True]))]
+    seg_starts[1:] -= max_pause - max_pause // 2
+    seg_ends[:-1] += max_pause // 2
+    pad = VAD_PAD_MS // frame_ms
+    seg_starts[0] = max(seg_starts[0] - pad, 0)
+    seg_ends[-1] = min(seg_ends[-1] + pad, len(energies))
+    return list(zip(seg_starts.tolist(), seg_ends.tolist()))
+
+
+def detect_speech(filepath: str, info: Optional[WavInfo] = None) -> VoiceActivity:
+    """Finds the parts of a WAV file worth keeping (see speech_frames), as sample frame ranges."""
+    info = info or probe_wav(filepath)
+    energies, frame_len = frame_energies(filepath, info)
+    return activity_from_energies(energies, frame_len, info)
+
+
+def activity_from_energies(energies: np.ndarray, frame_len: int, info: WavInfo) -> VoiceActivity:
+    segments = [(start * frame_len, min(end * frame_len, info.frames)) for start, end in speech_frames(energies)]
+    speech_frames_total = sum(end - start for start, end in segments)
+    return VoiceActivity(info.duration_ms, speech_frames_total * 1000.0 / info.sample_rate, segments)
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """[start, end) indices of the runs of True in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
@@ -3,82 +3,94 @@ import os
 import time
 import datetime
 from dotenv import load_dotenv
-from pydub import AudioSegment
 import pathlib
 import shutil # Standard library for folder operations
 
+from model_registry import mark_stale
+from folder_watcher import FolderWatcher
+from audio_engine import probe_wav
+from wav_io import stitch_wavs
+from voice_activity import trim_ratio
+from clip_quality import analyze_clip, select_for_batch
+from upload_encoding import UPLOAD_ENCODING, encode_for_upload, content_type_for
+from upload_queue import UploadQueue, QUEUE_DB_PATH, BATCH_ABANDONED, NON_MODEL_IDS
+from model_retention import VOICE_NAME, KEEP_MODELS_PER_VOICE, apply_retention
+from batch_uploader import BatchUploader, MAX_PARALLEL_UPLOADS, MAX_QUEUED_UPLOADS
+from http_clients import FISH_AUDIO_BASE_URL, MultipartFileBody, get_requests_session, request_timeout
+import metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
 # --- Configuration ---
-API_BASE_URL = "https://api.fish.audio"
+API_BASE_URL = FISH_AUDIO_BASE_URL # Override with the FISH_AUDIO_BASE_URL environment variable
 API_ENDPOINT = f"{API_BASE_URL}/model"
 API_TOKEN = os.getenv("FISH_AUDIO_API_KEY")
 
 # --- Script Specific Configuration ---
 MONITOR_FOLDER = "../Dissonance_Diagnostics"  # Folder to watch for new WAV files
-TEMP_FOLDER = "temp_stitch_processing" # Temporary folder for stitched files
+TEMP_FOLDER = "temp_stitch_processing" # Stitched batch files, kept until their upload succeeds
+SPOOL_FOLDER = "captured_clips"         # Captured clips are moved here and kept until their batch is uploaded
 # Optional: Move processed files here instead of just tracking them
 # PROCESSED_ARCHIVE_FOLDER = "processed_audio_archive"
 TARGET_TOTAL_DURATION_SECONDS = 50  # Threshold to trigger stitching (in seconds)
 POLLING_INTERVAL_SECONDS = 5        # How often to check the folder (in seconds)
 TARGET_SAMPLE_RATE = 16000          # Target sample rate in Hz for the API
 TARGET_CHANNELS = 1                  # Target channels (1 for mono) for the API
+TRIM_SILENCE = True                 # Cut dead air from clips (see voice_activity.py); only speech counts toward the threshold
+CANDIDATE_POOL_SECONDS = 75         # Speech collected before a batch is built, so the best TARGET_TOTAL_DURATION_SECONDS can be picked
+MIN_CLIP_QUALITY = 0.1              # Clips scoring below this (see clip_quality.py) are removed on arrival
+PENDING_CLIP_MAX_AGE_HOURS = 24     # Clips left out of batches for this long (since first left out) are discarded
 
 # --- FALSE FOR TESTING, SET TO TRUE ---
 ENABLE_API_UPLOAD = True # Set to False to disable API calls for testing
 
-# --- Global State ---
-# Dictionary to store {filepath: duration_ms} for files found but not yet processed
-tracked_files = {}
-# Set to store filepaths that have been successfully processed and uploaded in a batch
-processed_files = set()
+# --- State ---
+# Clips, batches, stitched files and upload attempts are recorded in the SQLite
+# upload queue (QUEUE_DB_PATH), so nothing captured is lost on a crash or restart.
 
 # --- Helper Function to Get Audio Duration ---
 def get_audio_duration_ms(filepath):
-    """Loads a WAV file and returns its duration in milliseconds."""
+    """Reads a WAV file's headers (no decoding) and returns its duration in milliseconds."""
     try:
-        audio = AudioSegment.from_file(filepath, format="wav")
-        return len(audio)
+        with metrics.span("probe"):
+            return probe_wav(filepath).duration_ms
     except Exception as e:
         print(f"Error getting duration for {filepath}: {e}")
         return None # Indicate error
 
-# --- Helper Function to Process and Export Stitched Audio ---
-def process_and_export_stitched(audio_segment, output_filepath):
+# --- Helper Function to Stitch, Process and Export Audio ---
+def process_and_export_stitched(batch_files, output_filepath, batch_segments=None):
     """
-    Ensures the stitched audio segment is mono 16kHz and exports it.
-    Returns the output path or None if an error occurs.
+    Stitches the batch into a single mono 16kHz WAV, converting each input file chunk by chunk
+    while writing, so only one input chunk is held in memory at a time. batch_segments
+    (one entry per file, None for the whole file) limits each file to its speech.
+    The WAV is then encoded as UPLOAD_ENCODING (see upload_encoding.py).
+    Returns (path of the file to upload, duration in ms), or (None, 0) if an error occurs.
     """
     try:
-        processed_audio = audio_segment
-        processed = False
-
-        # Convert to target sample rate and channels if needed
-        if processed_audio.frame_rate != TARGET_SAMPLE_RATE or processed_audio.channels != TARGET_CHANNELS:
-            print(f"Converting stitched audio to {TARGET_CHANNELS} channel(s) at {TARGET_SAMPLE_RATE} Hz.")
-            processed_audio = processed_audio.set_frame_rate(TARGET_SAMPLE_RATE).set_channels(TARGET_CHANNELS)
-            processed = True
-        else:
-             print("Stitched audio already meets target format (16kHz mono).")
-
-
-        # Export the processed audio
-        print(f"Exporting stitched WAV to: {output_filepath}")
+        print(f"Stitching {len(batch_files)} files to {TARGET_CHANNELS} channel(s) at {TARGET_SAMPLE_RATE} Hz: {output_filepath}")
         # Ensure the temporary output directory exists
         os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
-        processed_audio.export(output_filepath, format="wav")
+        with metrics.span("stitch"):
+            duration_ms, skipped = stitch_wavs(batch_files, output_filepath, TARGET_SAMPLE_RATE, TARGET_CHANNELS,
+                                               segments=batch_segments)
 
-        if os.path.exists(output_filepath):
-            print(f"Successfully exported stitched audio to {output_filepath}")
-            return output_filepath
-        else:
-            print(f"Error: Export command seemed to succeed but output file {output_filepath} was not found.")
-            return None
+        if skipped:
+            print(f"Warning: {len(skipped)} file(s) could not be read and were left out of the batch.")
+        if duration_ms <= 0:
+            print("Error: No audio could be stitched from this batch.")
+            os.remove(output_filepath)
+            return None, 0
+
+        print(f"Successfully exported stitched audio to {output_filepath}. Duration: {duration_ms/1000.0:.2f}s")
+        return encode_for_upload(output_filepath, UPLOAD_ENCODING), duration_ms
 
     except Exception as e:
         print(f"Error processing/exporting stitched audio: {e}")
-        return None
+        if os.path.exists(output_filepath):
+            os.remove(output_filepath)
+        return None, 0
 
 # --- Helper Function to Upload to Fish Audio API ---
 def upload_to_fish_audio(api_token, audio_filepath, model_title):
@@ -94,25 +106,25 @@ def upload_to_fish_audio(api_token, audio_filepath, model_title):
         print("Error: API Token is missing.")
         return None
 
-    headers = {"Authorization": f"Bearer {api_token}"}
     response = None # Initialize for error reporting
 
     try:
-        with open(audio_filepath, "rb") as audio_file:
-            # Use the generated model title or a generic name for the file part
-            files = {
-                "voices": (f"{model_title}.wav", audio_file, 'audio/wav')
-            }
-            data = {
-                "visibility": "private",
-                "type": "tts",
-                "title": model_title,
-                "train_mode": "fast",
-                "enhance_audio_quality": "true" # Adjust as needed
-            }
-
-            print(f"Uploading {os.path.basename(audio_filepath)} to create model '{model_title}'...")
-            response = requests.post(API_ENDPOINT, headers=headers, files=files, data=data)
+        data = {
+            "visibility": "private",
+            "type": "tts",
+            "title": model_title,
+            "train_mode": "fast",
+            "enhance_audio_quality": "true" # Adjust as needed
+        }
+        # Use the generated model title for the file part; the body is read from disk as it is sent
+        extension = os.path.splitext(audio_filepath)[1]
+        with MultipartFileBody(data, "voices", audio_filepath, f"{model_title}{extension}",
+                               content_type_for(audio_filepath)) as body:
+            headers = {"Authorization": f"Bearer {api_token}", "Content-Type": body.content_type}
+            print(f"Uploading {os.path.basename(audio_filepath)} ({len(body) / 1024:.0f} KiB) to create model '{model_title}'...")
+            response = get_requests_session().post(API_ENDPOINT, headers=headers, data=body,
+                                                    timeout=request_timeout())
+            metrics.incr("upload_bytes", len(body))
             response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
 
         response_json = response.json()
@@ -142,6 +154,200 @@ def upload_to_fish_audio(api_token, audio_filepath, model_title):
         return None # Indicate other error
 
 
+# --- Helper Function to Spool a Captured Clip ---
+def ingest_clip(upload_queue, filepath):
+    """
+    Moves a completed capture into SPOOL_FOLDER and records it in the upload queue.
+    Unreadable files are deleted, as before. Returns True if the clip was spooled.
+    """
+    filename = os.path.basename(filepath)
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return False # Already gone
+
+    if upload_queue.has_clip(filename, st.st_size, st.st_mtime_ns):
+        print(f"Already spooled: {filename}. Removing duplicate.")
+        _remove_quietly(filepath)
+        return False
+
+    print(f"Found new file: {filename}")
+    duration_ms = get_audio_duration_ms(filepath)
+    if duration_ms is None:
+        print(f"Could not get duration for {filename}. Removing it.")
+        _remove_quietly(filepath)
+        return False
+
+    speech_ms, segments, quality = duration_ms, None, None
+    try:
+        with metrics.span("analyze"):
+            activity, quality = analyze_clip(filepath)
+    except Exception as e:
+        print(f"Warning: Could not analyze {filename}, keeping all of it unscored: {e}")
+    else:
+        if activity.speech_ms <= 0:
+            print(f"No speech in {filename}. Removing it.")
+            metrics.incr("clips_silent")
+            _remove_quietly(filepath)
+            return False
+        print(f"  Quality {quality.score:.2f} (SNR {quality.snr_db:.1f} dB, level {quality.rms_dbfs:.1f} dBFS, "
+              f"clipping {quality.clipping_ratio:.2%})")
+        if quality.score < MIN_CLIP_QUALITY:
+            print(f"Quality of {filename} is below {MIN_CLIP_QUALITY}. Removing it.")
+            metrics.incr("clips_rejected_quality")
+            _remove_quietly(filepath)
+            return False
+        if TRIM_SILENCE:
+            speech_ms, segments = activity.speech_ms, activity.segments
+            print(f"  {duration_ms/1000.0:.2f}s -> {speech_ms/1000.0:.2f}s of speech ({trim_ratio(activity):.0%} trimmed)")
+            metrics.incr("clip_file_seconds", duration_ms / 1000.0)
+            metrics.incr("clip_speech_seconds", speech_ms / 1000.0)
+
+    spool_path = os.path.join(SPOOL_FOLDER, f"{st.st_mtime_ns}_{filename}")
+    try:
+        shutil.move(filepath, spool_path)
+    except OSError as e:
+        print(f"Warning: Could not move {filename} into the spool folder: {e}")
+        return False
+    upload_queue.add_clip(spool_path, filename, st.st_size, st.st_mtime_ns, duration_ms, speech_ms, segments,
+                          {"quality_score": quality.score, "snr_db": quality.snr_db,
+                           "clipping_ratio": quality.clipping_ratio, "rms_dbfs": quality.rms_dbfs} if quality else None)
+    metrics.incr("clips_ingested")
+    return True
+
+# --- Helpers to Build Batches and Apply Retention ---
+def build_batch(upload_queue, pending_clips):
+    """
+    Creates a batch from the highest-scoring pending clips, up to TARGET_TOTAL_DURATION_SECONDS
+    of speech. The rest stay pending for later batches. Returns the batch id.
+    """
+    selected_ids = select_for_batch(pending_clips, TARGET_TOTAL_DURATION_SECONDS * 1000.0)
+    selected = set(selected_ids)
+    scores = [clip["quality_score"] for clip in pending_clips if clip["id"] in selected and clip["quality_score"] is not None]
+    speech_sec = sum(clip["speech_ms"] for clip in pending_clips if clip["id"] in selected) / 1000.0
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    model_title = f"Batch_{timestamp}" # Generate a unique model title
+    passed_over = [clip["id"] for clip in pending_clips if clip["id"] not in selected]
+    batch_id = upload_queue.create_batch(model_title, selected_ids, passed_over)
+    print(f"Batch {model_title}: {len(selected_ids)} best clip(s), {speech_sec:.2f}s of speech"
+          + (f", mean quality {sum(scores) / len(scores):.2f}" if scores else "")
+          + f". {len(pending_clips) - len(selected_ids)} clip(s) kept for later batches.")
+    return batch_id
+
+def expire_pending_clips(upload_queue, now=None):
+    """
+    Discards (and deletes) pending clips that build_batch first left out of a batch at least
+    PENDING_CLIP_MAX_AGE_HOURS ago. Clips waiting for the pool to fill are never discarded,
+    however old they are.
+    """
+    cutoff = (time.time() if now is None else now) - PENDING_CLIP_MAX_AGE_HOURS * 3600
+    expired = [clip["id"] for clip in upload_queue.pending_clips()
+               if clip["passed_over_at"] is not None and clip["passed_over_at"] < cutoff]
+    if not expired:
+        return 0
+    discarded = upload_queue.discard_clips(expired)
+    for clip in discarded:
+        _remove_quietly(clip["spool_path"])
+    metrics.incr("clips_discarded_expired", len(discarded))
+    print(f"Discarded {len(discarded)} clip(s) not picked for a batch within {PENDING_CLIP_MAX_AGE_HOURS}h.")
+    return len(discarded)
+
+# --- Helper Function to Stitch and Upload One Batch ---
+def process_batch(upload_queue, batch):
+    """
+    Stitches (unless a stitched file from an earlier attempt exists) and uploads a queued batch,
+    recording the outcome. Failed batches are retried later with backoff by the queue.
+    Returns True on success, False on failure, and None if the batch was no longer due
+    (the row handed in was a stale snapshot, e.g. of a batch uploaded in the meantime).
+    """
+    batch_id = batch["id"]
+    model_title = batch["title"]
+    batch = upload_queue.get_due_batch(batch_id)
+    if batch is None:
+        print(f"\nBatch {model_title} is no longer due for upload. Skipping it.")
+        return None
+    stitched_path = batch["stitched_path"]
+    print(f"\nProcessing batch {model_title} (attempt {batch['attempts'] + 1})...")
+
+    # --- 3./4. Stitch, Process and Export Audio (streamed, one file at a time) ---
+    if not stitched_path or not os.path.exists(stitched_path):
+        clips = upload_queue.batch_clips(batch_id)
+        stitched_path, duration_ms = process_and_export_stitched(
+            [clip["spool_path"] for clip in clips], os.path.join(TEMP_FOLDER, f"stitched_{model_title}.wav"),
+            [upload_queue.clip_segments(clip) for clip in clips])
+        if not stitched_path:
+            print("Skipping API upload due to stitching or processing failure.")
+            if not upload_queue.fail_stitching(batch_id, "no audio could be stitched"):
+                return None
+            metrics.incr("stitch_failures")
+            return False
+        if not upload_queue.mark_stitched(batch_id, stitched_path, duration_ms):
+            print(f"Batch {model_title} was handled elsewhere while stitching. Discarding {stitched_path}.")
+            _remove_quietly(stitched_path)
+            return None
+    else:
+        print(f"Reusing stitched file from an earlier attempt: {stitched_path}")
+
+    # --- 5. Upload to Fish Audio API ---
+    attempt_id = upload_queue.start_attempt(batch_id)
+    if attempt_id is None:
+        print(f"Batch {model_title} is no longer waiting for upload. Skipping it.")
+        return None
+    if batch["attempts"] > 0:
+        metrics.incr("upload_retries")
+    try:
+        with metrics.span("upload"):
+            model_id = upload_to_fish_audio(API_TOKEN, stitched_path, model_title)
+    except Exception as e:
+        print(f"An unexpected error occurred during API upload for '{model_title}': {e}")
+        model_id = None
+
+    # --- 6. Update State and Cleanup ---
+    if model_id == "upload_disabled":
+        upload_queue.finish_attempt(attempt_id, batch_id, model_id=model_id)
+        print(f"--- API UPLOAD DISABLED --- Stitched file kept for inspection:")
+        print(f"    {stitched_path}")
+        return True
+
+    if not model_id:
+        upload_queue.finish_attempt(attempt_id, batch_id, error="upload failed")
+        metrics.incr("upload_failures")
+        retry = upload_queue.get_batch(batch_id)
+        if retry["state"] == BATCH_ABANDONED:
+            print(f"API upload failed for batch {model_title}. Giving up after {retry['attempts']} attempts; "
+                  "its clips are back in the pending pool for a later batch.")
+            _remove_quietly(stitched_path)
+        else:
+            retry_at = datetime.datetime.fromtimestamp(retry["next_attempt_at"]).strftime("%H:%M:%S")
+            print(f"API upload failed for batch {model_title}. Retrying at {retry_at}.")
+        return False
+
+    # Includes "submitted_no_id" as success for processing
+    upload_queue.finish_attempt(attempt_id, batch_id, model_id=model_id)
+    metrics.incr("uploads")
+    if model_id not in NON_MODEL_IDS:
+        upload_queue.record_model(batch_id, model_id, VOICE_NAME)
+        apply_retention(upload_queue, API_TOKEN)
+    # Let ingame_llm_tts.py pick up the new model (and drop retired ones) on its next lookup
+    mark_stale()
+
+    clips = upload_queue.batch_clips(batch_id)
+    print(f"Successfully processed batch. Cleaning up {len(clips)} spooled clip(s).")
+    for clip in clips:
+        _remove_quietly(clip["spool_path"])
+    _remove_quietly(stitched_path)
+    print(f"Cleaned up temporary file: {stitched_path}")
+    return True
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Warning: Could not remove {path}: {e}")
+
+
 # --- Main Monitoring and Processing Loop ---
 if __name__ == "__main__":
     print("--- Starting Audio Monitor and Batch Processor ---")
@@ -159,173 +365,96 @@ if __name__ == "__main__":
             print(f"Error: Could not create monitor folder '{MONITOR_FOLDER}': {e}")
             exit(1)
 
-    # Optional: Ensure archive folder exists if using move functionality
-    # if PROCESSED_ARCHIVE_FOLDER and not os.path.isdir(PROCESSED_ARCHIVE_FOLDER):
-    #     try:
-    #         os.makedirs(PROCESSED_ARCHIVE_FOLDER)
-    #     except OSError as e:
-    #         print(f"Warning: Could not create archive folder '{PROCESSED_ARCHIVE_FOLDER}': {e}")
-            # Decide if this is critical or just a warning
-
-    # --- Cleanup Temporary Folder on Start ---
-    if os.path.exists(TEMP_FOLDER):
-         try:
-             shutil.rmtree(TEMP_FOLDER)
-             print(f"Cleared existing temp folder: {TEMP_FOLDER}")
-         except OSError as e:
-             print(f"Warning: Could not clear temp folder {TEMP_FOLDER}: {e}. Check permissions.")
     try:
         os.makedirs(TEMP_FOLDER, exist_ok=True)
+        os.makedirs(SPOOL_FOLDER, exist_ok=True)
     except OSError as e:
-        print(f"Error creating temp folder {TEMP_FOLDER}: {e}")
+        print(f"Error creating working folders {TEMP_FOLDER} / {SPOOL_FOLDER}: {e}")
         exit(1)
 
+    # --- Resume From the Upload Queue ---
+    upload_queue = UploadQueue(QUEUE_DB_PATH)
+    recovered = upload_queue.recover_interrupted()
+    open_batches = upload_queue.open_batches()
+    print(f"Upload queue: {len(upload_queue.pending_clips())} pending clip(s), "
+          f"{len(open_batches)} unfinished batch(es) ({recovered} interrupted mid-upload).")
+
+    # Models uploaded before they were tracked count toward retention too
+    backfilled = upload_queue.backfill_models(VOICE_NAME)
+    if backfilled:
+        print(f"Recorded {backfilled} previously uploaded model(s) for voice '{VOICE_NAME}'.")
+    if KEEP_MODELS_PER_VOICE > 0:
+        apply_retention(upload_queue, API_TOKEN)
+        mark_stale()
+
+    # Remove stitched files that no unfinished batch refers to (e.g. from a crash mid-stitch)
+    referenced = {os.path.abspath(b["stitched_path"]) for b in open_batches if b["stitched_path"]}
+    for filename in os.listdir(TEMP_FOLDER):
+        path = os.path.join(TEMP_FOLDER, filename)
+        if os.path.isfile(path) and os.path.abspath(path) not in referenced:
+            _remove_quietly(path)
+
+    # Delivers each WAV once the game has finished writing it
+    watcher = FolderWatcher(MONITOR_FOLDER, suffixes=(".wav",))
+
+    # Stitching and uploads run on background workers; the loop below keeps ingesting meanwhile
+    def upload_batch(batch):
+        try:
+            return process_batch(upload_queue, batch)
+        finally:
+            print("--------------------------------------------------") # Separator after processing a batch
+
+    uploader = BatchUploader(upload_batch, max_parallel=MAX_PARALLEL_UPLOADS, max_queued=MAX_QUEUED_UPLOADS)
+
+    # Stage timings and counters, exported periodically (see metrics.py)
+    metrics.configure(service="voice_model2")
+    metrics.start_exporter()
 
-    print(f"Monitoring folder: '{MONITOR_FOLDER}'")
-    print(f"Duration threshold: {TARGET_TOTAL_DURATION_SECONDS} seconds")
+    print(f"Monitoring folder: '{MONITOR_FOLDER}' (watch mode: {watcher.mode})")
+    print(f"Duration threshold: {TARGET_TOTAL_DURATION_SECONDS} seconds of speech" + ("" if TRIM_SILENCE else " (silence trimming off)"))
     print(f"Polling interval: {POLLING_INTERVAL_SECONDS} seconds")
+    print(f"Parallel uploads: {MAX_PARALLEL_UPLOADS} (up to {MAX_QUEUED_UPLOADS} more batches waiting)")
+    print(f"Voice: '{VOICE_NAME}', keeping its newest {KEEP_MODELS_PER_VOICE or 'all'} model(s)")
+    if metrics.enabled():
+        print(f"Exporting metrics to: {metrics.export_path()}")
     print("--------------------------------------------------")
 
     try:
         while True:
-            # --- 1. Scan Monitor Folder for New WAV Files ---
+            # --- 1. Wait for New, Completely Written WAV Files and Spool Them ---
+            # Returns as soon as files arrive, or after the polling interval with an empty list
             new_files_found_this_cycle = 0
-            try:
-                current_files = os.listdir(MONITOR_FOLDER)
-            except OSError as e:
-                print(f"Error listing directory {MONITOR_FOLDER}: {e}. Retrying next cycle.")
-                time.sleep(POLLING_INTERVAL_SECONDS)
-                continue # Skip rest of the loop iteration
-
-            for filename in current_files:
-                if filename.lower().endswith(".wav"):
-                    filepath = os.path.join(MONITOR_FOLDER, filename)
-                    # Check if it's a file and not already tracked or processed
-                    if os.path.isfile(filepath) and filepath not in tracked_files and filepath not in processed_files:
-                        print(f"Found new file: {filename}")
-                        duration_ms = get_audio_duration_ms(filepath)
-                        if duration_ms is not None:
-                            tracked_files[filepath] = duration_ms
-                            new_files_found_this_cycle += 1
-                        else:
-                            print(f"Could not get duration for {filename}. Skipping.")
-                            # Optionally, add to processed_files to avoid retrying problematic files
-                            # processed_files.add(filepath)
-
+            for filepath in watcher.wait_for_files(timeout=POLLING_INTERVAL_SECONDS):
+                if ingest_clip(upload_queue, filepath):
+                    new_files_found_this_cycle += 1
 
             if new_files_found_this_cycle > 0:
                 print(f"Added {new_files_found_this_cycle} new WAV file(s) to tracking.")
 
-            # --- 2. Check Total Duration and Trigger Processing ---
-            total_tracked_duration_ms = sum(tracked_files.values())
-            total_tracked_duration_sec = total_tracked_duration_ms / 1000.0
-
-            print(f"Current tracked files: {len(tracked_files)}. Total duration: {total_tracked_duration_sec:.2f} seconds.")
-
-            if total_tracked_duration_sec >= TARGET_TOTAL_DURATION_SECONDS and len(tracked_files) > 0:
-                print(f"\nThreshold ({TARGET_TOTAL_DURATION_SECONDS}s) reached. Processing batch...")
-
-                # Create a list of files for this batch
-                batch_files = list(tracked_files.keys()) # Get paths
-                batch_files_info = {fp: tracked_files[fp] for fp in batch_files} # Keep info for logging
-
-                # --- 3. Stitch Audio Files ---
-                combined_audio = None
-                print("Stitching audio files...")
-                try:
-                    # Initialize with the first file's segment
-                    first_file_path = batch_files[0]
-                    combined_audio = AudioSegment.from_file(first_file_path, format="wav")
-
-                    # Append the rest
-                    for filepath in batch_files[1:]:
-                        segment = AudioSegment.from_file(filepath, format="wav")
-                        combined_audio += segment
-
-                    print(f"Successfully stitched {len(batch_files)} files. New duration: {len(combined_audio)/1000.0:.2f}s")
-
-                except Exception as e:
-                    print(f"Error during audio stitching: {e}")
-                    # Decide how to handle: maybe skip this batch and retry later?
-                    # For now, we'll just log and continue the loop.
-                    # Consider removing problematic files from tracked_files if identifiable.
-                    combined_audio = None # Ensure it's None if stitching failed
-
-                # --- 4. Process and Export Stitched Audio ---
-                processed_stitch_path = None
-                if combined_audio:
-                    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                    stitched_filename = f"stitched_batch_{timestamp}.wav"
-                    stitched_filepath = os.path.join(TEMP_FOLDER, stitched_filename)
-                    model_title = f"Batch_{timestamp}" # Generate a unique model title
-
-                    processed_stitch_path = process_and_export_stitched(combined_audio, stitched_filepath)
-
-                # --- 5. Upload to Fish Audio API ---
-                upload_successful = False
-                upload_disabled_this_batch = False # Flag for disabled upload
-                if processed_stitch_path:
-                    model_id = upload_to_fish_audio(API_TOKEN, processed_stitch_path, model_title)
-
-                    # --- ADD THIS CHECK ---
-                    if model_id == "upload_disabled":
-                        upload_successful = True # Treat as success for state update
-                        upload_disabled_this_batch = True # Mark that upload was skipped
-                    # ----------------------
-                    elif model_id: # Includes "submitted_no_id" as success for processing
-                        upload_successful = True
-                    else:
-                        print(f"API upload failed for batch {model_title}.")
-                        # Keep files in tracked_files to retry next time threshold is met
-                else:
-                    print("Skipping API upload due to stitching or processing failure.")
-
-                # --- 6. Update State and Cleanup ---
-                if upload_successful:
-                    print(f"Successfully processed batch. Updating state for {len(batch_files)} files.")
-                    # ...(state update logic remains the same)...
-                    # for filepath in batch_files:
-                    #    processed_files.add(filepath)
-                    #    if filepath in tracked_files: del tracked_files[filepath]
-                    #    # Optional move logic...
-
-                # --- MODIFY CLEANUP ---
-                # Clean up the temporary stitched file ONLY if upload was NOT disabled
-                if not upload_disabled_this_batch and processed_stitch_path and os.path.exists(processed_stitch_path):
-                    try:
-                        os.remove(processed_stitch_path)
-                        print(f"Cleaned up temporary file: {processed_stitch_path}")
-                    except OSError as e:
-                        print(f"Warning: Could not remove temporary file {processed_stitch_path}: {e}")
-                elif upload_disabled_this_batch:
-                    print(f"--- API UPLOAD DISABLED --- Stitched file kept for inspection:")
-                    print(f"    {processed_stitch_path}")
-                    print(f"    (Note: This file will be deleted when the script stops or if the temp folder is cleaned up on next run)")
-                # -----------------------
-
-                print("--------------------------------------------------") # Separator after processing a batch
-            # --- 7. Clear all files in Dissonance_Diagnostics folder ---
-            try:
-                for filename in os.listdir(MONITOR_FOLDER):
-                    file_path = os.path.join(MONITOR_FOLDER, filename)
-                    if os.path.isfile(file_path):
-                        os.remove(file_path)
-                print(f"Cleared all files in monitor folder: {MONITOR_FOLDER}")
-            except Exception as e:
-                print(f"Warning: Failed to clear files in monitor folder {MONITOR_FOLDER}: {e}")
-
-            # --- 8. Wait for the next polling interval ---
-            # print(f"Waiting for {POLLING_INTERVAL_SECONDS} seconds...") # Optional: Verbose logging
-            time.sleep(POLLING_INTERVAL_SECONDS)
+            # --- 2. Check Total Duration and Create a Batch From the Best Clips ---
+            expire_pending_clips(upload_queue)
+            pending_clips = upload_queue.pending_clips()
+            total_tracked_duration_sec = sum(clip["speech_ms"] for clip in pending_clips) / 1000.0
+
+            upload_stats = uploader.stats()
+            print(f"Current tracked files: {len(pending_clips)}. Total speech: {total_tracked_duration_sec:.2f} seconds. "
+                  f"Uploads running: {upload_stats['running']}, waiting: {upload_stats['waiting']}.")
+
+            if total_tracked_duration_sec >= max(CANDIDATE_POOL_SECONDS, TARGET_TOTAL_DURATION_SECONDS):
+                print(f"\nCandidate pool ({CANDIDATE_POOL_SECONDS}s) reached. Queuing batch...")
+                build_batch(upload_queue, pending_clips)
+
+            # --- 3.-6. Hand Every Batch That Is Due (new ones and retries) to the Upload Workers ---
+            for batch in upload_queue.due_batches():
+                if uploader.submit(batch):
+                    print(f"Batch {batch['title']} queued for upload.")
+
+            # --- 7. No explicit sleep: the watcher wait in step 1 paces the loop ---
 
     except KeyboardInterrupt:
         print("\n--- Script interrupted by user. Exiting. ---")
     finally:
-        # --- Final Cleanup ---
-        if os.path.exists(TEMP_FOLDER):
-            try:
-                shutil.rmtree(TEMP_FOLDER)
-                print(f"Cleaned up temporary folder: {TEMP_FOLDER}")
-            except OSError as e:
-                print(f"Warning: Could not remove temporary folder {TEMP_FOLDER} on exit: {e}")
-        print("--- Monitor stopped. ---")
\ No newline at end of file
+        watcher.close()
+        uploader.shutdown(wait=True)
+        upload_queue.close()
+        print("--- Monitor stopped. ---")
@@ -0,0 +1,63 @@
+import time
+import struct
+import itertools
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+from audio_engine import (CHUNK_FRAMES, probe_wav, iter_wav_chunks, to_mono,
+                          Resampler, WavWriter)
+
+
+def stitch_wavs(filepaths: List[str], output_filepath: str, target_rate: int,
+                target_channels: int = 1, chunk_frames: int = CHUNK_FRAMES,
+                segments: Optional[Sequence[Optional[Sequence[Tuple[int, int]]]]] = None) -> Tuple[float, List[str]]:
+    """
+    Concatenates WAV files into one 16-bit WAV at target_rate, converting and resampling
+    each input chunk by chunk while writing. Memory use is bounded by one input chunk.
+    segments, if given, has one entry per file: the frame ranges of it to keep (None for all).
+
+    Files that cannot be read are skipped whole: each file is probed and mapped before any of
+    its audio is written, so a skipped file never leaves partial audio in the output. Errors
+    writing the output are raised. Returns (output duration in ms, skipped files).
+    """
+    segments = segments if segments is not None else [None] * len(filepaths)
+    skipped = []
+    resample_seconds = 0.0 # Time in the resampler and in writes, summed over all chunks
+    export_seconds = 0.0
+    with WavWriter(output_filepath, target_rate, target_channels) as out:
+        for filepath, file_segments in zip(filepaths, segments):
+            try:
+                info = probe_wav(filepath)
+                # Resampler state carries across chunks of the same file
+                resampler = Resampler(info.sample_rate, target_rate)
+                chunks = iter_wav_chunks(filepath, info, chunk_frames, file_segments)
+                # The first chunk maps the file; past this point reading it cannot fail
+                first = next(chunks, None)
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Warning: Skipping {filepath} while stitching: {e}")
+                skipped.append(filepath)
+                continue
+
+            chunks = itertools.chain([first] if first is not None else [], chunks)
+            for chunk in _with_tail((to_mono(chunk) for chunk in chunks), resampler):
+                started = time.perf_counter()
+                chunk = resampler.process(chunk) if chunk is not None else resampler.flush()
+                resample_seconds += time.perf_counter() - started
+                if target_channels == 2:
+                    chunk = np.repeat(chunk[:, None], 2, axis=1)
+                started = time.perf_counter()
+                out.write(chunk)
+                export_seconds += time.perf_counter() - started
+        written_frames = out.frames
+
+    metrics.observe("resample", resample_seconds)
+    metrics.observe("export", export_seconds)
+    return written_frames * 1000.0 / target_rate, skipped
+
+
+def _with_tail(chunks, resampler):
+    """Yields every chunk, then None as the signal to flush the resampler's tail."""
+    yield from chunks
+    yield None